@@ -44,11 +44,16 @@ class CloudStrategyConfiguration:
         self.auto_import = auto_import
         self.process_recommendations = process_recommendations
 
-    def select_strategy(self):
+    def select_strategy(
+        self, optscale_cloud_account_api: OptScaleCloudAccountAPI | None = None
+    ):
         """
         This method checks if the Cloud Account type is allowed.
         If it's valid, an instance of the Cloud Account Class's Strategy
         will be created and validated.
+        :param optscale_cloud_account_api: Optional. The OptScaleCloudAccountAPI
+        used by the strategy, to share it between many cloud accounts.
+        A new one is created if it's not given.
         :return:
         :rtype:
         """
@@ -62,7 +67,9 @@ class CloudStrategyConfiguration:
             )
 
         strategy_class = self.ALLOWED_PROVIDERS[self.type]
-        strategy = strategy_class(optscale_cloud_account_api=OptScaleCloudAccountAPI())
+        if optscale_cloud_account_api is None:
+            optscale_cloud_account_api = OptScaleCloudAccountAPI()
+        strategy = strategy_class(optscale_cloud_account_api=optscale_cloud_account_api)
         strategy.validate_config(config=self.config)
         cloud_account_type = self.config.get("type")
         logger.info(f"Cloud Account Conf for {cloud_account_type} has been validated")
@@ -4,6 +4,8 @@ from typing import Any
 
 from pydantic import BaseModel, Field
 
+from app import settings
+
 
 class AddCloudAccount(BaseModel):
     name: str
@@ -30,6 +32,12 @@ class AddCloudAccount(BaseModel):
     }
 
 
+class BulkAddCloudAccount(BaseModel):
+    cloud_accounts: list[AddCloudAccount] = Field(
+        min_length=1, max_length=settings.bulk_max_items
+    )
+
+
 class AddCloudAccountResponse(BaseModel):
     name: str
     type: str
@@ -1,23 +1,20 @@
 import logging
+import sqlite3
 from typing import Annotated
 
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, Depends
 from fastapi import status as http_status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from starlette.responses import JSONResponse
 
-from app import settings
 from app.api.invitations.model import DeclineInvitation
-from app.api.invitations.services.invitations import (
-    remove_user,
-)
+from app.api.invitations.services.invitations import REMOVE_USER_JOB
 from app.core.exceptions import (
     APIResponseError,
     format_error_response,
 )
+from app.core.job_queue import job_queue
 from app.optscale_api.invitation_api import OptScaleInvitationAPI
-from app.optscale_api.orgs_api import OptScaleOrgAPI
-from app.optscale_api.users_api import OptScaleUserAPI
 
 # HTTPBearer scheme to parse Authorization header
 bearer_scheme = HTTPBearer()
@@ -38,10 +35,7 @@ def get_bearer_token(
 async def decline_invitation(
     invite_id: str,
     data: DeclineInvitation,
-    background_task: BackgroundTasks,
     invitation_api: Annotated[OptScaleInvitationAPI, Depends()],
-    org_api: Annotated[OptScaleOrgAPI, Depends()],
-    user_api: Annotated[OptScaleUserAPI, Depends()],
     invited_user_token: Annotated[str, Depends(get_bearer_token)],
 ):
     try:
@@ -50,16 +44,16 @@ async def decline_invitation(
             user_access_token=invited_user_token, invitation_id=invite_id
         )
 
-        background_task.add_task(
-            remove_user,
-            user_access_token=invited_user_token,
-            user_id=user_id,
-            invitation_api=invitation_api,
-            org_api=org_api,
-            user_api=user_api,
-            admin_api_key=settings.optscale_cluster_secret,
-        )
-        return JSONResponse(
+        # the user is removed in background, if they have nothing left
+        try:
+            await job_queue.enqueue(
+                REMOVE_USER_JOB, key=user_id, payload={"user_id": user_id}
+            )
+        except sqlite3.Error as error:
+            logger.error(
+                f"Failed to enqueue the removal of the user {user_id}: {error}"
+            )
+        return ORJSONResponse(
             status_code=response.get("status_code", http_status.HTTP_200_OK),
             content={"response": "Invitation declined"},
         )
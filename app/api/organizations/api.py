@@ -3,27 +3,42 @@ from __future__ import annotations
 import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi import status as http_status
-from starlette.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from app import settings
-from app.api.cloud_account.model import AddCloudAccount, AddCloudAccountResponse
+from app.api.cloud_account.model import (
+    AddCloudAccount,
+    AddCloudAccountResponse,
+    BulkAddCloudAccount,
+)
 from app.api.invitations.api import get_bearer_token
 from app.api.organizations.model import (
     CreateOrgData,
     OptScaleOrganization,
     OptScaleOrganizationResponse,
+    OrgLookupData,
 )
 from app.api.organizations.services.optscale_cloud_accounts import (
     link_cloud_account_to_org,
+    link_cloud_accounts_to_org,
 )
+from app.core.api_client import build_passthrough_response
 from app.core.auth_jwt_bearer import JWTBearer
+from app.core.bulk import (
+    accepts_ndjson,
+    build_bulk_response,
+    build_item_error,
+    build_item_result,
+    run_bulk,
+)
 from app.core.exceptions import (
     APIResponseError,
     CloudAccountConfigError,
     format_error_response,
 )
+from app.core.idempotency import idempotent
 from app.optscale_api.auth_api import OptScaleAuth
 from app.optscale_api.helpers.auth_tokens_dependency import get_auth_client
 from app.optscale_api.orgs_api import OptScaleOrgAPI
@@ -58,7 +73,7 @@ async def get_orgs(
     :param auth_client: An instance of OptScaleAuth for authentication.
                         Dependency injection via Depends(get_auth_client)`.
 
-    :return: JSONResponse: A JSON response containing the organization data with an
+    :return: ORJSONResponse: A JSON response containing the organization data with an
             appropriate HTTP status code.
 
     :raises:
@@ -92,22 +107,98 @@ async def get_orgs(
             user_id=user_id,
             admin_api_key=settings.optscale_cluster_secret,
             auth_client=auth_client,
+            passthrough=True,
         )
-        return JSONResponse(
-            status_code=response.get("status_code", http_status.HTTP_200_OK),
-            content=response.get("data", {}),
-        )
+        # the organizations are returned as they are, no need to parse them
+        return build_passthrough_response(response)
 
     except Exception as error:
         return format_error_response(error)
 
 
+@router.post(
+    path="/lookup",
+    status_code=http_status.HTTP_200_OK,
+    dependencies=[Depends(JWTBearer())],
+)
+async def lookup_orgs(
+    data: OrgLookupData,
+    auth_client: Annotated[OptScaleAuth, Depends(get_auth_client)],
+    optscale_api: Annotated[OptScaleOrgAPI, Depends()],
+):
+    """
+    Retrieve the organizations of many users at once, like the GET /organizations
+    endpoint does for a single user.
+    The users are looked up concurrently, at most `bulk_concurrency` at a time,
+    sharing the cached access tokens and organization lists, and every user
+    has its own result, so an error for a user doesn't prevent the lookup
+    of the others.
+
+    :param data: The IDs of the users, up to `bulk_max_items`
+    :param auth_client: An instance of OptScaleAuth for authentication.
+                        Dependency injection via Depends(get_auth_client)`.
+    :param optscale_api: An instance of OptScaleOrgAPI for interacting with the organization API.
+                        Dependency injection via `Depends()`.
+
+    :return: 200 OK with the result of every user, by user ID, like
+
+        {
+            "users": {
+                "f0bd0c4a-7c55-45b7-8b58-27740e38789a": {
+                    "status_code": 200,
+                    "data": {"organizations": [{"id": "...", "name": "MyOrg", ...}]}
+                },
+                "ae2d4051-bf6c-4bf4-aa62-f9f7427f415c": {
+                    "status_code": 404,
+                    "error": {
+                        "status_code": 404,
+                        "reason": "User ae2d4051-bf6c-4bf4-aa62-f9f7427f415c not found",
+                        "error_code": "OA0043",
+                        "params": ["ae2d4051-bf6c-4bf4-aa62-f9f7427f415c"]
+                    }
+                }
+            }
+        }
+
+    :dependencies:
+        JWTBearer: Ensures that the request is authenticated using a valid JWT.
+    """
+    user_ids = list(dict.fromkeys(data.user_ids))
+
+    async def lookup(user_id: str) -> dict:
+        try:
+            response = await optscale_api.access_user_org_list_with_admin_key(
+                user_id=user_id,
+                admin_api_key=settings.optscale_cluster_secret,
+                auth_client=auth_client,
+            )
+        except Exception as error:
+            return build_item_error(error)
+        return build_item_result(
+            status_code=response.get("status_code", http_status.HTTP_200_OK),
+            data=response.get("data", {}),
+        )
+
+    results = {}
+    async for result in run_bulk(
+        user_ids, lookup, concurrency=settings.bulk_concurrency
+    ):
+        index = result.pop("index")
+        results[user_ids[index]] = result
+    return ORJSONResponse(
+        status_code=http_status.HTTP_200_OK,
+        content={"users": {user_id: results[user_id] for user_id in user_ids}},
+    )
+
+
 @router.post(
     path="/{org_id}/cloud_accounts",
     status_code=http_status.HTTP_201_CREATED,
     response_model=AddCloudAccountResponse,
     dependencies=[],
 )
+# the response is the one of OptScale, which may echo the cloud credentials
+@idempotent(persist=False)
 async def link_cloud_account(
     org_id: str,
     data: AddCloudAccount,
@@ -131,7 +222,7 @@ async def link_cloud_account(
             org_id=org_id,
             user_access_token=user_access_token,
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=response.get("status_code", http_status.HTTP_201_CREATED),
             content=response.get("data", {}),
         )
@@ -141,12 +232,79 @@ async def link_cloud_account(
         return format_error_response(error)
 
 
+@router.post(
+    path="/{org_id}/cloud_accounts/bulk",
+    status_code=http_status.HTTP_200_OK,
+    dependencies=[],
+)
+async def link_cloud_accounts(
+    request: Request,
+    org_id: str,
+    data: BulkAddCloudAccount,
+    user_access_token: Annotated[str, Depends(get_bearer_token)],
+    auth_client: Annotated[OptScaleAuth, Depends(get_auth_client)],
+):
+    """
+    Link many Cloud Accounts to an organization at once, like the
+    POST /organizations/{org_id}/cloud_accounts endpoint does for one.
+    The user is authorized once, every config is validated before linking
+    any Cloud Account, then the valid ones are linked concurrently,
+    at most `bulk_concurrency` at a time.
+
+    :param request: The request, to check if the results have to be streamed
+    :param org_id: The org ID to link the Cloud Accounts to
+    :param data: The Cloud Accounts to link, up to `bulk_max_items`
+    :param user_access_token: The user's access token
+    :param auth_client: An instance of OptScaleAuth for authentication.
+                        Dependency injection via `Depends(get_auth_client)`.
+
+    :return: 200 OK with the result of every Cloud Account, in the order
+    of the request, like
+
+        {
+            "results": [
+                {"index": 0, "status_code": 201, "data": {"id": "...", ...}},
+                {
+                    "index": 1,
+                    "status_code": 400,
+                    "error": {
+                        "status_code": 400,
+                        "reason": "aws is not supported",
+                        "error_code": "OE0436",
+                        "params": ["aws"]
+                    }
+                }
+            ]
+        }
+
+    If the request has the "Accept: application/x-ndjson" header, the results
+    are streamed as they complete, one JSON object per line.
+    If the user is not allowed to link Cloud Accounts to the organization,
+    the error is returned as for a single Cloud Account.
+    """
+    try:
+        await auth_client.check_user_allowed_to_create_cloud_account(
+            bearer_token=user_access_token, org_id=org_id
+        )
+    except APIResponseError as error:
+        logger.error(f"The user is not allowed to link Cloud Accounts {error}")
+        return format_error_response(error)
+
+    results = link_cloud_accounts_to_org(
+        cloud_accounts=data.cloud_accounts,
+        org_id=org_id,
+        user_access_token=user_access_token,
+    )
+    return await build_bulk_response(results, stream=accepts_ndjson(request))
+
+
 @router.post(
     path="",
     status_code=http_status.HTTP_201_CREATED,
     response_model=OptScaleOrganization,
     dependencies=[Depends(JWTBearer())],
 )
+@idempotent
 async def create_orgs(
     data: CreateOrgData,
     auth_client: Annotated[OptScaleAuth, Depends(get_auth_client)],
@@ -203,7 +361,7 @@ async def create_orgs(
             admin_api_key=settings.optscale_cluster_secret,
             auth_client=auth_client,
         )
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=response.get("status_code", http_status.HTTP_201_CREATED),
             content=response.get("data", {}),
         )
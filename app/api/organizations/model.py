@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
+
+from app import settings
 
 
 class CreateOrgData(BaseModel):
@@ -9,6 +11,10 @@ class CreateOrgData(BaseModel):
     currency: str
 
 
+class OrgLookupData(BaseModel):
+    user_ids: list[str] = Field(min_length=1, max_length=settings.bulk_max_items)
+
+
 class OptScaleOrganization(BaseModel):
     id: str
     pool_id: str
@@ -1,9 +1,17 @@
 import logging
+from collections.abc import AsyncIterator
 
+from starlette import status as http_status
+
+from app import settings
 from app.api.cloud_account.cloud_accounts_manager import (
     CloudStrategyConfiguration,
     CloudStrategyManager,
 )
+from app.api.cloud_account.model import AddCloudAccount
+from app.core.bulk import build_item_error, build_item_result, run_bulk
+from app.core.exceptions import APIResponseError, CloudAccountConfigError
+from app.optscale_api.cloud_accounts import OptScaleCloudAccountAPI
 
 logger = logging.getLogger("__name__")
 
@@ -77,3 +85,69 @@ async def link_cloud_account_to_org(
     )
     logger.info(f"The Cloud Account {type} has been linked to the org {org_id}")
     return response
+
+
+async def link_cloud_accounts_to_org(
+    cloud_accounts: list[AddCloudAccount],
+    org_id: str,
+    user_access_token: str,
+) -> AsyncIterator[dict]:
+    """
+    Links many Cloud Accounts to an org. Every config is validated
+    first, without contacting OptScale, then the valid ones are linked
+    concurrently, at most `bulk_concurrency` at a time, sharing the same
+    OptScaleCloudAccountAPI.
+    The caller must have checked that the user is allowed to link
+    Cloud Accounts to the org.
+
+    :param cloud_accounts: The Cloud Accounts to link
+    :param org_id: The org ID to link the Cloud Accounts to
+    :param user_access_token: The user's access token the org belongs to
+    :return: An async iterator of the result of every Cloud Account, with its
+    "index" in the given list: the results of the invalid configs first,
+    then the results of the links as they complete. For instance
+        {"index": 0, "status_code": 201, "data": {"id": "...", ...}}
+        {"index": 1, "status_code": 400, "error": {"error_code": "OE0436", ...}}
+    """
+    optscale_cloud_account_api = OptScaleCloudAccountAPI()
+    validated = []
+    for index, cloud_account in enumerate(cloud_accounts):
+        cloud_account_config = CloudStrategyConfiguration(
+            name=cloud_account.name,
+            provider_type=cloud_account.type,
+            config=cloud_account.config,
+            process_recommendations=cloud_account.process_recommendations,
+            auto_import=cloud_account.auto_import,
+        )
+        try:
+            strategy = cloud_account_config.select_strategy(
+                optscale_cloud_account_api=optscale_cloud_account_api
+            )
+        except (APIResponseError, CloudAccountConfigError) as error:
+            logger.error(f"The Cloud Account {index} is not valid: {error}")
+            yield {"index": index, **build_item_error(error)}
+            continue
+        validated.append((index, cloud_account_config, strategy))
+
+    async def link(item: tuple) -> dict:
+        _, cloud_account_config, strategy = item
+        try:
+            response = await CloudStrategyManager(strategy=strategy).add_cloud_account(
+                config=cloud_account_config,
+                org_id=org_id,
+                user_access_token=user_access_token,
+            )
+        except (APIResponseError, CloudAccountConfigError, ValueError) as error:
+            return build_item_error(error)
+        return build_item_result(
+            status_code=response.get("status_code", http_status.HTTP_201_CREATED),
+            data=response.get("data", {}),
+        )
+
+    if validated:
+        logger.info(f"Linking {len(validated)} Cloud Accounts to the org {org_id}")
+    async for result in run_bulk(
+        validated, link, concurrency=settings.bulk_concurrency
+    ):
+        # the index of the validated config, back to the index of the request
+        yield {**result, "index": validated[result["index"]][0]}
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Iterable
+
+import httpx
+from fastapi import APIRouter, Request
+from fastapi import status as http_status
+from fastapi.responses import ORJSONResponse
+from starlette.responses import Response, StreamingResponse
+
+from app import settings
+from app.core.api_client import get_http_client, get_upstream_name
+from app.core.exceptions import build_error_response
+from app.core.metrics import (
+    count_cancelled_request,
+    get_endpoint_template,
+    observe_upstream_request,
+)
+from app.core.request_context import (
+    REQUEST_ID_HEADER,
+    build_deadline_exceeded_response,
+    get_remaining_time,
+    get_request_context,
+    record_upstream_call,
+)
+
+logger = logging.getLogger(__name__)
+
+PROXY_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+PROXY_BLOCKED_ERROR_CODE = "route_not_allowed"
+PROXY_INVALID_PATH_ERROR_CODE = "invalid_path"
+PROXY_UNAVAILABLE_ERROR_CODE = "upstream_unavailable"
+# The endpoint label of the forwarded requests in the metrics, the paths
+# sent by the callers are not used as labels, as they are unbounded
+PROXY_ENDPOINT_LABEL = "/{path}"
+
+# The headers which only apply to a single connection, and the Host header,
+# which is set by httpx from the upstream URL
+HOP_BY_HOP_HEADERS = frozenset(
+    {
+        "connection",
+        "host",
+        "keep-alive",
+        "proxy-authenticate",
+        "proxy-authorization",
+        "proxy-connection",
+        "te",
+        "trailer",
+        "transfer-encoding",
+        "upgrade",
+    }
+)
+
+
+def filter_headers(headers: Iterable[tuple[str, str]]) -> list[tuple[str, str]]:
+    """
+    Removes the hop-by-hop headers, including the ones listed
+    in the Connection header, and the request ID.
+    :param headers: The (lowercase name, value) pairs of the headers
+    :return: The headers to forward
+    """
+    headers = list(headers)
+    excluded = HOP_BY_HOP_HEADERS | {REQUEST_ID_HEADER.lower()}
+    for name, value in headers:
+        if name == "connection":
+            excluded |= {token.strip().lower() for token in value.split(",")}
+    return [(name, value) for name, value in headers if name not in excluded]
+
+
+def has_unsafe_segments(endpoint: str) -> bool:
+    """
+    Checks whether the path has empty, "." or ".." segments, which are
+    normalized, or may be, on the way to the upstream, so that the route
+    reached is not the one checked against the blocked routes.
+    :param endpoint: The path relative to the upstream base URL, like "/pools/1"
+    """
+    return any(segment in ("", ".", "..") for segment in endpoint.split("/")[1:])
+
+
+def is_blocked_route(method: str, prefix: str, endpoint: str) -> bool:
+    """
+    Checks whether the route is one of the OptScale routes the modifier
+    prevents or overrides, which must not be forwarded as they are.
+    :param method: The HTTP method
+    :param prefix: The path of the upstream base URL, like "/restapi/v2"
+    :param endpoint: The path relative to the upstream base URL
+    """
+    route = f"{method} {prefix}{get_endpoint_template(endpoint)}"
+    return route in settings.optscale_proxy_blocked_routes
+
+
+def build_proxy_error_response(response: dict) -> ORJSONResponse:
+    """
+    Turns an error response, built like build_error_response() does,
+    into the same error body OptScale would return.
+    """
+    return ORJSONResponse(status_code=response["status_code"], content=response["data"])
+
+
+async def iter_raw_body(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    Yields the chunks of the upstream response as they arrive, still encoded,
+    and closes the response, releasing its connection to the pool, when done
+    or when the client goes away.
+    """
+    try:
+        async for chunk in response.aiter_raw():
+            yield chunk
+    finally:
+        await response.aclose()
+
+
+async def forward_request(
+    request: Request, base_url: str, prefix: str, endpoint: str
+) -> Response:
+    """
+    Forwards the request to the upstream through its pooled connections and
+    streams the response back, streaming the request body too, if any.
+    The request ID is forwarded in the X-Request-ID header, while the
+    duration of the call, until the response headers are received, is
+    recorded in the upstream latency histogram.
+    Requests are not retried, as their body can only be read once.
+    :param request: The inbound request
+    :param base_url: The upstream base URL, like "https://optscale/restapi/v2"
+    :param prefix: The path of the upstream base URL, like "/restapi/v2"
+    :param endpoint: The path relative to the upstream base URL, like "/pools/1"
+    :return: The streamed upstream response, or an error response with the same
+    shape of the OptScale errors
+    """
+    method = request.method
+    if has_unsafe_segments(endpoint):
+        logger.warning(f"Not forwarding {method} {prefix}{endpoint}")
+        return build_proxy_error_response(
+            build_error_response(
+                status_code=http_status.HTTP_400_BAD_REQUEST,
+                title="Invalid path",
+                reason="The path must not have empty, '.' or '..' segments",
+                error_code=PROXY_INVALID_PATH_ERROR_CODE,
+                params=[f"{prefix}{endpoint}"],
+            )
+        )
+
+    client = get_http_client(base_url)
+    upstream = get_upstream_name(base_url)
+    headers = filter_headers(request.headers.items())
+    context = get_request_context()
+    if context is not None:
+        headers.append((REQUEST_ID_HEADER, context.request_id))
+    has_body = (
+        "content-length" in request.headers or "transfer-encoding" in request.headers
+    )
+    upstream_request = client.build_request(
+        method=method,
+        url=httpx.URL(endpoint, query=request.url.query.encode("ascii")),
+        headers=headers,
+        content=request.stream() if has_body else None,
+    )
+    # the blocked routes are checked against the path the upstream receives
+    path = upstream_request.url.path
+    if not path.startswith(f"{prefix}/") or is_blocked_route(
+        method, prefix, path.removeprefix(prefix)
+    ):
+        logger.warning(f"Not forwarding {method} {path}")
+        return build_proxy_error_response(
+            build_error_response(
+                status_code=http_status.HTTP_403_FORBIDDEN,
+                title="Operation not allowed",
+                reason=f"{method} {path} is not allowed",
+                error_code=PROXY_BLOCKED_ERROR_CODE,
+                params=[method, path],
+            )
+        )
+
+    record_upstream_call()
+    start_time = time.monotonic()
+    try:
+        async with asyncio.timeout(get_remaining_time()):
+            response = await client.send(upstream_request, stream=True)
+    except TimeoutError:
+        logger.warning(f"Deadline exceeded while forwarding {method} {endpoint}")
+        return build_proxy_error_response(build_deadline_exceeded_response())
+    except httpx.RequestError as error:
+        logger.error(f"An error occurred while forwarding {method} {endpoint}: {error}")
+        return build_proxy_error_response(
+            build_error_response(
+                status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+                title="OptScale API unavailable",
+                reason=f"Connection error: {error}",
+                error_code=PROXY_UNAVAILABLE_ERROR_CODE,
+                params=[upstream],
+            )
+        )
+    except asyncio.CancelledError:
+        if context is not None and context.client_disconnected:
+            count_cancelled_request(upstream, PROXY_ENDPOINT_LABEL)
+        raise
+    observe_upstream_request(
+        upstream=upstream,
+        method=method,
+        endpoint=PROXY_ENDPOINT_LABEL,
+        status_code=response.status_code,
+        duration=time.monotonic() - start_time,
+    )
+
+    streaming_response = StreamingResponse(
+        content=iter_raw_body(response), status_code=response.status_code
+    )
+    # the raw headers keep the repeated ones, like Set-Cookie
+    streaming_response.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in filter_headers(response.headers.multi_items())
+    ]
+    return streaming_response
+
+
+def build_proxy_router(base_urls: list[str]) -> APIRouter:
+    """
+    Builds the router which forwards to the OptScale APIs the routes
+    the modifier does not override, under the same paths, so that
+    /restapi/v2/pools/1 is forwarded to {rest base URL}/pools/1.
+    It must be included after all the other routers.
+    :param base_urls: The base URLs of the OptScale APIs
+    :return: The router
+    """
+    router = APIRouter()
+    for base_url in base_urls:
+        prefix = httpx.URL(base_url).path.rstrip("/")
+        router.add_api_route(
+            path=f"{prefix}/{{path:path}}",
+            endpoint=build_proxy_endpoint(base_url, prefix),
+            methods=PROXY_METHODS,
+            include_in_schema=False,
+        )
+    return router
+
+
+def build_proxy_endpoint(base_url: str, prefix: str):
+    async def proxy(path: str, request: Request) -> Response:
+        return await forward_request(request, base_url, prefix, f"/{path}")
+
+    return proxy
@@ -3,23 +3,35 @@ from __future__ import annotations
 import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi import status as http_status
-from starlette.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from app import settings
-from app.api.users.model import CreateUserData, CreateUserResponse
+from app.api.users.model import (
+    BulkCreateUserData,
+    CreateUserData,
+    CreateUserResponse,
+)
 from app.api.users.services.optscale_users_registration import (
     add_new_user,
     validate_email_and_add_invited_user,
 )
 from app.core.auth_jwt_bearer import JWTBearer
+from app.core.bulk import (
+    accepts_ndjson,
+    build_bulk_response,
+    build_item_error,
+    build_item_result,
+    run_bulk,
+)
 from app.core.exceptions import (
     APIResponseError,
     InvitationDoesNotExist,
     UserAccessTokenError,
     format_error_response,
 )
+from app.core.idempotency import idempotent
 from app.optscale_api.users_api import OptScaleUserAPI
 
 logger = logging.getLogger(__name__)
@@ -32,6 +44,8 @@ router = APIRouter()
     response_model=CreateUserResponse,
     dependencies=[],
 )
+# the response holds the user token, not to be written to disk
+@idempotent(persist=False)
 async def create_user(
     data: CreateUserData,
     optscale_user_api: Annotated[OptScaleUserAPI, Depends()],
@@ -106,7 +120,7 @@ async def create_user(
                 optscale_user_api=optscale_user_api,
             )
             logger.info(f"User successfully created: {response}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=response.get("status_code", http_status.HTTP_201_CREATED),
             content=response.get("data", {}),
         )
@@ -117,3 +131,72 @@ async def create_user(
         InvitationDoesNotExist,
     ) as error:
         return format_error_response(error)
+
+
+@router.post(
+    path="/bulk",
+    status_code=http_status.HTTP_200_OK,
+    dependencies=[Depends(JWTBearer())],
+)
+async def create_users(
+    request: Request,
+    data: BulkCreateUserData,
+    optscale_user_api: Annotated[OptScaleUserAPI, Depends()],
+):
+    """
+    This endpoint registers many users in OptScale at once, like the
+    POST /users endpoint with a JWT token: the users are created and verified.
+    The users are created concurrently, at most `bulk_concurrency` at a time,
+    and every user has its own result, so the failure of some users
+    doesn't prevent the creation of the others.
+
+    :param request: The request, to check if the results have to be streamed
+    :param data: The users to create, up to `bulk_max_items`
+    :param optscale_user_api: An instance of OptScaleUserAPI.
+                    Dependency injection via `Depends()`.
+
+    :return: 200 OK with the results, in the order of the users, like
+
+        {
+            "results": [
+                {"index": 0, "status_code": 201, "data": {"id": "...", ...}},
+                {
+                    "index": 1,
+                    "status_code": 409,
+                    "error": {
+                        "status_code": 409,
+                        "reason": "User dylan.dog@mystery.com already exists",
+                        "error_code": "OA0042",
+                        "params": ["dylan.dog@mystery.com"]
+                    }
+                }
+            ]
+        }
+
+    If the request has the "Accept: application/x-ndjson" header, the results
+    are streamed as soon as every user is created, one JSON object per line,
+    in completion order.
+    :dependencies:
+        JWTBearer: Ensures that the request is authenticated using a valid JWT.
+    """
+
+    async def create(user: CreateUserData) -> dict:
+        try:
+            response = await add_new_user(
+                email=str(user.email),
+                display_name=user.display_name,
+                password=user.password,
+                optscale_cluster_secret=settings.optscale_cluster_secret,
+                optscale_user_api=optscale_user_api,
+            )
+        except (APIResponseError, UserAccessTokenError) as error:
+            return build_item_error(error)
+        logger.info(f"User successfully created: {response.get('data', {}).get('id')}")
+        return build_item_result(
+            status_code=response.get("status_code", http_status.HTTP_201_CREATED),
+            data=response.get("data", {}),
+        )
+
+    logger.info(f"Creating {len(data.users)} users")
+    results = run_bulk(data.users, create, concurrency=settings.bulk_concurrency)
+    return await build_bulk_response(results, stream=accepts_ndjson(request))
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from pydantic import BaseModel, ConfigDict, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+
+from app import settings
 
 
 class CreateUserData(BaseModel):
@@ -9,6 +11,12 @@ class CreateUserData(BaseModel):
     password: str
 
 
+class BulkCreateUserData(BaseModel):
+    users: list[CreateUserData] = Field(
+        min_length=1, max_length=settings.bulk_max_items
+    )
+
+
 class CreateUserResponse(BaseModel):
     id: str
     display_name: str
@@ -5,8 +5,14 @@ from typing import Annotated
 
 from fastapi import Depends
 
+from app import settings
 from app.core.exceptions import InvitationDoesNotExist
-from app.optscale_api.invitation_api import OptScaleInvitationAPI
+from app.optscale_api.invitation_api import (
+    OptScaleInvitationAPI,
+    invitation_email_cache,
+    invitation_lookup_cache,
+    normalize_email,
+)
 from app.optscale_api.users_api import OptScaleUserAPI
 
 logger = logging.getLogger(__name__)
@@ -17,18 +23,33 @@ async def validate_user_invitation(email: str) -> bool:
     This function checks if an invitation exists for the given email address.
     It's useful to decide whether the registration of a new user has to
     be allowed.
+    The result is cached by normalized email, for a shorter time when there
+    is no invitation, so that a burst of registrations doesn't hit OptScale
+    with the admin key. Errors are not cached.
     :param email: The user's email address
     :return: True or False
     """
+    cache_key = normalize_email(email)
+    cached = invitation_lookup_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     invitation_api = OptScaleInvitationAPI()
     response = await invitation_api.get_list_of_invitations(email=email)
     no_invitations = {"invites": []}  # if no invitations were found
     if response.get("data", {}) == no_invitations:
         # there is no invitation
+        invitation_lookup_cache.set(
+            cache_key, False, ttl=settings.invitation_cache_negative_ttl
+        )
         return False
-    else:
-        return True
+    invitation_lookup_cache.set(cache_key, True, ttl=settings.invitation_cache_ttl)
+    for invitation in response.get("data", {}).get("invites", []):
+        if invitation.get("id"):
+            invitation_email_cache.set(
+                invitation["id"], cache_key, ttl=settings.invitation_cache_ttl
+            )
+    return True
 
 
 async def validate_email_and_add_invited_user(
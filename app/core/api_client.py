@@ -1,41 +1,473 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import random
 import time
+from collections.abc import AsyncIterator
+from functools import partial
 from typing import Any
 
 import httpx
+import orjson
 from httpx import Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette import status as http_status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import StreamingResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app import settings
+from app.core.circuit_breaker import build_circuit_open_response, get_circuit_breaker
+from app.core.concurrency_limiter import (
+    build_concurrency_limit_response,
+    get_concurrency_limiter,
+)
+from app.core.hedging import get_hedging_delay, hedge_budget, latency_tracker
+from app.core.metrics import (
+    count_cancelled_request,
+    count_coalesced_request,
+    count_upstream_hedge,
+    count_upstream_hedge_won,
+    count_upstream_retry,
+    get_endpoint_template,
+    observe_http_request,
+    observe_upstream_request,
+)
+from app.core.request_context import (
+    REQUEST_ID_HEADER,
+    REQUEST_TIMEOUT_HEADER,
+    build_deadline_exceeded_response,
+    get_remaining_time,
+    get_request_context,
+    parse_request_id,
+    parse_request_timeout,
+    record_upstream_call,
+    start_request_context,
+)
+from app.core.retry import (
+    RETRYABLE_STATUS_CODES,
+    get_backoff_delay,
+    is_retryable_request,
+    retry_budget,
+)
+from app.core.single_flight import build_request_key, upstream_single_flight
 
 logger = logging.getLogger(__name__)
 
 API_REQUEST_TIMEOUT = settings.default_request_timeout
 
+# The non-standard status code used in metrics and logs for the requests
+# abandoned by the caller, as nginx does
+CLIENT_CLOSED_REQUEST = 499
 
-class LogRequestMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        logger.info(f"Request: {request.method} {request.url}")
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        logger.info(
-            f"Response: status_code={response.status_code}, process_time={process_time:.2f}s"
+# One pooled httpx.AsyncClient per upstream base URL, shared by every APIClient
+_http_clients: dict[str, httpx.AsyncClient] = {}
+
+
+class LogRequestMiddleware:
+    """
+    Pure ASGI middleware that records the duration of every HTTP request in
+    the request latency histogram and logs one structured record per request,
+    with the method, the route template, the status code, the duration
+    in milliseconds and the number of calls made to the OptScale APIs.
+    Successful requests are logged according to the configured sample rate,
+    while server errors are always logged.
+    It also starts the request context, with the deadline of the request
+    and its ID, taken from the X-Request-ID header or generated, which is
+    returned in the same header of the response.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float | None = None):
+        self.app = app
+        self.sample_rate = (
+            settings.request_log_sample_rate if sample_rate is None else sample_rate
         )
-        return response
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        context = start_request_context(
+            scope=scope,
+            requested_timeout=parse_request_timeout(
+                headers.get(REQUEST_TIMEOUT_HEADER)
+            ),
+            request_id=parse_request_id(headers.get(REQUEST_ID_HEADER)),
+        )
+        status_code = 500
+        start_time = time.monotonic()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = context.request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.monotonic() - start_time
+            if context.client_disconnected and status_code == 500:
+                # the request has been abandoned before sending a response
+                status_code = CLIENT_CLOSED_REQUEST
+            route = getattr(scope.get("route"), "path", None)
+            observe_http_request(
+                method=scope["method"],
+                route=route or "unmatched",
+                status_code=status_code,
+                duration=duration,
+            )
+            if status_code >= 500 or random.random() < self.sample_rate:  # nosec B311
+                logger.info(
+                    "Request completed",
+                    extra={
+                        "method": scope["method"],
+                        "route": route or scope["path"],
+                        "status_code": status_code,
+                        "duration_ms": round(duration * 1000, 2),
+                        "upstream_calls": context.upstream_calls,
+                        "request_id": context.request_id,
+                    },
+                )
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Pure ASGI middleware that cancels the request being served when the caller
+    drops the connection before the response has been sent, so that the
+    outstanding calls to the OptScale APIs are cancelled too and their
+    pooled connections are released.
+    The incoming messages are read by a watcher task and handed over to the
+    application one at a time, so that the disconnection is noticed even
+    while the application doesn't read from the connection. The next message
+    is only read once the application has taken the previous one, so the
+    request body is not buffered and the backpressure on the client is kept.
+    It must run inside the LogRequestMiddleware, which starts the request context.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue[Message] = asyncio.Queue(maxsize=1)
+        client_disconnected = False
+        response_complete = False
+
+        async def receive_wrapper() -> Message:
+            if client_disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_wrapper(message: Message):
+            nonlocal response_complete
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_complete = True
+
+        async def watch_disconnect():
+            nonlocal client_disconnected
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    client_disconnected = True
+                    if messages.empty():
+                        # wake up the application, if it's waiting for a message
+                        messages.put_nowait(message)
+                    return
+                # wait until the application has taken the previous message
+                await messages.put(message)
+
+        app_task = asyncio.ensure_future(self.app(scope, receive_wrapper, send_wrapper))
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await asyncio.wait({app_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            disconnected = watcher.done() and watcher.exception() is None
+            if disconnected and not app_task.done() and not response_complete:
+                context = get_request_context()
+                if context is not None:
+                    context.client_disconnected = True
+                logger.warning(
+                    f"Client disconnected, cancelling {scope['method']} {scope['path']}"
+                )
+                app_task.cancel()
+                await asyncio.wait({app_task})
+                return
+            await app_task
+        finally:
+            app_task.cancel()
+            watcher.cancel()
+
+
+def encode_json(data: Any) -> bytes | None:
+    """
+    Serializes the body of an upstream request with orjson, which is much
+    faster than the standard json module used by httpx.
+    :param data: The JSON-serializable body, or None
+    :return: The JSON document, or None if there is no body
+    """
+    if data is None:
+        return None
+    return orjson.dumps(data)
+
+
+def decode_error_body(response: Response) -> Any:
+    """
+    Decodes the body of an error response. The errors of OptScale are JSON,
+    but the ones of a load balancer or a proxy in between, like a 502,
+    are often HTML or empty.
+    :return: The decoded body, or {} if it's not JSON, as the text
+    is already part of the error message
+    """
+    try:
+        return orjson.loads(response.content)
+    except ValueError:
+        return {}
+
+
+def is_json_response(response: Response) -> bool:
+    return response.headers.get("Content-Type", "").startswith("application/json")
+
+
+def get_passthrough_headers(response: Response) -> dict[str, str]:
+    """
+    Returns the headers of an upstream response forwarded to the client
+    in passthrough mode.
+    The body is decoded while streamed, so Content-Length is only
+    forwarded when the upstream didn't compress it.
+    """
+    headers = {"content-type": response.headers["Content-Type"]}
+    if "Content-Encoding" not in response.headers and (
+        content_length := response.headers.get("Content-Length")
+    ):
+        headers["content-length"] = content_length
+    return headers
+
+
+class ResponseBodyStream:
+    """
+    The body of an upstream response, yielded in chunks as they arrive.
+    It owns the response: aclose() releases its connection to the pool,
+    whether the body has been read, in part or not at all.
+    """
+
+    def __init__(self, response: Response):
+        self.response = response
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.response.aiter_bytes():
+            yield chunk
+
+    async def aclose(self):
+        await self.response.aclose()
+
+
+class PassthroughResponse(StreamingResponse):
+    """
+    A StreamingResponse which closes its stream once sent, or when sending
+    it fails or is cancelled, e.g. because the client has gone away.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+def build_passthrough_response(response: dict[str, Any]) -> StreamingResponse:
+    """
+    Turns the response of APIClient.get_passthrough() into a response
+    which streams the upstream body to the client as it is.
+    The returned response owns the stream, and closes it when it's sent.
+    :param response: A dict like
+    {"status_code": 200, "headers": {"content-type": ...}, "stream": <bytes>}
+    """
+    return PassthroughResponse(
+        content=response["stream"],
+        status_code=response["status_code"],
+        headers=response["headers"],
+    )
+
+
+def as_passthrough(response: dict[str, Any]) -> dict[str, Any]:
+    """
+    Turns a parsed response, like the ones kept in the caches, into the shape
+    returned by APIClient.get_passthrough(), to serve both the same way.
+    :param response: A dict like {"status_code": 200, "data": {...}}
+    :return: A dict like
+    {"status_code": 200, "headers": {"content-type": ...}, "stream": <bytes>}
+    """
+    body = orjson.dumps(response.get("data", {}))
+
+    async def stream() -> AsyncIterator[bytes]:
+        yield body
+
+    return {
+        "status_code": response.get("status_code", http_status.HTTP_200_OK),
+        "headers": {
+            "content-type": "application/json",
+            "content-length": str(len(body)),
+        },
+        "stream": stream(),
+    }
+
+
+def get_upstream_name(base_url: str) -> str:
+    """
+    Returns the name used to identify the given upstream in metrics and logs.
+    :param base_url: The base URL of the upstream API
+    :return: "auth" or "rest" for the OptScale APIs, otherwise the base_url itself
+    """
+    if base_url == settings.optscale_auth_api_base_url:
+        return "auth"
+    if base_url == settings.optscale_rest_api_base_url:
+        return "rest"
+    return base_url
+
+
+def build_timeout(timeout: float) -> httpx.Timeout:
+    """
+    Builds the default httpx Timeout used for the upstream calls.
+    :param timeout: The read/write timeout in seconds
+    :return: An httpx.Timeout where the connect and pool acquisition
+    timeouts are the ones configured in the settings
+    """
+    return httpx.Timeout(
+        timeout,
+        connect=min(timeout, settings.api_client_connect_timeout),
+        pool=settings.api_client_pool_timeout,
+    )
+
+
+def get_profile_timeout(profile: str) -> httpx.Timeout:
+    """
+    Builds the httpx Timeout of the given timeout profile.
+    :param profile: The name of a profile in settings.api_client_timeout_profiles
+    :return: The httpx.Timeout with the connect, read, write and pool timeouts
+    of the profile
+    :raises ValueError: if the profile is not configured
+    """
+    timeouts = settings.api_client_timeout_profiles.get(profile)
+    if timeouts is None:
+        raise ValueError(f"Unknown timeout profile {profile}")
+    return httpx.Timeout(
+        connect=timeouts.connect,
+        read=timeouts.read,
+        write=timeouts.write,
+        pool=timeouts.pool,
+    )
+
+
+def is_http2_enabled() -> bool:
+    """
+    Checks if the upstream calls can use HTTP/2, that is if it's enabled
+    in the settings and the h2 package is installed.
+    """
+    if not settings.api_client_http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning(
+            "HTTP/2 is enabled but the h2 package is missing, using HTTP/1.1"
+        )
+        return False
+    return True
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Returns the process-wide httpx.AsyncClient for the given base_url.
+    The client is created on first use, and re-created if it has been closed,
+    so that all the APIClient instances pointing to the same upstream
+    share the same connection pool.
+    When HTTP/2 is enabled, it's negotiated with the upstream during the TLS
+    handshake, and HTTP/1.1 is used if the upstream doesn't support it
+    or if the base_url is not https.
+    :param base_url: The base URL of the upstream API
+    :return: The pooled httpx.AsyncClient
+    """
+    client = _http_clients.get(base_url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=is_http2_enabled(),
+            timeout=build_timeout(API_REQUEST_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.api_client_max_connections,
+                max_keepalive_connections=settings.api_client_max_keepalive_connections,
+                keepalive_expiry=settings.api_client_keepalive_expiry,
+            ),
+        )
+        _http_clients[base_url] = client
+        logger.info(f"Created the connection pool for {base_url}")
+    return client
+
+
+async def close_http_clients():
+    """
+    Closes all the pooled httpx.AsyncClient instances.
+    It's meant to be called once, when the application shuts down.
+    """
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    for client in clients:
+        await client.aclose()
 
 
 class APIClient:
-    def __init__(self, base_url: str, timeout: int = API_REQUEST_TIMEOUT):
+    def __init__(
+        self,
+        base_url: str,
+        timeout: int = API_REQUEST_TIMEOUT,
+        timeout_profiles: dict[str, str] | None = None,
+    ):
+        """
+        :param base_url: The base URL of the upstream API
+        :param timeout: The default read/write timeout in seconds
+        :param timeout_profiles: The timeout profile to use for specific endpoints,
+        like {"POST /organizations": "slow"}, where the endpoint is the template
+        returned by get_endpoint_template(). Other endpoints use the default timeout.
+        """
         self.base_url = base_url
-        self.timeout = timeout
-        self.client = httpx.AsyncClient(
-            base_url=self.base_url,
-            timeout=self.timeout,
-        )
+        self.upstream = get_upstream_name(base_url)
+        self.timeout = build_timeout(timeout)
+        self.endpoint_timeouts = {
+            endpoint: get_profile_timeout(profile)
+            for endpoint, profile in (timeout_profiles or {}).items()
+        }
+        self.client = get_http_client(base_url)
+
+    def get_timeout(self, method: str, endpoint: str) -> httpx.Timeout:
+        """
+        Returns the timeout to apply to a request.
+        :param method: The HTTP method
+        :param endpoint: The endpoint as sent to the upstream
+        :return: The timeout of the endpoint's profile, or the default one
+        """
+        key = f"{method.upper()} {get_endpoint_template(endpoint)}"
+        return self.endpoint_timeouts.get(key, self.timeout)
+
+    def get_latency_threshold(self, timeout: httpx.Timeout) -> float:
+        """
+        Returns the latency above which a request makes the concurrency limiter
+        shrink the limit of the upstream. It's scaled for the endpoints with
+        a read timeout longer than the default one, like the "slow" profile,
+        as they are expected to take longer.
+        :param timeout: The timeout of the request, see get_timeout()
+        :return: The latency threshold in seconds
+        """
+        threshold = settings.concurrency_limit_latency_threshold
+        return threshold * max(1.0, timeout.read / self.timeout.read)
 
     async def _make_request(
         self,
@@ -44,6 +476,7 @@ class APIClient:
         headers: dict[str, Any] | None = None,
         params: dict[str, Any] | None = None,
         data: dict[str, Any] | None = None,
+        stream: bool = False,
     ) -> (
         Response
         | dict[str, None | str | int]
@@ -52,6 +485,20 @@ class APIClient:
     ):
         """
         This function makes an async HTTP request and handles errors.
+        Connection errors and 502/503/504 responses are retried, with an
+        exponential backoff and full jitter, if the request is idempotent and
+        the process-wide retry budget allows it.
+        While the circuit breaker of the endpoint is open, no request is sent
+        and a 503 error response is returned straight away.
+        The number of concurrent requests to the upstream is bounded by an
+        adaptive limit: when it's reached, the request waits for a free slot
+        for a while, then a 503 error response is returned.
+        The duration of every attempt is recorded in the upstream latency histogram.
+        Every attempt is bound by the timeout profile of the endpoint, if any,
+        and by the time left before the deadline of the inbound request.
+        Once the deadline has passed, a 504 error response is returned.
+        With stream=True, the duration is measured until the response headers
+        are received, as the body is read by the caller.
         :param method:
         :type method:
         :param endpoint:
@@ -63,15 +510,160 @@ class APIClient:
         :return:
         :rtype:
         """
-        try:
-            response = await self.client.request(
-                method=method, headers=headers, url=endpoint, params=params, json=data
+        record_upstream_call()
+        retry_budget.deposit()
+        can_retry = is_retryable_request(method)
+        timeout = self.get_timeout(method, endpoint)
+        latency_threshold = self.get_latency_threshold(timeout)
+        breaker = get_circuit_breaker(self.upstream, endpoint)
+        attempt = 0
+        while True:
+            if (remaining := get_remaining_time()) is not None and remaining <= 0:
+                logger.warning(f"Deadline exceeded, not sending {method} {endpoint}")
+                return build_deadline_exceeded_response()
+            if not breaker.allow_request():
+                logger.warning(f"Circuit open, failing fast {method} {endpoint}")
+                return build_circuit_open_response(breaker)
+            limiter = get_concurrency_limiter(self.upstream)
+            try:
+                acquired = await limiter.acquire(timeout=remaining)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            if not acquired:
+                breaker.release()
+                return build_concurrency_limit_response(limiter)
+            start_time = time.monotonic()
+            duration = status_code = None
+            try:
+                try:
+                    async with asyncio.timeout(get_remaining_time()):
+                        response = await self._send_request(
+                            method,
+                            endpoint,
+                            headers=headers,
+                            params=params,
+                            data=data,
+                            timeout=timeout,
+                            stream=stream,
+                        )
+                except TimeoutError:
+                    breaker.release()
+                    logger.warning(
+                        f"Deadline exceeded while requesting {method} {endpoint}"
+                    )
+                    return build_deadline_exceeded_response()
+                except asyncio.CancelledError:
+                    breaker.release()
+                    context = get_request_context()
+                    if context is not None and context.client_disconnected:
+                        count_cancelled_request(self.upstream, endpoint)
+                    raise
+                except Exception:
+                    # an unexpected error is a failure, and gives back the probe slot
+                    breaker.record_result(http_status.HTTP_500_INTERNAL_SERVER_ERROR)
+                    raise
+                duration = time.monotonic() - start_time
+                status_code = response.get(
+                    "status_code", http_status.HTTP_204_NO_CONTENT
+                )
+            finally:
+                # the slot is always given back, the limit adapts to completed calls
+                limiter.release(
+                    latency=duration,
+                    status_code=status_code,
+                    latency_threshold=latency_threshold,
+                )
+            breaker.record_result(status_code)
+            observe_upstream_request(
+                upstream=self.upstream,
+                method=method,
+                endpoint=endpoint,
+                status_code=status_code,
+                duration=duration,
+            )
+            if method == "GET":
+                latency_tracker.record(self.upstream, endpoint, duration)
+            if (
+                not can_retry
+                or status_code not in RETRYABLE_STATUS_CODES
+                or attempt >= settings.api_client_max_retries
+            ):
+                return response
+            allowed = retry_budget.withdraw()
+            count_upstream_retry(self.upstream, endpoint, allowed=allowed)
+            if not allowed:
+                logger.warning(
+                    f"Retry budget exhausted, not retrying {method} {endpoint}"
+                )
+                return response
+            attempt += 1
+            logger.warning(
+                f"Retrying {method} {endpoint} after a {status_code} "
+                f"(attempt {attempt} of {settings.api_client_max_retries})"
             )
+            delay = get_backoff_delay(attempt)
+            if (remaining := get_remaining_time()) is not None and delay >= remaining:
+                logger.warning(f"Deadline exceeded, not retrying {method} {endpoint}")
+                return build_deadline_exceeded_response()
+            await asyncio.sleep(delay)
+
+    async def _send_request(
+        self,
+        method: str,
+        endpoint: str,
+        headers: dict[str, Any] | None = None,
+        params: dict[str, Any] | None = None,
+        data: dict[str, Any] | None = None,
+        timeout: httpx.Timeout | None = None,
+        stream: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Sends the HTTP request to the upstream and turns the response,
+        or the error, into a dict like
+        {"status_code": 200, "data": {...}} or
+        {"status_code": 503, "data": {}, "error": "Connection error: ..."}
+        :param stream: If True, a successful JSON response is not read but
+        returned as {"status_code": 200, "headers": {...}, "stream": <bytes>},
+        see build_passthrough_response(). Errors are read and mapped as usual.
+        """
+        if data is not None:
+            headers = {"Content-Type": "application/json", **(headers or {})}
+        try:
+            if stream:
+                response = await self.client.send(
+                    self.client.build_request(
+                        method=method,
+                        headers=headers,
+                        url=endpoint,
+                        params=params,
+                        content=encode_json(data),
+                        timeout=timeout or self.timeout,
+                    ),
+                    stream=True,
+                )
+                if response.is_success and is_json_response(response):
+                    return {
+                        "status_code": response.status_code,
+                        "headers": get_passthrough_headers(response),
+                        "stream": ResponseBodyStream(response),
+                    }
+                # the body of the errors is small, read it to map them as usual
+                await response.aread()
+            else:
+                response = await self.client.request(
+                    method=method,
+                    headers=headers,
+                    url=endpoint,
+                    params=params,
+                    content=encode_json(data),
+                    timeout=timeout or self.timeout,
+                )
             response.raise_for_status()
             # Check if the response is JSON by inspecting the Content-Type header
-            if response.headers.get("Content-Type", "").startswith("application/json"):
+            if is_json_response(response):
                 try:
-                    data = response.json()
+                    data = orjson.loads(response.content)
                     return {"status_code": response.status_code, "data": data}
                 except ValueError:
                     logger.error(
@@ -111,7 +703,7 @@ class APIClient:
 
             return {
                 "status_code": error.response.status_code,
-                "data": error.response.json(),
+                "data": decode_error_body(error.response),
                 "error": f"HTTP error: {error.response.status_code} - {error.response.text}",
             }
         except Exception as error:
@@ -128,11 +720,110 @@ class APIClient:
         endpoint: str,
         headers: dict[str, Any] | None = None,
         params: dict[str, Any] | None = None,
+        hedge: bool = False,
     ) -> Any:
-        response = await self._make_request(
-            "GET", endpoint, params=params, headers=headers
+        """
+        Sends a GET request. Concurrent identical requests, with the same
+        endpoint, params and credentials, share the same upstream call,
+        so the returned response must not be modified.
+        The shared call is not bound by the deadline of any inbound request,
+        every caller waits for it until its own deadline, then gets a 504.
+        :param hedge: If True, and the request doesn't answer within the
+        configured percentile of the recent latency of the endpoint, a second
+        identical request is sent, within the hedge budget. The first response
+        wins and the other request is cancelled.
+        """
+        if (remaining := get_remaining_time()) is not None and remaining <= 0:
+            logger.warning(f"Deadline exceeded, not sending GET {endpoint}")
+            return build_deadline_exceeded_response()
+        key = build_request_key(self.base_url, endpoint, headers, params)
+        if upstream_single_flight.is_in_flight(key):
+            count_coalesced_request(self.upstream, endpoint)
+        else:
+            record_upstream_call()
+        if hedge:
+            func = partial(
+                self._make_hedged_request, endpoint, params=params, headers=headers
+            )
+        else:
+            func = partial(
+                self._make_request, "GET", endpoint, params=params, headers=headers
+            )
+        try:
+            # the shared call has no deadline, every caller waits for its own
+            return await upstream_single_flight.do(key, func, timeout=remaining)
+        except TimeoutError:
+            logger.warning(f"Deadline exceeded while waiting for GET {endpoint}")
+            return build_deadline_exceeded_response()
+        except asyncio.CancelledError:
+            context = get_request_context()
+            if context is not None and context.client_disconnected:
+                count_cancelled_request(self.upstream, endpoint)
+            raise
+
+    async def _make_hedged_request(
+        self,
+        endpoint: str,
+        headers: dict[str, Any] | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Sends a GET request and, if it's slower than usual, a hedge.
+        :return: The response of the request that answered first
+        """
+        hedge_budget.deposit()
+        first = asyncio.ensure_future(
+            self._make_request("GET", endpoint, params=params, headers=headers)
+        )
+        hedge = None
+        try:
+            delay = get_hedging_delay(self.upstream, endpoint)
+            if delay is None:
+                return await first
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if first in done:
+                return first.result()
+            allowed = hedge_budget.withdraw()
+            count_upstream_hedge(self.upstream, endpoint, allowed=allowed)
+            if not allowed:
+                return await first
+            logger.info(f"Hedging GET {endpoint} after {delay:.3f}s")
+            hedge = asyncio.ensure_future(
+                self._make_request("GET", endpoint, params=params, headers=headers)
+            )
+            await asyncio.wait({first, hedge}, return_when=asyncio.FIRST_COMPLETED)
+            if first.done():
+                return first.result()
+            count_upstream_hedge_won(self.upstream, endpoint)
+            return hedge.result()
+        finally:
+            # cancel the loser, or both requests if the caller has been cancelled
+            for task in (first, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def get_passthrough(
+        self,
+        endpoint: str,
+        headers: dict[str, Any] | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Sends a GET request whose successful response is not parsed but
+        streamed to the client, as returned by the upstream, through
+        build_passthrough_response(). To be used by the endpoints which
+        don't transform the payload.
+        Retries, circuit breaker, concurrency limit, deadline and metrics
+        apply as for any request, while errors are returned like get() does.
+        A stream can only be read once, so the request is neither coalesced
+        with identical ones nor hedged.
+        :return: A dict like
+        {"status_code": 200, "headers": {"content-type": ...}, "stream": <bytes>}
+        on success
+        """
+        return await self._make_request(
+            "GET", endpoint, params=params, headers=headers, stream=True
         )
-        return response
 
     async def post(
         self,
@@ -177,5 +868,9 @@ class APIClient:
         return response
 
     async def close(self):
-        """Close the client connection."""
-        await self.client.aclose()
+        """
+        Does nothing, kept for the existing callers. The connection pool is
+        shared by all the APIClient instances of the process using the same
+        base_url, so it must outlive any of them: it's closed by the
+        application lifespan through close_http_clients().
+        """
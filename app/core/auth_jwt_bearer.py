@@ -1,4 +1,6 @@
+import hashlib
 import logging
+import time
 from typing import Optional
 
 import jwt
@@ -13,9 +15,11 @@ from jwt.exceptions import (
 from starlette import status as http_status
 
 from app import settings
+from app.core.cache import TTLCache
 from app.core.exceptions import (
     AuthException,
 )
+from app.core.metrics import register_cache
 
 JWT_SECRET = settings.jwt_secret
 JWT_ALGORITHM = "HS256"
@@ -25,6 +29,10 @@ JWT_LEEWAY = settings.jwt_leeway
 
 logger = logging.getLogger(__name__)
 
+# digest of the token -> True, for the tokens that have already been verified
+verified_jwt_cache = TTLCache(max_size=settings.jwt_cache_max_size)
+register_cache("verified_jwt", verified_jwt_cache)
+
 
 def decode_jwt(token: str) -> Optional[dict]:  # noqa: UP007
     """
@@ -65,20 +73,35 @@ def decode_jwt(token: str) -> Optional[dict]:  # noqa: UP007
     return None
 
 
+def get_token_digest(token: str) -> str:
+    """
+    Returns the SHA-256 digest of the given token, so that the raw
+    token is never used as a cache key.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def verify_jwt(jw_token: str) -> bool:
     """
     Verifies the validity of a JWT token by decoding it and checking its claims.
+    Valid tokens are cached until their expiration (minus the leeway), so that
+    replayed tokens skip the signature verification.
 
     :param jw_token: The JWT token to verify.
     :return: `True` if the token is valid and contains
     the expected claims, otherwise `False`.
 
     """
-    is_token_valid = False
+    token_digest = get_token_digest(jw_token)
+    if verified_jwt_cache.get(token_digest):
+        return True
     payload = decode_jwt(jw_token)
-    if payload is not None:
-        is_token_valid = True
-    return is_token_valid
+    if payload is None:
+        return False
+    verified_jwt_cache.set(
+        token_digest, True, ttl=payload["exp"] - time.time() - JWT_LEEWAY
+    )
+    return True
 
 
 class JWTBearer(HTTPBearer):
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from typing import Any, TypeVar
+
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse
+from starlette import status as http_status
+from starlette.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+BULK_ITEM_ERROR_CODE = "bulk_item_failed"
+
+T = TypeVar("T")
+BulkOperation = Callable[[T], Awaitable[dict[str, Any]]]
+
+
+def build_item_result(status_code: int, data: Any) -> dict[str, Any]:
+    """
+    Builds the result of an item of a bulk request that has succeeded.
+    :param status_code: The HTTP status code of the item, like 201
+    :param data: The response of the item, as returned by the single endpoint
+    :return: A dict like {"status_code": 201, "data": {...}}
+    """
+    return {"status_code": status_code, "data": data}
+
+
+def build_item_error(error: Exception) -> dict[str, Any]:
+    """
+    Builds the result of an item of a bulk request that has failed,
+    with the status code and the error payload that format_error_response()
+    returns for the same error from the single endpoint.
+    :param error: The exception raised by the item
+    :return: A dict like {"status_code": 403, "error": {...}}
+    """
+    return {
+        "status_code": getattr(error, "status_code", http_status.HTTP_403_FORBIDDEN),
+        "error": getattr(error, "error", str(error)),
+    }
+
+
+async def run_bulk(
+    items: Sequence[T], operation: BulkOperation, concurrency: int
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Runs the operation on every item, with at most `concurrency` items
+    in progress, and yields the results as soon as they complete.
+    Every result has the "index" of its item in the request.
+    An unexpected exception of an item is turned into a 500 result of that
+    item, so that it doesn't fail the whole batch.
+    If the caller stops the iteration, or it's cancelled because the client
+    has disconnected, the items still in progress are cancelled.
+
+    :param items: The items of the bulk request
+    :param operation: The coroutine function that processes an item and
+    returns its result, built with build_item_result() or build_item_error()
+    :param concurrency: The maximum number of items processed at the same time
+    :return: An async iterator of the results, in completion order
+    """
+    pending = iter(enumerate(items))
+    results: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    async def work():
+        for index, item in pending:
+            try:
+                result = await operation(item)
+            except Exception as error:
+                logger.exception(f"Unexpected error processing the bulk item {index}")
+                result = {
+                    "status_code": http_status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "error": {
+                        "status_code": http_status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        "reason": str(error) or error.__class__.__name__,
+                        "error_code": BULK_ITEM_ERROR_CODE,
+                        "params": [],
+                    },
+                }
+            results.put_nowait({"index": index, **result})
+
+    workers = [
+        asyncio.create_task(work()) for _ in range(max(1, min(concurrency, len(items))))
+    ]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def accepts_ndjson(request: Request) -> bool:
+    """
+    Returns True if the caller has asked to receive the results of a bulk
+    request as NDJSON, while they complete, with the Accept header.
+    """
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def build_bulk_response(
+    results: AsyncIterator[dict[str, Any]], stream: bool
+) -> ORJSONResponse | StreamingResponse:
+    """
+    Builds the response of a bulk request.
+    :param results: The results yielded by run_bulk()
+    :param stream: If True, the results are streamed as NDJSON, one line
+    per item in completion order. Otherwise, they are collected and
+    returned as {"results": [...]} in the order of the items.
+    :return: The response, which is 200 OK even if some items have failed,
+    every result has its own status code
+    """
+    if stream:
+
+        async def iter_lines() -> AsyncIterator[bytes]:
+            async for result in results:
+                yield orjson.dumps(result) + b"\n"
+
+        return StreamingResponse(iter_lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    collected = [result async for result in results]
+    collected.sort(key=lambda result: result["index"])
+    return ORJSONResponse(
+        status_code=http_status.HTTP_200_OK, content={"results": collected}
+    )
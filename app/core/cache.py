@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    A bounded, in-process LRU cache where every entry expires after its own TTL.
+
+    Attributes:
+        max_size (int): The maximum number of entries kept in the cache.
+        hits (int): The number of lookups that found a valid entry.
+        misses (int): The number of lookups that found no entry or an expired one.
+        evictions (int): The number of entries removed to make room for new ones.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value stored for the given key if it's not expired,
+        otherwise the default value.
+        :param key: The key to look up
+        :param default: The value to return if there is no valid entry
+        :return: The cached value or the default one
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """
+        Stores the value for the given key. If the cache is full,
+        the least recently used entries are evicted.
+        :param key: The key to store the value for
+        :param value: The value to store
+        :param ttl: The time to live of the entry in seconds. Entries with
+        a TTL lower or equal to zero are not stored at all.
+        """
+        if ttl <= 0 or self.max_size <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Removes the entry for the given key.
+        :param key: The key to remove
+        :param default: The value to return if the key is not cached
+        :return: The removed value or the default one
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def clear(self):
+        """Removes all the entries and resets the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the cache counters, like
+        {"size": 10, "max_size": 1024, "hits": 120, "misses": 10, "evictions": 0}
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class StaleWhileRevalidateCache:
+    """
+    A bounded, in-process LRU cache whose entries are fresh for `ttl` seconds,
+    then served stale for `stale_ttl` more seconds while a single background
+    task refreshes them. Concurrent loads of the same missing key share
+    the same call to the loader.
+
+    Attributes:
+        max_size (int): The maximum number of entries kept in the cache.
+        ttl (float): How long an entry is fresh, in seconds. The cache is
+        disabled when it's lower or equal to zero.
+        stale_ttl (float): How long an entry can be served stale, in seconds.
+        hits (int): The number of lookups that found a fresh entry.
+        misses (int): The number of lookups that found no entry or an expired one.
+        stale (int): The number of lookups that found a stale entry.
+        evictions (int): The number of entries removed to make room for new ones.
+    """
+
+    def __init__(self, max_size: int, ttl: float, stale_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, float, Any]] = OrderedDict()
+        self._loads: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        Returns the value stored for the given key, loading it if it's missing
+        or expired. A stale value is returned straight away, and refreshed
+        in background, outside the context of the current request.
+        A missing value is loaded outside the context of the current request
+        too, as the load is shared with the callers of the other requests,
+        and every caller waits for it within its own timeout.
+        The errors of the loader are raised to the callers waiting for it,
+        and logged for the background refreshes, which keep the stale value.
+        :param key: The key to look up
+        :param loader: A function returning the awaitable that loads the value
+        :param timeout: The time the caller waits for a missing value,
+        in seconds, or None to wait until it's loaded
+        :raises TimeoutError: If the value is not loaded within the timeout
+        :return: The cached or loaded value
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            fresh_until, stale_until, value = entry
+            now = time.monotonic()
+            if now < stale_until:
+                self._entries.move_to_end(key)
+                if now < fresh_until:
+                    self.hits += 1
+                else:
+                    self.stale += 1
+                    self._load(key, loader, context=contextvars.Context())
+                return value
+            del self._entries[key]
+        self.misses += 1
+        load = self._load(key, loader, context=contextvars.Context())
+        # the load goes on if the caller is cancelled, or gives up,
+        # to serve the next ones
+        async with asyncio.timeout(timeout):
+            return await asyncio.shield(load)
+
+    def _load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        context: contextvars.Context,
+    ) -> asyncio.Task:
+        task = self._loads.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._store(key, loader), name=f"cache load {key}", context=context
+            )
+            self._loads[key] = task
+            task.add_done_callback(lambda done: self._loaded(key, done))
+        return task
+
+    async def _store(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        value = await loader()
+        # an invalidated load must not store a value which may be outdated
+        if self._loads.get(key) is asyncio.current_task():
+            self.set(key, value)
+        return value
+
+    def _loaded(self, key: Hashable, task: asyncio.Task):
+        if self._loads.get(key) is task:
+            del self._loads[key]
+        if not task.cancelled() and (error := task.exception()) is not None:
+            logger.warning(f"Failed to load the cache entry {key}: {error}")
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Stores the value for the given key. If the cache is full,
+        the least recently used entries are evicted.
+        :param key: The key to store the value for
+        :param value: The value to store
+        """
+        if not self.enabled:
+            return
+        fresh_until = time.monotonic() + self.ttl
+        self._entries[key] = (fresh_until, fresh_until + self.stale_ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """
+        Removes the entry for the given key, and makes sure that
+        a load already in progress doesn't store its value.
+        :param key: The key to remove
+        """
+        self._entries.pop(key, None)
+        self._loads.pop(key, None)
+
+    def clear(self):
+        """Removes all the entries and resets the counters."""
+        self._entries.clear()
+        self._loads.clear()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the cache counters, like
+        {"size": 10, "max_size": 1024, "hits": 120, "misses": 10,
+        "stale": 5, "evictions": 0}
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
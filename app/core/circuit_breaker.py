@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+from starlette import status as http_status
+
+from app import settings
+from app.core.exceptions import build_error_response
+from app.core.metrics import (
+    UPSTREAM_CIRCUIT_REJECTIONS,
+    UPSTREAM_CIRCUIT_STATE,
+    get_endpoint_template,
+)
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_OPEN_ERROR_CODE = "circuit_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of an upstream endpoint family and fails fast while
+    the endpoint is known to be unhealthy.
+
+    - closed: requests go through. After `failure_threshold` consecutive
+      failures (5xx responses or connection errors) the circuit opens.
+    - open: requests are rejected without contacting the upstream.
+      After `recovery_timeout` seconds the circuit becomes half-open.
+    - half_open: up to `half_open_max_calls` probe requests go through.
+      A success closes the circuit, a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        upstream: str,
+        endpoint: str,
+        failure_threshold: int,
+        recovery_timeout: float,
+        half_open_max_calls: int,
+    ):
+        self.upstream = upstream
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(
+                f"Circuit breaker for {self.upstream} {self.endpoint} "
+                f"moved from {self.state} to {state}"
+            )
+        self.state = state
+        UPSTREAM_CIRCUIT_STATE.labels(
+            upstream=self.upstream, endpoint=self.endpoint
+        ).set(self.STATE_VALUES[state])
+
+    def allow_request(self) -> bool:
+        """
+        Checks if a request can be sent to the upstream.
+        :return: True if the request can go through, False if it must fail fast
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return self._reject()
+            self._set_state(self.HALF_OPEN)
+            self.half_open_calls = 0
+        if self.state == self.HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                return self._reject()
+            self.half_open_calls += 1
+        return True
+
+    def _reject(self) -> bool:
+        UPSTREAM_CIRCUIT_REJECTIONS.labels(
+            upstream=self.upstream, endpoint=self.endpoint
+        ).inc()
+        return False
+
+    def record_result(self, status_code: int):
+        """
+        Records the outcome of a request allowed by allow_request().
+        :param status_code: The status code returned by the upstream, where
+        5xx codes, including the synthetic 503 for connection errors, are failures
+        """
+        if status_code < http_status.HTTP_500_INTERNAL_SERVER_ERROR:
+            self.failures = 0
+            self._set_state(self.CLOSED)
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def release(self):
+        """
+        Releases a request allowed by allow_request() that completed without
+        an outcome, e.g. because it has been cancelled.
+        """
+        if self.state == self.HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+
+# (upstream, endpoint template) -> CircuitBreaker
+circuit_breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+
+def get_circuit_breaker(upstream: str, endpoint: str) -> CircuitBreaker:
+    """
+    Returns the circuit breaker for the given upstream and endpoint family.
+    :param upstream: The upstream name, like "auth" or "rest"
+    :param endpoint: The endpoint as sent to the upstream
+    :return: The CircuitBreaker shared by all the requests to the same endpoint family
+    """
+    key = (upstream, get_endpoint_template(endpoint))
+    breaker = circuit_breakers.get(key)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            upstream=key[0],
+            endpoint=key[1],
+            failure_threshold=settings.circuit_breaker_failure_threshold,
+            recovery_timeout=settings.circuit_breaker_recovery_timeout,
+            half_open_max_calls=settings.circuit_breaker_half_open_max_calls,
+        )
+        circuit_breakers[key] = breaker
+    return breaker
+
+
+def build_circuit_open_response(breaker: CircuitBreaker) -> dict[str, Any]:
+    """
+    Builds the response returned instead of contacting an unhealthy upstream.
+    It has the same shape of the OptScale error responses, so that
+    raise_api_response_exception() turns it into an APIResponseError.
+    """
+    return build_error_response(
+        status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+        title="OptScale API unavailable",
+        reason=(
+            f"The OptScale {breaker.upstream} API is temporarily unavailable "
+            f"for {breaker.endpoint}"
+        ),
+        error_code=CIRCUIT_OPEN_ERROR_CODE,
+        params=[breaker.upstream, breaker.endpoint],
+    )
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from starlette import status as http_status
+
+from app import settings
+from app.core.exceptions import build_error_response
+from app.core.metrics import (
+    UPSTREAM_CONCURRENCY_IN_FLIGHT,
+    UPSTREAM_CONCURRENCY_LIMIT,
+    UPSTREAM_CONCURRENCY_REJECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_LIMIT_ERROR_CODE = "concurrency_limit"
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bounds the number of concurrent requests sent to an upstream, adapting
+    the limit to the observed latency with an AIMD algorithm:
+
+    - additive increase: every request completed within `latency_threshold`
+      seconds, while the limit is being used, adds 1/limit to the limit,
+      so the limit grows by about one every `limit` requests.
+    - multiplicative decrease: a slow or failed (5xx) request multiplies
+      the limit by `backoff_ratio`, at most once every `decrease_interval`
+      seconds, so that a burst of failures of the requests that were in flight
+      at the same time shrinks the limit once, not once per request.
+
+    When the limit is reached, requests wait for a free slot up to
+    `queue_timeout` seconds, then they are rejected.
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        latency_threshold: float,
+        backoff_ratio: float,
+        queue_timeout: float,
+        decrease_interval: float,
+    ):
+        self.upstream = upstream
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.queue_timeout = queue_timeout
+        self.decrease_interval = decrease_interval
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.in_flight = 0
+        self.rejections = 0
+        self._last_decrease: float | None = None
+        self._waiters: deque[asyncio.Future] = deque()
+        self._update_metrics()
+
+    def _update_metrics(self):
+        UPSTREAM_CONCURRENCY_LIMIT.labels(upstream=self.upstream).set(int(self.limit))
+        UPSTREAM_CONCURRENCY_IN_FLIGHT.labels(upstream=self.upstream).set(
+            self.in_flight
+        )
+
+    def _has_free_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _wake_up_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def acquire(self, timeout: float | None = None) -> bool:
+        """
+        Acquires a slot for a new request, waiting up to queue_timeout seconds.
+        :param timeout: A shorter time to wait, like the time left before
+        the deadline of the inbound request
+        :return: True if the request can be sent, False if it has been rejected
+        """
+        if self._has_free_slot():
+            self.in_flight += 1
+            self._update_metrics()
+            return True
+
+        loop = asyncio.get_running_loop()
+        queue_timeout = self.queue_timeout
+        if timeout is not None:
+            queue_timeout = min(queue_timeout, timeout)
+        deadline = loop.time() + queue_timeout
+        while (timeout := deadline - loop.time()) > 0:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except (TimeoutError, asyncio.CancelledError) as error:
+                if waiter.done() and not waiter.cancelled():
+                    # the wake-up would be lost, pass it to the next waiter
+                    self._wake_up_waiter()
+                if isinstance(error, asyncio.CancelledError):
+                    raise
+                break
+            if self._has_free_slot():
+                self.in_flight += 1
+                self._update_metrics()
+                return True
+
+        self.rejections += 1
+        UPSTREAM_CONCURRENCY_REJECTIONS.labels(upstream=self.upstream).inc()
+        logger.warning(
+            f"Concurrency limit {int(self.limit)} reached for the {self.upstream} API"
+        )
+        return False
+
+    def _decrease(self):
+        now = time.monotonic()
+        if (
+            self._last_decrease is not None
+            and now - self._last_decrease < self.decrease_interval
+        ):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+
+    def release(
+        self,
+        latency: float | None = None,
+        status_code: int | None = None,
+        latency_threshold: float | None = None,
+    ):
+        """
+        Releases the slot acquired by a request and adapts the limit.
+        :param latency: The duration of the request in seconds, or None if
+        the request has not completed (e.g. it has been cancelled)
+        :param status_code: The status code of the response
+        :param latency_threshold: The latency above which the request is slow,
+        for the endpoints expected to be slower, or faster, than the others.
+        Defaults to the latency_threshold of the limiter
+        """
+        if latency_threshold is None:
+            latency_threshold = self.latency_threshold
+        was_limited = self.in_flight >= int(self.limit) / 2
+        self.in_flight -= 1
+        if latency is not None:
+            failed = (
+                status_code is not None
+                and status_code >= http_status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+            if failed or latency > latency_threshold:
+                self._decrease()
+            elif was_limited:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._update_metrics()
+        for _ in range(int(self.limit) - self.in_flight):
+            self._wake_up_waiter()
+
+
+# upstream -> AdaptiveConcurrencyLimiter
+concurrency_limiters: dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def get_concurrency_limiter(upstream: str) -> AdaptiveConcurrencyLimiter:
+    """
+    Returns the concurrency limiter of the given upstream.
+    :param upstream: The upstream name, like "auth" or "rest"
+    :return: The AdaptiveConcurrencyLimiter shared by all the requests to the upstream
+    """
+    limiter = concurrency_limiters.get(upstream)
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(
+            upstream=upstream,
+            initial_limit=settings.concurrency_limit_initial,
+            min_limit=settings.concurrency_limit_min,
+            max_limit=settings.concurrency_limit_max,
+            latency_threshold=settings.concurrency_limit_latency_threshold,
+            backoff_ratio=settings.concurrency_limit_backoff_ratio,
+            queue_timeout=settings.concurrency_limit_queue_timeout,
+            decrease_interval=settings.concurrency_limit_decrease_interval,
+        )
+        concurrency_limiters[upstream] = limiter
+    return limiter
+
+
+def build_concurrency_limit_response(
+    limiter: AdaptiveConcurrencyLimiter,
+) -> dict[str, Any]:
+    """
+    Builds the response returned when a request is rejected by the limiter.
+    It has the same shape of the OptScale error responses, so that
+    raise_api_response_exception() turns it into an APIResponseError.
+    """
+    return build_error_response(
+        status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
+        title="OptScale API overloaded",
+        reason=(f"Too many concurrent requests to the OptScale {limiter.upstream} API"),
+        error_code=CONCURRENCY_LIMIT_ERROR_CODE,
+        params=[limiter.upstream],
+    )
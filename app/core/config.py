@@ -1,19 +1,135 @@
 import pathlib
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 PROJECT_ROOT = pathlib.Path(__file__).parent.parent
 
 
+class TimeoutProfile(BaseModel):
+    """
+    The timeouts, in seconds, of each phase of an upstream call:
+    opening the connection, reading the response, sending the request
+    and acquiring a connection from the pool.
+    """
+
+    connect: float
+    read: float
+    write: float
+    pool: float
+
+
 class Settings(BaseSettings):
     # Base
     jwt_secret: str
     jwt_leeway: float = 30.0
+    jwt_cache_max_size: int = 1024
     optscale_auth_api_base_url: str
     optscale_rest_api_base_url: str
     optscale_cluster_secret: str
     debug: bool = False
-    default_request_timeout: int = 10  # API Client
+    request_log_sample_rate: float = 1.0
+    # Time budget of the inbound requests, in seconds, unless shortened
+    # by the X-Request-Timeout header. Routes are like "POST /organizations".
+    # It must outlast the "slow" timeout profile, used to obtain the user
+    # tokens, and twice that for the routes that also create a resource with it
+    request_deadline_default: float | None = 40.0
+    request_deadline_routes: dict[str, float] = {
+        "POST /users": 75.0,
+        "POST /organizations": 75.0,
+        "POST /organizations/{org_id}/cloud_accounts": 75.0,
+        "POST /users/bulk": 120.0,
+        "POST /organizations/lookup": 60.0,
+        "POST /organizations/{org_id}/cloud_accounts/bulk": 120.0,
+    }
+    default_request_timeout: int = 10  # API Client, read and write timeout
+    api_client_connect_timeout: float = 5.0
+    api_client_max_connections: int = 100
+    api_client_max_keepalive_connections: int = 20
+    api_client_keepalive_expiry: float = 5.0
+    api_client_http2: bool = False
+    api_client_pool_timeout: float = 5.0
+    # Named timeout profiles, assigned to endpoints by the OptScale API wrappers
+    api_client_timeout_profiles: dict[str, TimeoutProfile] = {
+        "fast": TimeoutProfile(connect=2.0, read=3.0, write=3.0, pool=1.0),
+        "slow": TimeoutProfile(connect=5.0, read=30.0, write=10.0, pool=5.0),
+    }
+    api_client_max_retries: int = 2
+    api_client_retry_backoff_base: float = 0.1
+    api_client_retry_backoff_max: float = 2.0
+    api_client_retry_budget_ratio: float = 0.1
+    api_client_retry_budget_max_tokens: float = 10.0
+    api_client_hedging_percentile: float = 95.0
+    api_client_hedging_min_delay: float = 0.05
+    api_client_hedging_window_size: int = 200
+    api_client_hedging_min_samples: int = 20
+    api_client_hedging_budget_ratio: float = 0.05
+    api_client_hedging_budget_max_tokens: float = 10.0
+    circuit_breaker_failure_threshold: int = 5
+    circuit_breaker_recovery_timeout: float = 30.0
+    circuit_breaker_half_open_max_calls: int = 1
+    single_flight_max_keys: int = 1000
+    concurrency_limit_initial: int = 20
+    concurrency_limit_min: int = 1
+    concurrency_limit_max: int = 100
+    # Latency above which an upstream call is slow, for the endpoints with
+    # the default timeout, scaled for the ones with a longer timeout profile
+    concurrency_limit_latency_threshold: float = 2.0
+    concurrency_limit_backoff_ratio: float = 0.9
+    concurrency_limit_queue_timeout: float = 1.0
+    # The limit is decreased at most once per interval, in seconds
+    concurrency_limit_decrease_interval: float = 1.0
+    # Forward the OptScale routes the modifier does not override, like
+    # "GET /restapi/v2/organizations/{id}", except the blocked ones
+    optscale_proxy_enabled: bool = False
+    optscale_proxy_blocked_routes: list[str] = [
+        "POST /auth/v2/users",
+        "POST /restapi/v2/organizations",
+        "DELETE /restapi/v2/organizations/{id}",
+        "POST /restapi/v2/organizations/{id}/cloud_accounts",
+    ]
+    user_token_cache_max_size: int = 1024  # OptScale user access tokens
+    user_token_cache_safety_margin: int = 300
+    # Positive answers of OptScale to the authorization checks, in seconds,
+    # never cached beyond the expiration of the token. Disabled if 0
+    authorization_cache_max_size: int = 1024
+    authorization_cache_ttl: float = 30.0
+    # Invitation lookups of the unauthenticated registrations, by email,
+    # in seconds, for the emails with and without invitations
+    invitation_cache_max_size: int = 1024
+    invitation_cache_ttl: float = 60.0
+    invitation_cache_negative_ttl: float = 10.0
+    # Organization lists, served stale for org_list_cache_stale_ttl seconds
+    # after org_list_cache_ttl while refreshed. Disabled if the TTL is 0,
+    # then GET /organizations streams the OptScale body without parsing it
+    org_list_cache_max_size: int = 1024
+    org_list_cache_ttl: float = 30.0
+    org_list_cache_stale_ttl: float = 300.0
+    # Background jobs, like the removal of the users who declined
+    # an invitation, stored in a SQLite database shared by the workers.
+    # The lease of a running job is renewed every third of its timeout,
+    # the failed jobs are kept job_queue_retention seconds
+    job_queue_database: str = "jobs.sqlite3"
+    job_queue_workers: int = 4
+    job_queue_max_attempts: int = 5
+    job_queue_backoff_base: float = 2.0
+    job_queue_backoff_max: float = 300.0
+    job_queue_poll_interval: float = 1.0
+    job_queue_lease_timeout: float = 300.0
+    job_queue_retention: float = 604800.0
+    # Bulk endpoints: the items processed at the same time by a request,
+    # and the maximum number of items of a request
+    bulk_concurrency: int = 10
+    bulk_max_items: int = 500
+    # Responses of the POST requests with an Idempotency-Key header, replayed
+    # to their retries for idempotency_ttl seconds. Disabled if the TTL is 0.
+    # With a database path, they are also shared by the workers through
+    # SQLite, except the responses holding secrets, like the user tokens,
+    # which are kept in memory only
+    idempotency_max_size: int = 10000
+    idempotency_ttl: float = 3600.0
+    idempotency_lock_timeout: float = 60.0
+    idempotency_database: str | None = None
 
     model_config = SettingsConfigDict(
         env_file=PROJECT_ROOT / ".env",
@@ -2,8 +2,8 @@ from __future__ import annotations
 
 import logging
 
+from fastapi.responses import ORJSONResponse
 from starlette import status as http_status
-from starlette.responses import JSONResponse
 
 logger = logging.getLogger(__name__)
 
@@ -95,7 +95,7 @@ def format_error_response(error):
         error_payload = error.error
     else:
         error_payload = str(error)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status_code,
         content={"error": error_payload},
     )
@@ -117,3 +117,42 @@ def raise_api_response_exception(response):
         reason=error_payload.get("reason", "No details available"),
         status_code=response.get("status_code", http_status.HTTP_403_FORBIDDEN),
     )
+
+
+def build_error_response(
+    status_code: int,
+    title: str,
+    reason: str,
+    error_code: str,
+    params: list = None,
+) -> dict:
+    """
+    Builds an APIClient response with the same shape of the OptScale errors,
+    for the errors raised locally instead of contacting OptScale.
+    The raise_api_response_exception() function turns it into an APIResponseError.
+
+    :param status_code: The HTTP status code
+    :param title: A short title describing the error
+    :param reason: A detailed reason explaining the cause of the error
+    :param error_code: A specific error code
+    :param params: The error params
+    :return: A dict like
+        {
+            "status_code": 503,
+            "data": {"error": {"title": "...", "reason": "...", ...}},
+            "error": "..."
+        }
+    """
+    return {
+        "status_code": status_code,
+        "data": {
+            "error": {
+                "title": title,
+                "status_code": status_code,
+                "error_code": error_code,
+                "reason": reason,
+                "params": params if params is not None else [],
+            }
+        },
+        "error": f"{title}: {reason}",
+    }
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+
+from app import settings
+from app.core.metrics import get_endpoint_template
+from app.core.retry import RetryBudget
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent latencies of every upstream endpoint family,
+    to decide when a request is slow enough to be hedged.
+
+    Attributes:
+        window_size (int): The number of latencies kept per endpoint family.
+        min_samples (int): The number of latencies needed to compute a percentile.
+    """
+
+    def __init__(self, window_size: int, min_samples: int):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self._latencies: dict[tuple[str, str], deque[float]] = {}
+
+    def clear(self):
+        self._latencies.clear()
+
+    def record(self, upstream: str, endpoint: str, latency: float):
+        """
+        Records the latency of a request.
+        :param upstream: The upstream name, like "auth" or "rest"
+        :param endpoint: The endpoint as sent to the upstream
+        :param latency: The duration of the request in seconds
+        """
+        key = (upstream, get_endpoint_template(endpoint))
+        latencies = self._latencies.get(key)
+        if latencies is None:
+            latencies = self._latencies[key] = deque(maxlen=self.window_size)
+        latencies.append(latency)
+
+    def get_percentile(
+        self, upstream: str, endpoint: str, percentile: float
+    ) -> float | None:
+        """
+        Computes a percentile of the recent latencies of an endpoint family.
+        :param upstream: The upstream name, like "auth" or "rest"
+        :param endpoint: The endpoint as sent to the upstream
+        :param percentile: The percentile, like 95
+        :return: The latency in seconds, or None if there are not enough samples
+        """
+        latencies = self._latencies.get((upstream, get_endpoint_template(endpoint)))
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = math.ceil(percentile / 100 * len(ordered)) - 1
+        return ordered[max(0, min(index, len(ordered) - 1))]
+
+
+latency_tracker = LatencyTracker(
+    window_size=settings.api_client_hedging_window_size,
+    min_samples=settings.api_client_hedging_min_samples,
+)
+
+# Every hedged GET deposits `ratio` tokens, every hedge withdraws one token
+hedge_budget = RetryBudget(
+    ratio=settings.api_client_hedging_budget_ratio,
+    max_tokens=settings.api_client_hedging_budget_max_tokens,
+)
+
+
+def get_hedging_delay(upstream: str, endpoint: str) -> float | None:
+    """
+    Returns how long to wait for the first attempt before sending a hedge.
+    :param upstream: The upstream name, like "auth" or "rest"
+    :param endpoint: The endpoint as sent to the upstream
+    :return: The configured percentile of the recent latencies, but not less
+    than the configured minimum delay, or None if the latency is still unknown
+    """
+    delay = latency_tracker.get_percentile(
+        upstream, endpoint, settings.api_client_hedging_percentile
+    )
+    if delay is None:
+        return None
+    return max(delay, settings.api_client_hedging_min_delay)
@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import hmac
+import inspect
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette import status as http_status
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from app import settings
+from app.core.cache import TTLCache
+from app.core.exceptions import APIResponseError, format_error_response
+from app.core.metrics import register_cache
+from app.core.request_context import get_remaining_time, get_request_context
+from app.core.retry import RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENT_REPLAYED_HEADER = "Idempotent-Replayed"
+# The longest Idempotency-Key accepted from the caller
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+INVALID_IDEMPOTENCY_KEY_ERROR_CODE = "invalid_idempotency_key"
+IDEMPOTENCY_KEY_REUSED_ERROR_CODE = "idempotency_key_reused"
+IDEMPOTENCY_KEY_IN_PROGRESS_ERROR_CODE = "idempotency_key_in_progress"
+# The responses not stored, so that the retries run the request again
+NOT_STORED_STATUS_CODES = {
+    http_status.HTTP_408_REQUEST_TIMEOUT,
+    http_status.HTTP_409_CONFLICT,
+    http_status.HTTP_429_TOO_MANY_REQUESTS,
+    *RETRYABLE_STATUS_CODES,
+}
+
+SCHEMA = (
+    # a row without status_code is a request in progress in some worker
+    """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        fingerprint TEXT,
+        status_code INTEGER,
+        media_type TEXT,
+        body BLOB,
+        expires_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)",
+)
+
+
+class IdempotencyKeyError(Exception):
+    """
+    Raised when a request can't be run or replayed for its Idempotency-Key.
+    """
+
+    def __init__(self, status_code: int, reason: str, error_code: str):
+        self.status_code = status_code
+        self.reason = reason
+        self.error_code = error_code
+
+
+class StoredResponse:
+    """
+    The response of a request with an Idempotency-Key, replayed to its retries.
+
+    Attributes:
+        fingerprint (str): The digest of the parameters of the request.
+        status_code (int): The HTTP status code of the response.
+        media_type (str | None): The media type of the response.
+        body (bytes): The body of the response.
+    """
+
+    def __init__(
+        self, fingerprint: str, status_code: int, media_type: str | None, body: bytes
+    ):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.media_type = media_type
+        self.body = body
+
+    def build_response(self) -> Response:
+        return Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type=self.media_type,
+            headers={IDEMPOTENT_REPLAYED_HEADER: "true"},
+        )
+
+
+class IdempotencyStore:
+    """
+    Keeps the responses of the requests with an Idempotency-Key for `ttl`
+    seconds, in a bounded in-process cache and, if a path is given,
+    in a SQLite database shared by all the workers of the process manager.
+    While a request runs, the requests with the same key wait for its
+    response, in this process, or poll the database for it, if it runs
+    in another process.
+
+    Attributes:
+        max_size (int): The maximum number of responses kept in memory.
+        ttl (float): How long a response is replayed, in seconds.
+        lock_timeout (float): How long a request in progress blocks the
+        requests with the same key, in seconds, in case its worker has died.
+        path (str | None): The path of the SQLite database, if any.
+        poll_interval (float): How often the database is polled, in seconds,
+        while the same key is in progress in another process.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        lock_timeout: float,
+        path: str | None = None,
+        poll_interval: float = 0.1,
+    ):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.path = path
+        self.poll_interval = poll_interval
+        self.responses = TTLCache(max_size=max_size)
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def clear(self):
+        """Removes the responses kept in memory."""
+        self.responses.clear()
+
+    def close(self):
+        """Closes the connection to the database, if any."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _execute(self, query: str, params: tuple = ()) -> tuple[list[tuple], int]:
+        with self._lock:
+            if self._connection is None:
+                connection = sqlite3.connect(
+                    self.path, isolation_level=None, check_same_thread=False
+                )
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA busy_timeout=5000")
+                for statement in SCHEMA:
+                    connection.execute(statement)
+                self._connection = connection
+            cursor = self._connection.execute(query, params)
+            return cursor.fetchall(), cursor.rowcount
+
+    async def _run(self, query: str, params: tuple = ()) -> tuple[list[tuple], int]:
+        # sqlite3 is blocking, keep it out of the event loop
+        return await asyncio.to_thread(self._execute, query, params)
+
+    async def get(self, key: str) -> StoredResponse | None:
+        """
+        Returns the response stored for the given key, if it's not expired.
+        """
+        stored = self.responses.get(key)
+        if stored is not None or self.path is None:
+            return stored
+        rows, _ = await self._run(
+            "SELECT fingerprint, status_code, media_type, body, expires_at "
+            "FROM responses WHERE key = ? AND status_code IS NOT NULL "
+            "AND expires_at > ?",
+            (key, time.time()),
+        )
+        if not rows:
+            return None
+        fingerprint, status_code, media_type, body, expires_at = rows[0]
+        stored = StoredResponse(fingerprint, status_code, media_type, body)
+        self.responses.set(key, stored, ttl=expires_at - time.time())
+        return stored
+
+    async def _claim(self, key: str) -> bool:
+        # only one process at a time can run the request of a key
+        if self.path is None:
+            return True
+        now = time.time()
+        await self._run(
+            "DELETE FROM responses WHERE key = ? AND expires_at <= ?", (key, now)
+        )
+        _, claimed = await self._run(
+            "INSERT OR IGNORE INTO responses (key, expires_at) VALUES (?, ?)",
+            (key, now + self.lock_timeout),
+        )
+        return bool(claimed)
+
+    async def _save(self, key: str, stored: StoredResponse):
+        self.responses.set(key, stored, ttl=self.ttl)
+        if self.path is None:
+            return
+        now = time.time()
+        await self._run(
+            "INSERT OR REPLACE INTO responses "
+            "(key, fingerprint, status_code, media_type, body, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                stored.fingerprint,
+                stored.status_code,
+                stored.media_type,
+                stored.body,
+                now + self.ttl,
+            ),
+        )
+        await self._run("DELETE FROM responses WHERE expires_at <= ?", (now,))
+
+    async def _release(self, key: str):
+        if self.path is None:
+            return
+        await self._run(
+            "DELETE FROM responses WHERE key = ? AND status_code IS NULL", (key,)
+        )
+
+    async def _wait_turn(self, key: str) -> StoredResponse | None:
+        """
+        Waits until the response of the key is stored, and returns it,
+        or until no other request with the same key is in progress:
+        then the key is taken by the caller, which must run the request
+        and resolve the future of the key.
+        """
+        while True:
+            stored = await self.get(key)
+            if stored is not None:
+                return stored
+            future = self._in_flight.get(key)
+            if future is not None:
+                await asyncio.shield(future)
+                continue
+            future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+            try:
+                claimed = await self._claim(key)
+            except BaseException:
+                self._in_flight.pop(key)
+                future.set_result(None)
+                raise
+            if claimed:
+                return None
+            # the request is in progress in another process
+            self._in_flight.pop(key)
+            future.set_result(None)
+            await asyncio.sleep(self.poll_interval)
+
+    async def execute(
+        self, key: str, fingerprint: str, handler: Callable[[], Awaitable[Response]]
+    ) -> Response:
+        """
+        Runs the request of the given key, unless its response is stored,
+        then it's replayed. While the request of the key is in progress,
+        it waits for its response, up to the deadline of the request
+        or lock_timeout seconds.
+        The responses of the server errors and of the retryable errors
+        are not stored, so the next request with the same key runs again.
+
+        :param key: The key, already scoped to the route and the caller
+        :param fingerprint: The digest of the parameters of the request
+        :param handler: The coroutine function that runs the request
+        :return: The response of the request, or the stored one
+        :raise: IdempotencyKeyError if the key has been used for a request
+        with other parameters, or if it's still in progress after the wait
+        """
+        remaining_time = get_remaining_time()
+        wait_timeout = (
+            self.lock_timeout if remaining_time is None else max(0, remaining_time)
+        )
+        try:
+            async with asyncio.timeout(wait_timeout):
+                stored = await self._wait_turn(key)
+        except sqlite3.Error as error:
+            # better run the request than failing it
+            logger.error(f"Failed to look up the Idempotency-Key: {error}")
+            return await handler()
+        except TimeoutError:
+            raise IdempotencyKeyError(
+                status_code=http_status.HTTP_409_CONFLICT,
+                reason="A request with the same Idempotency-Key is in progress",
+                error_code=IDEMPOTENCY_KEY_IN_PROGRESS_ERROR_CODE,
+            ) from None
+
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                raise IdempotencyKeyError(
+                    status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    reason="The Idempotency-Key has been used for another request",
+                    error_code=IDEMPOTENCY_KEY_REUSED_ERROR_CODE,
+                )
+            logger.info("Replaying the response of the Idempotency-Key")
+            return stored.build_response()
+
+        future = self._in_flight[key]
+        try:
+            response = await handler()
+            body = getattr(response, "body", None)
+            if (
+                body is None
+                or response.status_code >= 500
+                or response.status_code in NOT_STORED_STATUS_CODES
+            ):
+                stored = None
+            else:
+                stored = StoredResponse(
+                    fingerprint, response.status_code, response.media_type, body
+                )
+            try:
+                if stored is None:
+                    await self._release(key)
+                else:
+                    await self._save(key, stored)
+            except sqlite3.Error as error:
+                logger.error(f"Failed to store the Idempotency-Key response: {error}")
+            return response
+        except BaseException:
+            try:
+                await self._release(key)
+            except (sqlite3.Error, asyncio.CancelledError):
+                # the lock expires after lock_timeout anyway
+                pass
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+            future.set_result(None)
+
+
+def parse_idempotency_key(value: str | None) -> str | None:
+    """
+    Validates the value of the Idempotency-Key header.
+    :param value: The key sent by the caller
+    :return: The key, or None if it's empty, too long or not made of
+    printable ASCII characters
+    """
+    if not value or len(value) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return None
+    if not (value.isascii() and value.isprintable()):
+        return None
+    return value
+
+
+def get_digest(value: Any) -> str:
+    """
+    Computes the keyed digest of a value serializable to JSON. The digests
+    of the credentials and of the request bodies, which may hold passwords,
+    are stored, so they are keyed with the JWT secret, not to be reversed
+    by guessing the values.
+    """
+    return hmac.new(
+        settings.jwt_secret.encode(),
+        orjson.dumps(value, option=orjson.OPT_SORT_KEYS),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def get_fingerprint(params: dict[str, Any]) -> str:
+    """
+    Computes the digest of the parameters of an endpoint, the path and query
+    parameters and the request body, skipping the injected dependencies.
+    """
+    return get_digest(
+        {
+            name: value.model_dump(mode="json")
+            if isinstance(value, BaseModel)
+            else value
+            for name, value in params.items()
+            if isinstance(value, BaseModel | str | int | float | bool | None)
+        }
+    )
+
+
+idempotency_store = IdempotencyStore(
+    max_size=settings.idempotency_max_size,
+    ttl=settings.idempotency_ttl,
+    lock_timeout=settings.idempotency_lock_timeout,
+    path=settings.idempotency_database,
+)
+register_cache("idempotent_responses", idempotency_store.responses)
+# The responses holding secrets, like the user tokens, never written to disk
+memory_idempotency_store = IdempotencyStore(
+    max_size=settings.idempotency_max_size,
+    ttl=settings.idempotency_ttl,
+    lock_timeout=settings.idempotency_lock_timeout,
+)
+register_cache("idempotent_responses_in_memory", memory_idempotency_store.responses)
+
+
+def idempotent(func=None, *, persist: bool = True):
+    """
+    Makes an endpoint honour the Idempotency-Key header: the response of a
+    request is stored, and it's replayed to the requests with the same key,
+    route, credentials and parameters, without running the endpoint again.
+    The requests without the header run as usual.
+    :param persist: If False, the responses are kept in the memory of the
+    worker only, never in the database shared by the workers, for the
+    endpoints whose responses hold secrets. Use it as @idempotent(persist=False)
+    """
+    if func is None:
+        return functools.partial(idempotent, persist=persist)
+    store = idempotency_store if persist else memory_idempotency_store
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        context = get_request_context()
+        if not store.enabled or context is None:
+            return await func(*args, **kwargs)
+        headers = Headers(scope=context.scope)
+        value = headers.get(IDEMPOTENCY_KEY_HEADER)
+        if value is None:
+            return await func(*args, **kwargs)
+        idempotency_key = parse_idempotency_key(value)
+        if idempotency_key is None:
+            return format_error_response(
+                APIResponseError(
+                    status_code=http_status.HTTP_400_BAD_REQUEST,
+                    title="Invalid Idempotency-Key",
+                    reason=f"The Idempotency-Key must be printable ASCII, up to "
+                    f"{MAX_IDEMPOTENCY_KEY_LENGTH} characters",
+                    error_code=INVALID_IDEMPOTENCY_KEY_ERROR_CODE,
+                )
+            )
+
+        # the same key sent by other callers, or to other routes, is another key
+        route = getattr(context.scope.get("route"), "path", context.scope.get("path"))
+        key = get_digest(
+            [
+                context.scope.get("method"),
+                route,
+                headers.get("authorization", ""),
+                idempotency_key,
+            ]
+        )
+        try:
+            return await store.execute(
+                key=key,
+                fingerprint=get_fingerprint(kwargs),
+                handler=lambda: func(*args, **kwargs),
+            )
+        except IdempotencyKeyError as error:
+            logger.error(f"Idempotency-Key error: {error.reason}")
+            return format_error_response(
+                APIResponseError(
+                    status_code=error.status_code,
+                    title="Idempotency-Key error",
+                    reason=error.reason,
+                    error_code=error.error_code,
+                )
+            )
+
+    # FastAPI resolves the string annotations with the globals of the wrapper
+    wrapper.__signature__ = inspect.signature(func, eval_str=True)
+    return wrapper
@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import orjson
+
+from app import settings
+from app.core.metrics import observe_job, set_job_queue_depth
+
+logger = logging.getLogger(__name__)
+
+# How often the failed jobs older than the retention are deleted, in seconds
+PURGE_INTERVAL = 3600.0
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        run_at REAL NOT NULL,
+        locked_by TEXT,
+        locked_until REAL,
+        last_error TEXT
+    )
+    """,
+    # a job is enqueued once per key, until it has succeeded or failed
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_key ON jobs (name, key)
+    WHERE status IN ('pending', 'running')
+    """,
+    "CREATE INDEX IF NOT EXISTS jobs_next_run ON jobs (status, run_at)",
+)
+
+# Takes the next due job, or a job whose worker has not renewed
+# its lease, like the ones left behind by a recycled gunicorn worker
+CLAIM_QUERY = """
+    UPDATE jobs
+    SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?
+    WHERE id = (
+        SELECT id FROM jobs
+        WHERE (status = 'pending' AND run_at <= ?)
+        OR (status = 'running' AND locked_until <= ?)
+        ORDER BY run_at
+        LIMIT 1
+    )
+    RETURNING id, name, payload, attempts, run_at
+"""
+
+
+class JobQueue:
+    """
+    A durable queue of background jobs, stored in a local SQLite database
+    shared by all the workers of the process manager, and run by a bounded
+    pool of asyncio workers in every process.
+    A failed job is retried with an exponential backoff until it has been
+    attempted max_attempts times, then it's kept with the "failed" status
+    for the retention period. A job which has succeeded is deleted.
+    The worker running a job renews its lease until the job is done,
+    so a job is only run again if its worker has gone away: the handlers
+    must be idempotent.
+
+    Attributes:
+        path (str): The path of the SQLite database.
+        workers (int): The number of jobs run concurrently by this process.
+        max_attempts (int): The number of attempts of a job before giving up.
+        backoff_base (float): The delay before the first retry, in seconds.
+        backoff_max (float): The maximum delay before a retry, in seconds.
+        poll_interval (float): How often idle workers look for due jobs,
+        enqueued by other processes or to be retried, in seconds.
+        lease_timeout (float): How long a job is leased to its worker, which
+        renews the lease every third of it while the job runs, in seconds.
+        retention (float): How long a failed job is kept, in seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        workers: int,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+        poll_interval: float,
+        lease_timeout: float,
+        retention: float,
+    ):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.retention = retention
+        self.handlers: dict[str, JobHandler] = {}
+        self.worker_id = uuid.uuid4().hex
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._wake_up = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._purged_at = 0.0
+
+    def register(self, name: str, handler: JobHandler):
+        """
+        Sets the coroutine function which runs the jobs with the given name.
+        It receives the payload of the job, and raises to have it retried.
+        It can be run again with the same payload if its worker has gone away.
+        """
+        self.handlers[name] = handler
+
+    def _execute(self, query: str, params: tuple = ()) -> tuple[list[tuple], int]:
+        with self._lock:
+            if self._connection is None:
+                connection = sqlite3.connect(
+                    self.path, isolation_level=None, check_same_thread=False
+                )
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA busy_timeout=5000")
+                for statement in SCHEMA:
+                    connection.execute(statement)
+                self._connection = connection
+            cursor = self._connection.execute(query, params)
+            return cursor.fetchall(), cursor.rowcount
+
+    async def _run(self, query: str, params: tuple = ()) -> tuple[list[tuple], int]:
+        # sqlite3 is blocking, keep it out of the event loop
+        return await asyncio.to_thread(self._execute, query, params)
+
+    async def enqueue(self, name: str, key: str, payload: dict[str, Any]) -> bool:
+        """
+        Adds a job to the queue, unless a job with the same name and key
+        is already waiting or running.
+        :param name: The name of the job, like "remove_user"
+        :param key: The idempotency key of the job, like the user ID
+        :param payload: The JSON-serializable arguments of the job
+        :return: True if the job has been added, False if it was already queued
+        """
+        now = time.time()
+        _, added = await self._run(
+            "INSERT OR IGNORE INTO jobs (name, key, payload, created_at, run_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (name, key, orjson.dumps(payload).decode(), now, now),
+        )
+        if added:
+            logger.info(f"Enqueued the job {name} {key}")
+            self._wake_up.set()
+            await self.update_depth()
+        else:
+            logger.info(f"The job {name} {key} is already queued")
+        return bool(added)
+
+    async def update_depth(self):
+        """Updates the queue depth gauge of every registered job."""
+        rows, _ = await self._run(
+            "SELECT name, COUNT(*) FROM jobs "
+            "WHERE status IN ('pending', 'running') GROUP BY name"
+        )
+        depths = dict(rows)
+        for name in self.handlers:
+            set_job_queue_depth(name, depths.get(name, 0))
+
+    def get_retry_delay(self, attempt: int) -> float:
+        """
+        Computes the delay before retrying a job, using an exponential
+        backoff with equal jitter, so that retries are never immediate.
+        :param attempt: The attempt that has failed, starting from 1
+        :return: The delay in seconds
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)  # nosec B311
+
+    async def start(self):
+        """Starts the workers of this process."""
+        if self._tasks:
+            return
+        await self.update_depth()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"job worker {index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} job workers")
+
+    async def stop(self):
+        """
+        Stops the workers. The jobs they were running are put back
+        in the queue, to run again.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    async def _work(self):
+        while True:
+            self._wake_up.clear()
+            try:
+                job = await self._claim()
+            except sqlite3.Error as error:
+                logger.error(f"Failed to get the next job: {error}")
+                job = None
+            if job is None:
+                await self.purge()
+                try:
+                    await asyncio.wait_for(
+                        self._wake_up.wait(), timeout=self.poll_interval
+                    )
+                except TimeoutError:
+                    pass
+                continue
+            await self._process(*job)
+
+    async def purge(self):
+        """
+        Deletes the failed jobs older than the retention, at most once
+        every PURGE_INTERVAL seconds.
+        """
+        now = time.time()
+        if now - self._purged_at < PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        try:
+            _, purged = await self._run(
+                "DELETE FROM jobs WHERE status = 'failed' AND run_at <= ?",
+                (now - self.retention,),
+            )
+        except sqlite3.Error as error:
+            logger.error(f"Failed to purge the failed jobs: {error}")
+            return
+        if purged:
+            logger.info(f"Purged {purged} failed jobs")
+
+    async def _claim(self) -> tuple | None:
+        now = time.time()
+        rows, _ = await self._run(
+            CLAIM_QUERY, (self.worker_id, now + self.lease_timeout, now, now)
+        )
+        return rows[0] if rows else None
+
+    async def _renew_lease(self, job_id: int, name: str):
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            try:
+                _, renewed = await self._run(
+                    "UPDATE jobs SET locked_until = ? WHERE id = ? AND locked_by = ?",
+                    (time.time() + self.lease_timeout, job_id, self.worker_id),
+                )
+            except sqlite3.Error as error:
+                logger.error(
+                    f"Failed to renew the lease of the job {name} {job_id}: {error}"
+                )
+                continue
+            if not renewed:
+                logger.warning(f"Lost the lease of the job {name} {job_id}")
+                return
+
+    async def _process(
+        self, job_id: int, name: str, payload: str, attempts: int, run_at: float
+    ):
+        started_at = time.time()
+        latency = max(0.0, started_at - run_at)
+        try:
+            handler = self.handlers.get(name)
+            if handler is None:
+                raise LookupError(f"No handler for the job {name}")
+            renewal = asyncio.create_task(self._renew_lease(job_id, name))
+            try:
+                await handler(orjson.loads(payload))
+            finally:
+                renewal.cancel()
+        except asyncio.CancelledError:
+            await self._run(
+                "UPDATE jobs SET status = 'pending', locked_by = NULL, "
+                "locked_until = NULL WHERE id = ? AND locked_by = ?",
+                (job_id, self.worker_id),
+            )
+            raise
+        except Exception as error:
+            duration = time.time() - started_at
+            if attempts >= self.max_attempts:
+                logger.error(
+                    f"The job {name} {job_id} has failed {attempts} times: {error}"
+                )
+                outcome = "failed"
+                # run_at becomes the time of the failure, for the retention
+                query = (
+                    "UPDATE jobs SET status = 'failed', run_at = ?, last_error = ?, "
+                    "locked_by = NULL, locked_until = NULL "
+                    "WHERE id = ? AND locked_by = ?"
+                )
+                params = (time.time(), str(error), job_id, self.worker_id)
+            else:
+                delay = self.get_retry_delay(attempts)
+                logger.warning(
+                    f"The job {name} {job_id} has failed, retrying in {delay:.1f}s: "
+                    f"{error}"
+                )
+                outcome = "retried"
+                query = (
+                    "UPDATE jobs SET status = 'pending', run_at = ?, last_error = ?, "
+                    "locked_by = NULL, locked_until = NULL "
+                    "WHERE id = ? AND locked_by = ?"
+                )
+                params = (time.time() + delay, str(error), job_id, self.worker_id)
+        else:
+            duration = time.time() - started_at
+            outcome = "succeeded"
+            query = "DELETE FROM jobs WHERE id = ? AND locked_by = ?"
+            params = (job_id, self.worker_id)
+        observe_job(name, outcome, latency=latency, duration=duration)
+        try:
+            await self._run(query, params)
+            await self.update_depth()
+        except sqlite3.Error as error:
+            logger.error(f"Failed to update the job {name} {job_id}: {error}")
+
+
+job_queue = JobQueue(
+    path=settings.job_queue_database,
+    workers=settings.job_queue_workers,
+    max_attempts=settings.job_queue_max_attempts,
+    backoff_base=settings.job_queue_backoff_base,
+    backoff_max=settings.job_queue_backoff_max,
+    poll_interval=settings.job_queue_poll_interval,
+    lease_timeout=settings.job_queue_lease_timeout,
+    retention=settings.job_queue_retention,
+)
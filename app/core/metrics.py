@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.cache import StaleWhileRevalidateCache, TTLCache
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "modifier_http_request_duration_seconds",
+    "Duration of the inbound HTTP requests served by the modifier.",
+    ["method", "route", "status_code"],
+    buckets=LATENCY_BUCKETS,
+)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "modifier_upstream_request_duration_seconds",
+    "Duration of the requests sent to the OptScale APIs.",
+    ["upstream", "method", "endpoint", "status_code"],
+    buckets=LATENCY_BUCKETS,
+)
+
+UPSTREAM_RETRIES = Counter(
+    "modifier_upstream_retries_total",
+    "Number of requests to the OptScale APIs that have been retried.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_RETRY_BUDGET_EXHAUSTED = Counter(
+    "modifier_upstream_retry_budget_exhausted_total",
+    "Number of retries denied because the retry budget was exhausted.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_HEDGES = Counter(
+    "modifier_upstream_hedges_total",
+    "Number of hedged GET requests sent because the first attempt was slow.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_HEDGE_BUDGET_EXHAUSTED = Counter(
+    "modifier_upstream_hedge_budget_exhausted_total",
+    "Number of hedged GET requests denied because the hedge budget was exhausted.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_HEDGES_WON = Counter(
+    "modifier_upstream_hedges_won_total",
+    "Number of hedged GET requests that answered before the first attempt.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "modifier_upstream_circuit_state",
+    "State of the circuit breakers: 0 closed, 1 half-open, 2 open.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_CIRCUIT_REJECTIONS = Counter(
+    "modifier_upstream_circuit_rejections_total",
+    "Number of requests rejected because the circuit breaker was open.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_COALESCED_REQUESTS = Counter(
+    "modifier_upstream_coalesced_requests_total",
+    "Number of GET requests that shared the response of an identical in-flight one.",
+    ["upstream", "endpoint"],
+)
+
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "modifier_upstream_concurrency_limit",
+    "Current adaptive limit of concurrent requests to the OptScale APIs.",
+    ["upstream"],
+)
+
+UPSTREAM_CONCURRENCY_IN_FLIGHT = Gauge(
+    "modifier_upstream_concurrency_in_flight",
+    "Number of requests to the OptScale APIs currently in flight.",
+    ["upstream"],
+)
+
+UPSTREAM_CONCURRENCY_REJECTIONS = Counter(
+    "modifier_upstream_concurrency_rejections_total",
+    "Number of requests rejected because the concurrency limit was reached.",
+    ["upstream"],
+)
+
+UPSTREAM_CANCELLED_REQUESTS = Counter(
+    "modifier_upstream_cancelled_requests_total",
+    "Number of requests to the OptScale APIs cancelled because "
+    "the caller dropped the connection.",
+    ["upstream", "endpoint"],
+)
+
+
+JOB_LATENCY_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+JOB_QUEUE_DEPTH = Gauge(
+    "modifier_job_queue_depth",
+    "Number of background jobs waiting or running.",
+    ["job"],
+    multiprocess_mode="max",
+)
+
+JOB_QUEUE_LATENCY = Histogram(
+    "modifier_job_queue_latency_seconds",
+    "Time the background jobs waited in the queue before every attempt.",
+    ["job"],
+    buckets=JOB_LATENCY_BUCKETS,
+)
+
+JOB_DURATION = Histogram(
+    "modifier_job_duration_seconds",
+    "Duration of the attempts of the background jobs.",
+    ["job", "outcome"],
+    buckets=JOB_LATENCY_BUCKETS,
+)
+
+
+def get_endpoint_template(endpoint: str) -> str:
+    """
+    Turns the given OptScale endpoint into a low-cardinality template,
+    following the REST convention /collection/{id}/collection/{id}.
+    For example, /organizations/1234/cloud_accounts becomes
+    /organizations/{id}/cloud_accounts
+    :param endpoint: The endpoint as sent to OptScale
+    :return: The endpoint template
+    """
+    segments = endpoint.strip("/").split("/")
+    return "/" + "/".join(
+        segment if index % 2 == 0 else "{id}" for index, segment in enumerate(segments)
+    )
+
+
+def observe_http_request(method: str, route: str, status_code: int, duration: float):
+    HTTP_REQUEST_DURATION.labels(
+        method=method, route=route, status_code=str(status_code)
+    ).observe(duration)
+
+
+def observe_upstream_request(
+    upstream: str, method: str, endpoint: str, status_code: int, duration: float
+):
+    UPSTREAM_REQUEST_DURATION.labels(
+        upstream=upstream,
+        method=method,
+        endpoint=get_endpoint_template(endpoint),
+        status_code=str(status_code),
+    ).observe(duration)
+
+
+def count_upstream_retry(upstream: str, endpoint: str, allowed: bool):
+    counter = UPSTREAM_RETRIES if allowed else UPSTREAM_RETRY_BUDGET_EXHAUSTED
+    counter.labels(upstream=upstream, endpoint=get_endpoint_template(endpoint)).inc()
+
+
+def count_upstream_hedge(upstream: str, endpoint: str, allowed: bool):
+    counter = UPSTREAM_HEDGES if allowed else UPSTREAM_HEDGE_BUDGET_EXHAUSTED
+    counter.labels(upstream=upstream, endpoint=get_endpoint_template(endpoint)).inc()
+
+
+def count_upstream_hedge_won(upstream: str, endpoint: str):
+    UPSTREAM_HEDGES_WON.labels(
+        upstream=upstream, endpoint=get_endpoint_template(endpoint)
+    ).inc()
+
+
+def count_coalesced_request(upstream: str, endpoint: str):
+    UPSTREAM_COALESCED_REQUESTS.labels(
+        upstream=upstream, endpoint=get_endpoint_template(endpoint)
+    ).inc()
+
+
+def count_cancelled_request(upstream: str, endpoint: str):
+    UPSTREAM_CANCELLED_REQUESTS.labels(
+        upstream=upstream, endpoint=get_endpoint_template(endpoint)
+    ).inc()
+
+
+def set_job_queue_depth(job: str, depth: int):
+    JOB_QUEUE_DEPTH.labels(job=job).set(depth)
+
+
+def observe_job(job: str, outcome: str, latency: float, duration: float):
+    """
+    Records an attempt of a background job.
+    :param job: The name of the job
+    :param outcome: "succeeded", "retried" or "failed"
+    :param latency: The time the job waited in the queue, in seconds
+    :param duration: The duration of the attempt, in seconds
+    """
+    JOB_QUEUE_LATENCY.labels(job=job).observe(latency)
+    JOB_DURATION.labels(job=job, outcome=outcome).observe(duration)
+
+
+class CacheCollector:
+    """
+    Exposes the counters of the registered in-process caches.
+    """
+
+    def __init__(self):
+        self.caches: dict[str, TTLCache | StaleWhileRevalidateCache] = {}
+
+    def collect(self):
+        size = GaugeMetricFamily(
+            "modifier_cache_size", "Number of entries in the cache.", labels=["cache"]
+        )
+        counters = {
+            name: CounterMetricFamily(
+                f"modifier_cache_{name}", f"Number of cache {name}.", labels=["cache"]
+            )
+            for name in ("hits", "misses", "stale", "evictions")
+        }
+        for cache_name, cache in self.caches.items():
+            stats = cache.stats()
+            size.add_metric([cache_name], stats["size"])
+            for name, counter in counters.items():
+                if name in stats:
+                    counter.add_metric([cache_name], stats[name])
+        yield size
+        yield from counters.values()
+
+
+cache_collector = CacheCollector()
+REGISTRY.register(cache_collector)
+
+
+def register_cache(name: str, cache: TTLCache | StaleWhileRevalidateCache):
+    """
+    Adds the given cache to the ones exposed by the /metrics endpoint.
+    :param name: The value of the cache label
+    :param cache: The cache to expose
+    """
+    cache_collector.caches[name] = cache
+
+
+def get_metrics_registry() -> CollectorRegistry:
+    """
+    Returns the registry to expose. When running with several gunicorn workers,
+    and PROMETHEUS_MULTIPROC_DIR is set, the metrics of all the workers are
+    aggregated. Caches counters are only available in single-process mode.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """
+    Exposes the metrics in the Prometheus text format.
+    """
+    return Response(
+        content=generate_latest(get_metrics_registry()),
+        media_type=CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any
+
+from starlette import status as http_status
+
+from app import settings
+from app.core.exceptions import build_error_response
+
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+REQUEST_ID_HEADER = "X-Request-ID"
+# The longest request ID accepted from the caller, longer ones are replaced
+MAX_REQUEST_ID_LENGTH = 128
+DEADLINE_EXCEEDED_ERROR_CODE = "deadline_exceeded"
+
+
+class RequestContext:
+    """
+    Holds the state of the inbound request currently being served.
+    It's shared, by reference, with all the tasks spawned while serving
+    the request, so the counters are updated in place.
+
+    Attributes:
+        upstream_calls (int): The number of calls made to the OptScale APIs.
+        client_disconnected (bool): True if the caller has dropped the connection
+        before the response was sent.
+        started_at (float): When the request started, as time.monotonic().
+        requested_timeout (float | None): The time budget, in seconds,
+        requested by the caller.
+        request_id (str): The ID of the request, logged and forwarded upstream.
+    """
+
+    def __init__(
+        self,
+        scope: dict[str, Any] | None = None,
+        requested_timeout: float | None = None,
+        request_id: str | None = None,
+    ):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.upstream_calls = 0
+        self.client_disconnected = False
+        self.scope = scope or {}
+        self.started_at = time.monotonic()
+        self.requested_timeout = requested_timeout
+
+    def get_route_timeout(self) -> float | None:
+        """
+        Returns the default time budget of the matched route, in seconds,
+        or None if the request has not been routed yet.
+        """
+        route = getattr(self.scope.get("route"), "path", None)
+        if route is None:
+            return None
+        return settings.request_deadline_routes.get(
+            f"{self.scope.get('method')} {route}", settings.request_deadline_default
+        )
+
+    @property
+    def deadline(self) -> float | None:
+        """
+        The time, as time.monotonic(), after which the caller has given up
+        on the request, or None if the request has no deadline.
+        The caller can shorten the route's budget, but not extend it.
+        """
+        timeouts = [
+            timeout
+            for timeout in (self.requested_timeout, self.get_route_timeout())
+            if timeout is not None
+        ]
+        if not timeouts:
+            return None
+        return self.started_at + min(timeouts)
+
+
+_request_context: ContextVar[RequestContext | None] = ContextVar(
+    "request_context", default=None
+)
+
+
+def start_request_context(
+    scope: dict[str, Any] | None = None,
+    requested_timeout: float | None = None,
+    request_id: str | None = None,
+) -> RequestContext:
+    """
+    Creates a new RequestContext and binds it to the current execution context.
+    :param scope: The ASGI scope of the request
+    :param requested_timeout: The time budget requested by the caller, in seconds
+    :param request_id: The request ID sent by the caller, if any,
+    otherwise a new one is generated
+    :return: The new RequestContext
+    """
+    context = RequestContext(
+        scope=scope, requested_timeout=requested_timeout, request_id=request_id
+    )
+    _request_context.set(context)
+    return context
+
+
+def get_request_context() -> RequestContext | None:
+    """
+    Returns the RequestContext of the request being served, or None
+    if the code is not running on behalf of an inbound request.
+    """
+    return _request_context.get()
+
+
+def record_upstream_call():
+    """Increments the number of upstream calls made by the current request."""
+    context = _request_context.get()
+    if context is not None:
+        context.upstream_calls += 1
+
+
+def get_remaining_time() -> float | None:
+    """
+    Returns the time left before the deadline of the request being served.
+    :return: The remaining time in seconds, which is <= 0 once the deadline
+    has passed, or None if there is no deadline
+    """
+    context = _request_context.get()
+    if context is None or context.deadline is None:
+        return None
+    return context.deadline - time.monotonic()
+
+
+def parse_request_timeout(value: str | None) -> float | None:
+    """
+    Parses the value of the X-Request-Timeout header.
+    :param value: The time budget in seconds, like "7.5"
+    :return: The time budget, or None if the value is missing or not valid
+    """
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None
+    if not 0 < timeout < float("inf"):
+        return None
+    return timeout
+
+
+def parse_request_id(value: str | None) -> str | None:
+    """
+    Validates the value of the X-Request-ID header.
+    :param value: The request ID sent by the caller
+    :return: The request ID, or None if it's missing, too long
+    or not made of printable ASCII characters
+    """
+    if not value or len(value) > MAX_REQUEST_ID_LENGTH:
+        return None
+    if not (value.isascii() and value.isprintable()):
+        return None
+    return value
+
+
+def build_deadline_exceeded_response() -> dict[str, Any]:
+    """
+    Builds the response returned instead of contacting OptScale once
+    the deadline of the request has passed. It has the same shape of
+    the OptScale error responses, so that raise_api_response_exception()
+    turns it into an APIResponseError.
+    """
+    return build_error_response(
+        status_code=http_status.HTTP_504_GATEWAY_TIMEOUT,
+        title="Deadline exceeded",
+        reason="The time budget of the request has been exhausted",
+        error_code=DEADLINE_EXCEEDED_ERROR_CODE,
+        params=[],
+    )
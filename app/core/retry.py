@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import random
+
+from starlette import status as http_status
+
+from app import settings
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUS_CODES = {
+    http_status.HTTP_502_BAD_GATEWAY,
+    http_status.HTTP_503_SERVICE_UNAVAILABLE,  # including connection errors
+    http_status.HTTP_504_GATEWAY_TIMEOUT,
+}
+
+
+class RetryBudget:
+    """
+    A process-wide budget that caps the retries to a ratio of the requests,
+    so that retries cannot amplify an outage of the upstream.
+    Every request deposits `ratio` tokens, every retry withdraws one token.
+    The balance never exceeds `max_tokens`, which is also the initial balance.
+
+    Attributes:
+        ratio (float): The allowed retries per request, like 0.1 for 10%.
+        max_tokens (float): The maximum number of retries that can be saved up.
+        balance (float): The number of retries currently allowed.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.balance = max_tokens
+
+    def deposit(self):
+        """Records a new request."""
+        self.balance = min(self.max_tokens, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Records a retry, if the budget allows it.
+        :return: True if the retry can be made, False if the budget is exhausted
+        """
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+retry_budget = RetryBudget(
+    ratio=settings.api_client_retry_budget_ratio,
+    max_tokens=settings.api_client_retry_budget_max_tokens,
+)
+
+
+def is_retryable_request(method: str) -> bool:
+    """
+    Checks if a request can be safely sent again, that is if its method
+    is idempotent.
+    :param method: The HTTP method
+    :return: True if the request can be retried
+    """
+    return method.upper() in IDEMPOTENT_METHODS
+
+
+def get_backoff_delay(attempt: int) -> float:
+    """
+    Computes the delay before the given retry attempt, using
+    an exponential backoff with full jitter.
+    :param attempt: The retry attempt, starting from 1
+    :return: The delay in seconds
+    """
+    max_delay = min(
+        settings.api_client_retry_backoff_max,
+        settings.api_client_retry_backoff_base * 2 ** (attempt - 1),
+    )
+    return random.uniform(0, max_delay)  # nosec B311
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from app import settings
+
+
+class _Call:
+    """
+    An in-flight call, shared by all the callers waiting for its result.
+    """
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+    async def wait(self, timeout: float | None = None) -> Any:
+        self.waiters += 1
+        try:
+            # shield the task so that a cancelled, or timed out, caller
+            # doesn't cancel it for the others
+            async with asyncio.timeout(timeout):
+                return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if self.waiters == 0 and not self.task.done():
+                # all the callers have been cancelled
+                self.task.cancel()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, so that only one of them
+    is executed and all the callers share its result.
+    Results are shared as they are, so callers must not modify them.
+
+    Attributes:
+        max_keys (int): The maximum number of calls tracked at the same time.
+        When the limit is reached, new calls are executed without coalescing.
+        coalesced (int): The number of calls that shared the result of another one.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.coalesced = 0
+        self._calls: dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+        timeout: float | None = None,
+    ) -> Any:
+        """
+        Executes func(), unless a call with the same key is already in flight.
+        In that case, it waits for the result of the in-flight call.
+        The call can be shared by callers with different deadlines, so it runs
+        in a new context, without the state, like the deadline, of the
+        inbound request of the first caller. Every caller bounds its own wait.
+        :param key: The key identifying identical calls
+        :param func: The coroutine function to execute
+        :param timeout: The time the caller waits for the result, in seconds,
+        or None to wait until the call completes
+        :raises TimeoutError: If the result is not available within the timeout
+        :return: The result of func()
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            return await call.wait(timeout)
+        task = asyncio.get_running_loop().create_task(
+            func(), context=contextvars.Context()
+        )
+        if len(self._calls) >= self.max_keys:
+            # not shared, cancelled if the caller gives up
+            async with asyncio.timeout(timeout):
+                return await task
+
+        call = _Call(task)
+        self._calls[key] = call
+
+        def forget(_):
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+        call.task.add_done_callback(forget)
+        return await call.wait(timeout)
+
+
+def build_request_key(
+    base_url: str,
+    endpoint: str,
+    headers: dict[str, Any] | None = None,
+    params: dict[str, Any] | None = None,
+) -> tuple[str, str, str]:
+    """
+    Builds the key identifying identical upstream requests. Headers, which carry
+    the caller's identity (Bearer token or Secret), and params are hashed
+    so that no credential is kept in the key.
+    :return: A tuple (base_url, endpoint, digest of headers and params)
+    """
+    identity = json.dumps(
+        [sorted((headers or {}).items()), sorted((params or {}).items())],
+        default=str,
+    )
+    return base_url, endpoint, hashlib.sha256(identity.encode()).hexdigest()
+
+
+upstream_single_flight = SingleFlight(max_keys=settings.single_flight_max_keys)
@@ -1,22 +1,44 @@
 import logging
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from app import settings
-from app.core.api_client import LogRequestMiddleware
+from app.core.api_client import (
+    CancelOnDisconnectMiddleware,
+    LogRequestMiddleware,
+    close_http_clients,
+)
 from app.core.exceptions import AuthException
+from app.core.idempotency import idempotency_store
+from app.core.job_queue import job_queue
+from app.core.metrics import metrics_endpoint
 from app.router.api_v1.endpoints import api_router
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_queue.start()
+    yield
+    # the running jobs are put back in the queue for the next start
+    await job_queue.stop()
+    idempotency_store.close()
+    # release the pooled connections to the OptScale APIs
+    await close_http_clients()
+
+
 app = FastAPI(
     title="FinOps for Cloud API Modifier",
     version="4.0.0",
     root_path="/modifier/v1",
     debug=settings.debug,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 # Todo: remove * from allow_origins
 app.add_middleware(
@@ -29,12 +51,14 @@ app.add_middleware(
 
 
 app.include_router(api_router)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+app.add_middleware(CancelOnDisconnectMiddleware)
 app.add_middleware(LogRequestMiddleware)
 
 
 @app.exception_handler(AuthException)
 async def jwt_bearer_exception_handler(request: Request, exc: AuthException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=401,
         content={
             "error": f"{exc.title}",
@@ -1,16 +1,88 @@
 from __future__ import annotations
 
 import logging
+import time
+from datetime import UTC, datetime
+
+import jwt
 
 from app import settings
 from app.core.api_client import APIClient
+from app.core.auth_jwt_bearer import get_token_digest
+from app.core.cache import TTLCache
 from app.core.exceptions import UserAccessTokenError, raise_api_response_exception
+from app.core.metrics import register_cache
 
 logger = logging.getLogger(__name__)
 
 AUTH_TOKEN_ENDPOINT = "/tokens"  # nosec B105
 AUTH_TOKEN_AUTHORIZE_ENDPOINT = "/authorize"  # nosec B105"
 
+# The authorization checks are cheap and must fail fast,
+# minting a token may take longer
+AUTH_TIMEOUT_PROFILES = {
+    f"POST {AUTH_TOKEN_AUTHORIZE_ENDPOINT}": "fast",
+    f"POST {AUTH_TOKEN_ENDPOINT}": "slow",
+}
+
+# user_id -> the access token obtained with the admin API key
+user_access_token_cache = TTLCache(max_size=settings.user_token_cache_max_size)
+register_cache("user_access_tokens", user_access_token_cache)
+
+# (digest of the token, action, resource ID) -> True, for the granted actions
+authorization_cache = TTLCache(max_size=settings.authorization_cache_max_size)
+register_cache("authorizations", authorization_cache)
+
+
+def get_token_cache_ttl(valid_until: str | None) -> float:
+    """
+    Computes for how long a token can be cached, given its expiration date
+    as returned by OptScale (like "2024-11-04T18:38:21", in UTC).
+    The configured safety margin is subtracted so that a cached token
+    is never used close to its expiration.
+    :param valid_until: The token's expiration date in ISO format
+    :return: The TTL in seconds, or 0 if the token must not be cached
+    """
+    if not valid_until:
+        return 0
+    try:
+        expires_at = datetime.fromisoformat(valid_until)
+    except (TypeError, ValueError):
+        logger.warning(f"Unable to parse the token expiration date {valid_until}")
+        return 0
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=UTC)
+    ttl = (expires_at - datetime.now(UTC)).total_seconds()
+    return ttl - settings.user_token_cache_safety_margin
+
+
+def get_authorization_cache_ttl(bearer_token: str) -> float:
+    """
+    Computes for how long a granted authorization can be cached: the
+    configured TTL, but never beyond the expiration of the token, when
+    it's a JWT with an "exp" claim. The signature is not verified, as only
+    OptScale can tell if the token is valid.
+    :param bearer_token: The token the authorization has been granted to
+    :return: The TTL in seconds, or 0 if the authorization must not be cached
+    """
+    ttl = settings.authorization_cache_ttl
+    try:
+        claims = jwt.decode(bearer_token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return ttl
+    expires_at = claims.get("exp")
+    if not isinstance(expires_at, int | float):
+        return ttl
+    return min(ttl, expires_at - time.time())
+
+
+def discard_user_access_token(user_id: str):
+    """
+    Removes the cached access token of the given user, if any.
+    :param user_id: The user's ID
+    """
+    user_access_token_cache.pop(user_id)
+
 
 def build_admin_api_key_header(admin_api_key: str) -> dict[str, str]:
     """
@@ -34,7 +106,10 @@ def build_bearer_token_header(bearer_token: str) -> dict[str, str]:
 
 class OptScaleAuth:
     def __init__(self):
-        self.api_client = APIClient(base_url=settings.optscale_auth_api_base_url)
+        self.api_client = APIClient(
+            base_url=settings.optscale_auth_api_base_url,
+            timeout_profiles=AUTH_TIMEOUT_PROFILES,
+        )
 
     async def check_user_allowed_to_create_cloud_account(
         self, bearer_token: str, org_id: str
@@ -50,6 +125,8 @@ class OptScaleAuth:
         Result: The service will return a 403 with an indication about a
         not-allowed cloud type instead of processing the wrong authorization
         as the first thing.
+        Granted authorizations are cached for a short time, so that linking
+        several cloud accounts in a row checks the token only once.
         :param bearer_token: The user access's token
         :param org_id: The org ID that owned by the user identified by the bearer_token
         :return:
@@ -59,6 +136,11 @@ class OptScaleAuth:
             "resource_type": "organization",
             "uuid": org_id,
         }
+        # only the granted authorizations are cached, for a short time
+        cache_key = (get_token_digest(bearer_token), payload["action"], org_id)
+        if authorization_cache.get(cache_key):
+            logger.info(f"Using the cached authorization for the org {org_id}")
+            return None
         headers = build_bearer_token_header(bearer_token=bearer_token)
         response = await self.api_client.post(
             endpoint=AUTH_TOKEN_AUTHORIZE_ENDPOINT, headers=headers, data=payload
@@ -66,12 +148,17 @@ class OptScaleAuth:
         if response.get("error"):
             logger.error("Failed validate the given bearer token")
             return raise_api_response_exception(response)
+        authorization_cache.set(
+            cache_key, True, ttl=get_authorization_cache_ttl(bearer_token)
+        )
 
     async def obtain_user_auth_token_with_admin_api_key(
         self, user_id: str, admin_api_key: str
     ) -> str | Exception:
         """
-        Obtains an authentication token for the given user_id using the admin API key
+        Obtains an authentication token for the given user_id using the admin API key.
+        The token is cached until shortly before its expiration, so that
+        the following calls for the same user don't hit OptScale.
         :param user_id: the user's ID for whom the access token will be generated
         :type user_id: string
         :param admin_api_key: the secret API key
@@ -80,6 +167,11 @@ class OptScaleAuth:
         otherwise a UserAccessTokenError exception
 
         """
+        cached_token = user_access_token_cache.get(user_id)
+        if cached_token is not None:
+            logger.info(f"Using the cached access token for user {user_id}")
+            return cached_token
+
         payload = {"user_id": user_id}
         headers = build_admin_api_key_header(admin_api_key=admin_api_key)
         response = await self.api_client.post(
@@ -100,5 +192,10 @@ class OptScaleAuth:
         if token is None:
             logger.error("Token not found in the response.")
             raise UserAccessTokenError("Token not found in the response.")
+        user_access_token_cache.set(
+            user_id,
+            token,
+            ttl=get_token_cache_ttl(response.get("data", {}).get("valid_until")),
+        )
         logger.info("Admin Access Token successfully obtained")
         return token
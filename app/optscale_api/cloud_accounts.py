@@ -12,11 +12,18 @@ from app.optscale_api.auth_api import (
 logger = logging.getLogger(__name__)
 
 CLOUD_ACCOUNT_ENDPOINT = "/organizations"
+# Linking a cloud account makes OptScale validate the cloud credentials
+CLOUD_ACCOUNT_TIMEOUT_PROFILES = {
+    f"POST {CLOUD_ACCOUNT_ENDPOINT}/{{id}}/cloud_accounts": "slow"
+}
 
 
 class OptScaleCloudAccountAPI:
     def __init__(self):
-        self.api_client = APIClient(base_url=settings.optscale_rest_api_base_url)
+        self.api_client = APIClient(
+            base_url=settings.optscale_rest_api_base_url,
+            timeout_profiles=CLOUD_ACCOUNT_TIMEOUT_PROFILES,
+        )
 
     async def link_cloud_account_with_org(
         self, user_access_token: str, org_id: str, conf: dict[str, str]
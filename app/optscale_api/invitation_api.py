@@ -6,7 +6,9 @@ from fastapi import status as http_status
 
 from app import settings
 from app.core.api_client import APIClient
+from app.core.cache import TTLCache
 from app.core.exceptions import APIResponseError, raise_api_response_exception
+from app.core.metrics import register_cache
 from app.optscale_api.auth_api import (
     build_admin_api_key_header,
     build_bearer_token_header,
@@ -16,6 +18,27 @@ logger = logging.getLogger(__name__)
 
 INVITATION_ENDPOINT = "/invites"
 
+# normalized email -> whether there is any invitation for it
+invitation_lookup_cache = TTLCache(max_size=settings.invitation_cache_max_size)
+register_cache("invitation_lookups", invitation_lookup_cache)
+# invitation ID -> normalized email, to discard the lookup on decline
+invitation_email_cache = TTLCache(max_size=settings.invitation_cache_max_size)
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def discard_invitation(invitation_id: str):
+    """
+    Removes the cached lookup of the email the given invitation was sent to,
+    if any, so that the next registration checks OptScale again.
+    :param invitation_id: The invitation ID
+    """
+    email = invitation_email_cache.pop(invitation_id)
+    if email is not None:
+        invitation_lookup_cache.pop(email)
+
 
 class OptScaleInvitationAPI:
     def __init__(self):
@@ -40,6 +63,7 @@ class OptScaleInvitationAPI:
         if response.get("error"):
             logger.error("Failed to decline the invitation.")
             return raise_api_response_exception(response)
+        discard_invitation(invitation_id)
         logger.info(f"Invitation {invitation_id} has been declined")
         return {}
 
@@ -96,7 +120,7 @@ class OptScaleInvitationAPI:
             headers = build_bearer_token_header(bearer_token=user_access_token)
             params = None
         response = await self.api_client.get(
-            endpoint=INVITATION_ENDPOINT, headers=headers, params=params
+            endpoint=INVITATION_ENDPOINT, headers=headers, params=params, hedge=True
         )
         if response.get("error"):
             logger.error("Failed to get list of invitations.")
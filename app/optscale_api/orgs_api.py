@@ -2,16 +2,25 @@ from __future__ import annotations
 
 import logging
 
+from fastapi import status as http_status
+
 from app import settings
-from app.core.api_client import APIClient
+from app.core.api_client import APIClient, as_passthrough
+from app.core.cache import StaleWhileRevalidateCache
 from app.core.exceptions import (
     UserAccessTokenError,
     raise_api_response_exception,
 )
 from app.core.input_validation import validate_currency
+from app.core.metrics import register_cache
+from app.core.request_context import (
+    build_deadline_exceeded_response,
+    get_remaining_time,
+)
 from app.optscale_api.auth_api import (
     OptScaleAuth,
     build_bearer_token_header,
+    discard_user_access_token,
 )
 from app.optscale_api.helpers.auth_tokens_dependency import (
     get_user_access_token,
@@ -20,22 +29,36 @@ from app.optscale_api.helpers.auth_tokens_dependency import (
 logger = logging.getLogger(__name__)
 
 ORG_ENDPOINT = "/organizations"
+ORG_TIMEOUT_PROFILES = {f"POST {ORG_ENDPOINT}": "slow"}
 
 ORG_CREATION_ERROR = "An error occurred creating an organization for user {}."
 ORG_FETCHING_ERROR = "An error occurred getting organizations for user {}."
 
+# The organization lists of the users, by user_id
+org_list_cache = StaleWhileRevalidateCache(
+    max_size=settings.org_list_cache_max_size,
+    ttl=settings.org_list_cache_ttl,
+    stale_ttl=settings.org_list_cache_stale_ttl,
+)
+register_cache("org_lists", org_list_cache)
+
 
 class OptScaleOrgAPI:
     def __init__(self):
-        self.api_client = APIClient(base_url=settings.optscale_rest_api_base_url)
+        self.api_client = APIClient(
+            base_url=settings.optscale_rest_api_base_url,
+            timeout_profiles=ORG_TIMEOUT_PROFILES,
+        )
 
     async def get_user_org_list(
-        self, user_access_token: str
+        self, user_access_token: str, passthrough: bool = False
     ) -> dict[str, list[dict[str, any]]] | Exception:  # noqa: E501
         """
         It returns a list of the organizations the user owns, identified by the given
         user_access_token.
         :param user_access_token: The Access Token of the given user
+        :param passthrough: If True, the list is not parsed, the response holds
+        the upstream body to be streamed with build_passthrough_response()
         :return: A list of dicts like the following
         {"data": {"organizations": [
                 {
@@ -53,15 +76,23 @@ class OptScaleOrgAPI:
          :raises: APIResponseError if any error occurs
         contacting the OptScale APIs
         """
-        response = await self.api_client.get(
-            endpoint=ORG_ENDPOINT,
-            headers=build_bearer_token_header(bearer_token=user_access_token),
-        )
+        headers = build_bearer_token_header(bearer_token=user_access_token)
+        if passthrough:
+            response = await self.api_client.get_passthrough(
+                endpoint=ORG_ENDPOINT, headers=headers
+            )
+        else:
+            response = await self.api_client.get(
+                endpoint=ORG_ENDPOINT, headers=headers, hedge=True
+            )
 
         if response.get("error"):
             logger.error("Failed to get the org list from OptScale")
             return raise_api_response_exception(response)
-        logger.info(f"Successfully fetched user's org {response}")
+        if passthrough:
+            logger.info("Successfully fetched user's org list, streaming it")
+        else:
+            logger.info(f"Successfully fetched user's org {response}")
         return response
 
     async def access_user_org_list_with_admin_key(
@@ -69,16 +100,24 @@ class OptScaleOrgAPI:
         auth_client: OptScaleAuth,
         user_id: str,
         admin_api_key: str,
+        passthrough: bool = False,
     ) -> dict[str, list[dict[str, any]]] | Exception:  # noqa: E501
         """
         It retrieves the list of organizations owned by any user identified by their user_id
         whose access token is generated using the admin-level operation
         provided by the admin_api_key.
+        The lists are cached per user: a stale list is returned straight away
+        while it's refreshed in background, and the list of a user is
+        invalidated when an organization is created for them.
 
         :param auth_client: An instance of the `OptScaleAuth` class used to interact
             with the authentication service.
         :param user_id: the user's id for whom we want to retrieve the organization
         :param admin_api_key: the secret admin API key
+        :param passthrough: If True, the response holds the body to be
+            streamed, see get_user_org_list(). The upstream body is streamed
+            as it is only while the org list cache is disabled, otherwise
+            the cached list is serialized again, see as_passthrough()
         :return: The organization data or None if there is an error.
         An empty list if no organization exists
         :raise:
@@ -101,13 +140,30 @@ class OptScaleOrgAPI:
             ]
         }
         """
-        try:
+
+        async def fetch_user_org_list(passthrough: bool = False) -> dict:
             user_access_token = await get_user_access_token(
                 user_id=user_id, admin_api_key=admin_api_key, auth_client=auth_client
             )
-            response = await self.get_user_org_list(user_access_token=user_access_token)
+            return await self.get_user_org_list(
+                user_access_token=user_access_token, passthrough=passthrough
+            )
+
+        try:
+            if not org_list_cache.enabled:
+                response = await fetch_user_org_list(passthrough=passthrough)
+                logger.info(f"Successfully fetched user's org list {response}")
+                return response
+            try:
+                response = await org_list_cache.get_or_load(
+                    user_id, fetch_user_org_list, timeout=get_remaining_time()
+                )
+            except TimeoutError:
+                logger.warning(f"Deadline exceeded loading the org list of {user_id}")
+                raise_api_response_exception(build_deadline_exceeded_response())
             logger.info(f"Successfully fetched user's org list {response}")
-            return response
+            # the cached response must not be modified
+            return as_passthrough(response) if passthrough else response
 
         except UserAccessTokenError as error:
             logger.error(f"Failed to get access token for user {user_id}: {error}")
@@ -116,6 +172,9 @@ class OptScaleOrgAPI:
             logger.error(
                 f"Exception occurred accessing an organization on OptScale: {error}"
             )
+            if getattr(error, "status_code", None) == http_status.HTTP_401_UNAUTHORIZED:
+                # the cached access token of the user is no longer accepted
+                discard_user_access_token(user_id)
             raise
 
     @validate_currency
@@ -173,6 +232,7 @@ class OptScaleOrgAPI:
                 logger.error(ORG_CREATION_ERROR.format(user_id))
                 return raise_api_response_exception(response)
 
+            org_list_cache.invalidate(user_id)
             logger.info(f"Successfully created organization for user: {user_id}")
             return response
 
@@ -184,4 +244,7 @@ class OptScaleOrgAPI:
             logger.error(
                 f"Exception occurred creating an organization on OptScale: {error}"
             )
+            if getattr(error, "status_code", None) == http_status.HTTP_401_UNAUTHORIZED:
+                # the cached access token of the user is no longer accepted
+                discard_user_access_token(user_id)
             raise
@@ -11,11 +11,18 @@ from .auth_api import build_admin_api_key_header
 logger = logging.getLogger(__name__)
 
 AUTH_USERS_ENDPOINT = "/users"
+USERS_TIMEOUT_PROFILES = {
+    f"POST {AUTH_USERS_ENDPOINT}": "slow",
+    f"GET {AUTH_USERS_ENDPOINT}/{{id}}": "fast",
+}
 
 
 class OptScaleUserAPI:
     def __init__(self):
-        self.api_client = APIClient(base_url=settings.optscale_auth_api_base_url)
+        self.api_client = APIClient(
+            base_url=settings.optscale_auth_api_base_url,
+            timeout_profiles=USERS_TIMEOUT_PROFILES,
+        )
 
     # todo: check the password lenght and strength
     async def create_user(
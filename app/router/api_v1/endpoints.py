@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
+from app import settings
 from app.api.invitations.api import router as invitation_router
 from app.api.organizations.api import router as org_router
+from app.api.proxy.api import build_proxy_router
 from app.api.users.api import router as user_router
 
 api_router = APIRouter()
@@ -20,3 +22,11 @@ for router_item in routers:
         include_api(router, prefix=f"/{prefix}", tags=[tag])
     else:
         include_api(router, prefix=f"/{prefix}")
+
+if settings.optscale_proxy_enabled:
+    # last, so that the routes of the modifier take precedence
+    include_api(
+        build_proxy_router(
+            [settings.optscale_auth_api_base_url, settings.optscale_rest_api_base_url]
+        )
+    )
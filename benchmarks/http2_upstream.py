@@ -0,0 +1,202 @@
+"""
+Compares HTTP/1.1 and HTTP/2 for the calls to the OptScale APIs.
+
+It starts a local stub upstream in a separate process, which answers every
+request with a small JSON body after a fixed delay and speaks both HTTP/1.1
+and HTTP/2 (detected from the connection preface), then it sends the same
+burst of concurrent requests with each protocol, using the connection pool
+limits configured in the settings, and reports the connections opened
+and the latency.
+
+The stub is plain-text, so HTTP/2 is used with prior knowledge, while
+the OptScale APIs negotiate it during the TLS handshake.
+
+Usage:
+    python -m benchmarks.http2_upstream [--requests 2000] [--concurrency 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import statistics
+import time
+from multiprocessing.sharedctypes import Synchronized
+
+import h2.config
+import h2.connection
+import h2.events
+import h11
+import httpx
+
+from app import settings
+
+HTTP2_PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+RESPONSE_BODY = json.dumps({"organizations": []}).encode()
+RESPONSE_HEADERS = [
+    ("content-type", "application/json"),
+    ("content-length", str(len(RESPONSE_BODY))),
+]
+
+
+class StubUpstream:
+    """
+    A minimal HTTP/1.1 and HTTP/2 server that counts the connections it accepts.
+    """
+
+    def __init__(self, delay: float, connections: Synchronized):
+        self.delay = delay
+        self.connections = connections
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        with self.connections.get_lock():
+            self.connections.value += 1
+        data = await reader.read(65536)
+        try:
+            if data.startswith(HTTP2_PREFACE):
+                await self.serve_http2(data, reader, writer)
+            else:
+                await self.serve_http1(data, reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_http1(self, data, reader, writer):
+        connection = h11.Connection(h11.SERVER)
+        while data:
+            connection.receive_data(data)
+            while (event := connection.next_event()) is not h11.NEED_DATA:
+                if isinstance(event, h11.EndOfMessage):
+                    await asyncio.sleep(self.delay)
+                    writer.write(
+                        connection.send(
+                            h11.Response(status_code=200, headers=RESPONSE_HEADERS)
+                        )
+                    )
+                    writer.write(connection.send(h11.Data(data=RESPONSE_BODY)))
+                    writer.write(connection.send(h11.EndOfMessage()))
+                    await writer.drain()
+                    connection.start_next_cycle()
+                elif isinstance(event, h11.ConnectionClosed):
+                    return
+            data = await reader.read(65536)
+
+    async def serve_http2(self, data, reader, writer):
+        connection = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False)
+        )
+        connection.initiate_connection()
+        lock = asyncio.Lock()
+
+        async def respond(stream_id: int):
+            await asyncio.sleep(self.delay)
+            async with lock:
+                connection.send_headers(
+                    stream_id, [(":status", "200"), *RESPONSE_HEADERS]
+                )
+                connection.send_data(stream_id, RESPONSE_BODY, end_stream=True)
+                writer.write(connection.data_to_send())
+                await writer.drain()
+
+        tasks = set()
+        while data:
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    task = asyncio.ensure_future(respond(event.stream_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            async with lock:
+                writer.write(connection.data_to_send())
+                await writer.drain()
+            data = await reader.read(65536)
+
+
+def run_stub(delay: float, connections: Synchronized, ports: multiprocessing.Queue):
+    async def serve():
+        stub = StubUpstream(delay=delay, connections=connections)
+        server = await asyncio.start_server(stub.handle, "127.0.0.1", 0, backlog=4096)
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+async def run_burst(
+    base_url: str, http2: bool, requests: int, concurrency: int
+) -> list[float]:
+    client = httpx.AsyncClient(
+        base_url=base_url,
+        http1=not http2,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.api_client_max_connections,
+            max_keepalive_connections=settings.api_client_max_keepalive_connections,
+            keepalive_expiry=settings.api_client_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(30),
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def send():
+        async with semaphore:
+            start_time = time.perf_counter()
+            response = await client.get("/organizations")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start_time)
+
+    async with client:
+        await asyncio.gather(*(send() for _ in range(requests)))
+    return latencies
+
+
+def percentile(latencies: list[float], value: float) -> float:
+    return statistics.quantiles(latencies, n=100, method="inclusive")[int(value) - 1]
+
+
+async def main(requests: int, concurrency: int, delay: float):
+    print(
+        f"{requests} requests, {concurrency} concurrent, {delay * 1000:.0f} ms "
+        f"upstream delay, max {settings.api_client_max_connections} connections"
+    )
+    print(f"{'mode':<10}{'connections':>12}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for http2 in (False, True):
+        connections = multiprocessing.Value("i", 0)
+        ports = multiprocessing.Queue()
+        stub = multiprocessing.Process(
+            target=run_stub, args=(delay, connections, ports), daemon=True
+        )
+        stub.start()
+        try:
+            port = ports.get(timeout=10)
+            start_time = time.perf_counter()
+            latencies = await run_burst(
+                f"http://127.0.0.1:{port}", http2, requests, concurrency
+            )
+            elapsed = time.perf_counter() - start_time
+        finally:
+            stub.terminate()
+        print(
+            f"{'HTTP/2' if http2 else 'HTTP/1.1':<10}"
+            f"{connections.value:>12}"
+            f"{percentile(latencies, 50) * 1000:>10.1f}"
+            f"{percentile(latencies, 99) * 1000:>10.1f}"
+            f"{requests / elapsed:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+    # the per-request debug records of httpcore and h2 would dominate the measures
+    logging.disable(logging.INFO)
+    asyncio.run(main(args.requests, args.concurrency, args.delay))
@@ -0,0 +1,112 @@
+"""
+Compares the standard json module and orjson on the path of large OptScale
+organization and invitation lists: decoding the upstream body, as APIClient
+does, and rendering the response of the endpoint.
+
+Usage:
+    python -m benchmarks.json_codec [--items 5000] [--rounds 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import timeit
+import uuid
+
+import httpx
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.responses import JSONResponse
+
+
+def build_organizations(items: int) -> dict:
+    return {
+        "organizations": [
+            {
+                "deleted_at": 0,
+                "created_at": 1733244589 + index,
+                "id": str(uuid.uuid4()),
+                "name": f"Organization {index}",
+                "pool_id": str(uuid.uuid4()),
+                "is_demo": False,
+                "currency": "USD",
+                "cleaned_at": 0,
+            }
+            for index in range(items)
+        ]
+    }
+
+
+def build_invitations(items: int) -> dict:
+    invitations = []
+    for index in range(items):
+        organization_id = str(uuid.uuid4())
+        invitations.append(
+            {
+                "deleted_at": 0,
+                "id": str(uuid.uuid4()),
+                "created_at": 1734368623 + index,
+                "email": f"user_{index}@example.com",
+                "owner_id": str(uuid.uuid4()),
+                "ttl": 1736960623,
+                "owner_name": f"Owner {index}",
+                "owner_email": f"owner_{index}@example.com",
+                "organization": f"Organization {index}",
+                "organization_id": organization_id,
+                "invite_assignments": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "scope_id": organization_id,
+                        "scope_type": "organization",
+                        "purpose": "optscale_member",
+                        "scope_name": f"Organization {index}",
+                    }
+                ],
+            }
+        )
+    return {"invites": invitations}
+
+
+def measure(name: str, payload: dict, rounds: int):
+    body = json.dumps(payload).encode()
+    upstream_response = httpx.Response(
+        200, content=body, headers={"Content-Type": "application/json"}
+    )
+
+    def stdlib():
+        data = upstream_response.json()
+        JSONResponse(status_code=200, content=data)
+
+    def fast():
+        data = orjson.loads(upstream_response.content)
+        ORJSONResponse(status_code=200, content=data)
+
+    results = {
+        codec: min(timeit.repeat(func, number=rounds, repeat=5)) / rounds * 1000
+        for codec, func in (("json", stdlib), ("orjson", fast))
+    }
+    print(
+        f"{name:<14}{len(body) / 1024:>10.0f}"
+        f"{results['json']:>10.2f}{results['orjson']:>10.2f}"
+        f"{results['json'] / results['orjson']:>9.1f}x"
+    )
+
+
+def main(items: int, rounds: int):
+    print(f"{items} items per list, decode + render, best of 5 x {rounds} rounds")
+    print(
+        f"{'list':<14}{'size KiB':>10}{'json ms':>10}{'orjson ms':>10}{'speedup':>10}"
+    )
+    measure("organizations", build_organizations(items), rounds)
+    measure("invitations", build_invitations(items), rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    main(args.items, args.rounds)
@@ -6,8 +6,19 @@ import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
 
 from app import settings
-from app.core.auth_jwt_bearer import JWTBearer
+from app.core.auth_jwt_bearer import JWTBearer, verified_jwt_cache
+from app.core.circuit_breaker import circuit_breakers
+from app.core.concurrency_limiter import concurrency_limiters
+from app.core.hedging import latency_tracker
+from app.core.idempotency import idempotency_store, memory_idempotency_store
+from app.core.job_queue import job_queue
 from app.main import app
+from app.optscale_api.auth_api import authorization_cache, user_access_token_cache
+from app.optscale_api.invitation_api import (
+    invitation_email_cache,
+    invitation_lookup_cache,
+)
+from app.optscale_api.orgs_api import org_list_cache
 
 
 # Mock dependency to bypass JWTBearer authentication
@@ -20,6 +31,13 @@ def pytest_configure():
     settings.model_config["env_file"] = "/app/.env.test"
 
 
+# Keep the jobs enqueued by the tests out of the working directory
+@pytest.fixture(scope="session", autouse=True)
+def job_queue_database(tmp_path_factory):
+    job_queue.path = str(tmp_path_factory.mktemp("jobs") / "jobs.sqlite3")
+    return job_queue.path
+
+
 # Override JWTBearer dependency for all tests
 @pytest.fixture(scope="session", autouse=True)
 def override_jwt_bearer():
@@ -28,6 +46,23 @@ def override_jwt_bearer():
     app.dependency_overrides = {}
 
 
+# Start every test with empty in-process caches, closed circuit breakers,
+# fresh concurrency limiters, no recorded latency and no stored response
+@pytest.fixture(autouse=True)
+def clear_caches():
+    user_access_token_cache.clear()
+    authorization_cache.clear()
+    org_list_cache.clear()
+    invitation_lookup_cache.clear()
+    invitation_email_cache.clear()
+    verified_jwt_cache.clear()
+    circuit_breakers.clear()
+    concurrency_limiters.clear()
+    latency_tracker.clear()
+    idempotency_store.clear()
+    memory_idempotency_store.clear()
+
+
 @pytest_asyncio.fixture
 async def async_client():
     transport = ASGITransport(app=app)
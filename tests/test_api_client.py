@@ -1,9 +1,38 @@
+import asyncio
+import contextlib
+import logging
 from unittest.mock import AsyncMock, patch
 
+import orjson
 import pytest
-from httpx import Headers, HTTPStatusError, Request, RequestError, Response
-
-from app.core.api_client import APIClient
+from fastapi import FastAPI
+from httpx import (
+    ASGITransport,
+    AsyncByteStream,
+    AsyncClient,
+    Headers,
+    HTTPStatusError,
+    Request,
+    RequestError,
+    Response,
+)
+from prometheus_client import REGISTRY
+
+from app import settings
+from app.core.api_client import (
+    CLIENT_CLOSED_REQUEST,
+    APIClient,
+    CancelOnDisconnectMiddleware,
+    LogRequestMiddleware,
+    build_passthrough_response,
+    close_http_clients,
+    get_http_client,
+    get_profile_timeout,
+)
+from app.core.concurrency_limiter import get_concurrency_limiter
+from app.core.exceptions import APIResponseError, raise_api_response_exception
+from app.core.retry import RetryBudget
+from app.optscale_api.auth_api import OptScaleAuth
 
 
 @pytest.fixture
@@ -16,6 +45,19 @@ def mock_request_instance():
     return Request(method="GET", url="http://testserver/endpoint")
 
 
+@pytest.fixture
+def mock_sleep():
+    with patch("app.core.api_client.asyncio.sleep", new=AsyncMock()) as mock:
+        yield mock
+
+
+@pytest.fixture
+def retry_budget():
+    budget = RetryBudget(ratio=0.1, max_tokens=10)
+    with patch("app.core.api_client.retry_budget", new=budget):
+        yield budget
+
+
 @patch("httpx.AsyncClient.request")
 async def test_make_request_success(mock_request, api_client, mock_request_instance):
     """Test a successful JSON response."""
@@ -85,7 +127,7 @@ async def test_make_request_json_value_error_response(
 
 @patch("httpx.AsyncClient.request")
 async def test_make_request_http_request_error(
-    mock_request, api_client, mock_request_instance
+    mock_request, api_client, mock_request_instance, mock_sleep
 ):
     mock_request.side_effect = RequestError(
         "Connection failed", request=mock_request_instance
@@ -196,16 +238,615 @@ async def test_api_client_methods(
     assert response["data"] == expected_data
 
 
-async def test_api_client_close():
-    """Test the close method of APIClient."""
-    # Create an APIClient instance
+async def test_api_client_close_keeps_the_shared_pool():
+    """Test that closing an APIClient doesn't close the shared pool."""
     client = APIClient(base_url="http://testserver")
 
-    # Mock the aclose method of the AsyncClient
-    client.client.aclose = AsyncMock()
-
-    # Call the close method
     await client.close()
 
-    # Assert that aclose was called
-    client.client.aclose.assert_called_once()
+    assert not client.client.is_closed
+    assert APIClient(base_url="http://testserver").client is client.client
+
+
+@patch("httpx.AsyncClient.request")
+async def test_make_request_retries_connection_errors(
+    mock_request, api_client, mock_request_instance, mock_sleep, retry_budget
+):
+    mock_request.side_effect = [
+        RequestError("Connection failed", request=mock_request_instance),
+        Response(status_code=503, request=mock_request_instance, json={}),
+        Response(status_code=200, request=mock_request_instance, json={"key": "value"}),
+    ]
+    response = await api_client._make_request("GET", "/endpoint")
+
+    assert response == {"status_code": 200, "data": {"key": "value"}}
+    assert mock_request.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "content, content_type",  # noqa: PT006
+    [
+        (b"<html><body>502 Bad Gateway</body></html>", "text/html"),
+        (b"", "text/plain"),
+    ],
+)
+@patch("httpx.AsyncClient.request")
+async def test_make_request_retries_non_json_errors(
+    mock_request,
+    api_client,
+    mock_request_instance,
+    mock_sleep,
+    retry_budget,
+    content,
+    content_type,
+):
+    mock_request.side_effect = [
+        Response(
+            status_code=502,
+            request=mock_request_instance,
+            content=content,
+            headers={"Content-Type": content_type},
+        ),
+        Response(status_code=200, request=mock_request_instance, json={"key": "value"}),
+    ]
+    response = await api_client._make_request("GET", "/endpoint")
+
+    assert response == {"status_code": 200, "data": {"key": "value"}}
+    assert mock_request.call_count == 2
+
+
+@patch("httpx.AsyncClient.request")
+async def test_make_request_maps_non_json_errors(
+    mock_request, api_client, mock_request_instance
+):
+    mock_request.return_value = Response(
+        status_code=404,
+        request=mock_request_instance,
+        content=b"<html><body>Not Found</body></html>",
+        headers={"Content-Type": "text/html"},
+    )
+    response = await api_client._make_request("GET", "/endpoint")
+
+    assert response == {
+        "status_code": 404,
+        "data": {},
+        "error": "HTTP error: 404 - <html><body>Not Found</body></html>",
+    }
+
+
+@patch("httpx.AsyncClient.request")
+async def test_make_request_stops_after_max_retries(
+    mock_request, api_client, mock_request_instance, mock_sleep, retry_budget
+):
+    mock_request.side_effect = RequestError(
+        "Connection failed", request=mock_request_instance
+    )
+    response = await api_client._make_request("DELETE", "/endpoint")
+
+    assert response["status_code"] == 503
+    assert mock_request.call_count == settings.api_client_max_retries + 1
+
+
+@pytest.mark.parametrize(
+    "method, headers, expected_calls",  # noqa: PT006
+    [
+        ("POST", None, 1),
+        ("PATCH", {"Authorization": "Bearer token"}, 1),
+        # a write is never retried, whatever its headers
+        ("POST", {"Idempotency-Key": "key"}, 1),
+    ],
+)
+@patch("httpx.AsyncClient.request")
+async def test_make_request_retries_only_idempotent_requests(
+    mock_request,
+    api_client,
+    mock_request_instance,
+    mock_sleep,
+    retry_budget,
+    method,
+    headers,
+    expected_calls,
+):
+    mock_request.side_effect = [
+        Response(status_code=502, request=mock_request_instance, json={}),
+        Response(status_code=201, request=mock_request_instance, json={}),
+    ]
+    await api_client._make_request(method, "/endpoint", headers=headers)
+
+    assert mock_request.call_count == expected_calls
+
+
+@patch("httpx.AsyncClient.request")
+async def test_make_request_does_not_retry_client_errors(
+    mock_request, api_client, mock_request_instance, mock_sleep, retry_budget
+):
+    mock_request.return_value = Response(
+        status_code=404, request=mock_request_instance, json={}
+    )
+    response = await api_client._make_request("GET", "/endpoint")
+
+    assert response["status_code"] == 404
+    mock_request.assert_called_once()
+
+
+@patch("httpx.AsyncClient.request")
+async def test_make_request_respects_the_retry_budget(
+    mock_request, api_client, mock_request_instance, mock_sleep, retry_budget
+):
+    retry_budget.balance = 1
+    mock_request.side_effect = RequestError(
+        "Connection failed", request=mock_request_instance
+    )
+    response = await api_client._make_request("GET", "/endpoint")
+
+    assert response["status_code"] == 503
+    # one retry allowed by the budget
+    assert mock_request.call_count == 2
+    assert retry_budget.balance < 1
+
+
+def test_api_clients_share_the_connection_pool():
+    first = APIClient(base_url="http://pooled")
+    second = APIClient(base_url="http://pooled")
+    other = APIClient(base_url="http://another-pooled")
+
+    assert first.client is second.client
+    assert first.client is not other.client
+    assert first.timeout.pool == settings.api_client_pool_timeout
+    assert first.timeout.read == settings.default_request_timeout
+
+
+@pytest.mark.parametrize("http2", [True, False])
+def test_http2_setting(http2):
+    with patch.object(settings, "api_client_http2", http2):
+        client = get_http_client(f"https://http2-{http2}")
+
+    assert client._transport._pool._http2 is http2
+    assert client._transport._pool._http1 is True
+
+
+def test_http2_falls_back_without_h2(caplog):
+    with (
+        patch.object(settings, "api_client_http2", True),
+        patch.dict("sys.modules", {"h2": None}),
+    ):
+        client = get_http_client("https://http2-without-h2")
+
+    assert client._transport._pool._http2 is False
+    assert "h2 package is missing" in caplog.text
+
+
+async def test_closed_http_client_is_recreated():
+    client = get_http_client("http://recreated")
+    await client.aclose()
+
+    new_client = get_http_client("http://recreated")
+    assert new_client is not client
+    assert new_client.is_closed is False
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_request_body_is_encoded_with_orjson(
+    mock_request, api_client, mock_request_instance
+):
+    mock_request.return_value = Response(
+        status_code=201,
+        request=mock_request_instance,
+        headers=Headers({"Content-Type": "application/json"}),
+        content=b'{"id":"org_1","name":"\xc3\xa9"}',
+    )
+
+    response = await api_client.post(
+        "/organizations", headers={"Secret": "s"}, data={"name": "é"}
+    )
+
+    assert response == {"status_code": 201, "data": {"id": "org_1", "name": "é"}}
+    kwargs = mock_request.call_args.kwargs
+    assert kwargs["content"] == orjson.dumps({"name": "é"})
+    assert kwargs["headers"] == {"Content-Type": "application/json", "Secret": "s"}
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_request_without_body(mock_request, api_client, mock_request_instance):
+    mock_request.return_value = Response(status_code=204, request=mock_request_instance)
+
+    await api_client.delete("/users/user_1", headers={"Secret": "s"})
+
+    kwargs = mock_request.call_args.kwargs
+    assert kwargs["content"] is None
+    assert kwargs["headers"] == {"Secret": "s"}
+
+
+class ChunkedStream(AsyncByteStream):
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+def get_upstream_request_count(upstream: str, status_code: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "modifier_upstream_request_duration_seconds_count",
+            {
+                "upstream": upstream,
+                "method": "GET",
+                "endpoint": "/organizations",
+                "status_code": status_code,
+            },
+        )
+        or 0
+    )
+
+
+@patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+async def test_get_passthrough_streams_the_body(mock_send):
+    body = ChunkedStream([b'{"organizations":', b"[]}"])
+    mock_send.return_value = Response(
+        status_code=200,
+        headers={"Content-Type": "application/json", "Content-Length": "20"},
+        stream=body,
+    )
+    before = get_upstream_request_count("http://passthrough", "200")
+
+    response = await APIClient(base_url="http://passthrough").get_passthrough(
+        "/organizations", headers={"Authorization": "Bearer token"}
+    )
+
+    assert mock_send.call_args.kwargs["stream"] is True
+    request = mock_send.call_args.args[0]
+    assert request.url == "http://passthrough/organizations"
+    assert request.headers["Authorization"] == "Bearer token"
+    assert response["status_code"] == 200
+    assert response["headers"] == {
+        "content-type": "application/json",
+        "content-length": "20",
+    }
+    assert get_upstream_request_count("http://passthrough", "200") == before + 1
+
+    streaming_response = build_passthrough_response(response)
+    assert streaming_response.status_code == 200
+    chunks = [chunk async for chunk in streaming_response.body_iterator]
+    assert chunks == [b'{"organizations":', b"[]}"]
+    assert body.closed is True
+
+
+@pytest.mark.parametrize("failure", ["disconnect", "cancel"])
+@patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+async def test_passthrough_response_closes_the_unread_body(mock_send, failure):
+    body = ChunkedStream([b'{"organizations":', b"[]}"])
+    mock_send.return_value = Response(
+        status_code=200, headers={"Content-Type": "application/json"}, stream=body
+    )
+    response = await APIClient(base_url="http://passthrough").get_passthrough(
+        "/organizations"
+    )
+    streaming_response = build_passthrough_response(response)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if failure == "cancel":
+            raise asyncio.CancelledError
+        await asyncio.Event().wait()
+
+    with contextlib.suppress(asyncio.CancelledError):
+        await streaming_response(build_scope("GET", "/organizations"), receive, send)
+
+    assert body.closed is True
+
+
+@patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+async def test_get_passthrough_drops_the_length_of_compressed_bodies(mock_send):
+    mock_send.return_value = Response(
+        status_code=200,
+        headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Content-Length": "12",
+        },
+        stream=ChunkedStream([]),
+    )
+
+    response = await APIClient(base_url="http://passthrough").get_passthrough(
+        "/organizations"
+    )
+
+    assert response["headers"] == {"content-type": "application/json"}
+
+
+@patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+async def test_get_passthrough_maps_errors(mock_send, mock_request_instance):
+    body = ChunkedStream([b'{"error": {"reason": "Forbidden"}}'])
+    mock_send.return_value = Response(
+        status_code=403,
+        request=mock_request_instance,
+        headers={"Content-Type": "application/json"},
+        stream=body,
+    )
+    before = get_upstream_request_count("http://passthrough", "403")
+
+    response = await APIClient(base_url="http://passthrough").get_passthrough(
+        "/organizations"
+    )
+
+    assert response["status_code"] == 403
+    assert response["data"] == {"error": {"reason": "Forbidden"}}
+    assert "stream" not in response
+    assert body.closed is True
+    assert get_upstream_request_count("http://passthrough", "403") == before + 1
+    with pytest.raises(APIResponseError) as exc_info:
+        raise_api_response_exception(response)
+    assert exc_info.value.status_code == 403
+
+
+@patch("httpx.AsyncClient.send", new_callable=AsyncMock)
+async def test_get_passthrough_connection_error(
+    mock_send, mock_request_instance, mock_sleep
+):
+    mock_send.side_effect = RequestError("boom", request=mock_request_instance)
+
+    response = await APIClient(base_url="http://passthrough").get_passthrough(
+        "/organizations"
+    )
+
+    assert response["status_code"] == 503
+    assert mock_send.call_count == settings.api_client_max_retries + 1
+
+
+def test_get_profile_timeout():
+    timeout = get_profile_timeout("fast")
+    profile = settings.api_client_timeout_profiles["fast"]
+
+    assert timeout.connect == profile.connect
+    assert timeout.read == profile.read
+    assert timeout.write == profile.write
+    assert timeout.pool == profile.pool
+
+
+def test_unknown_timeout_profile():
+    with pytest.raises(ValueError, match="Unknown timeout profile"):
+        APIClient(base_url="http://testserver", timeout_profiles={"GET /x": "nope"})
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_endpoint_timeout_profile(mock_request, mock_request_instance):
+    mock_request.return_value = Response(status_code=204, request=mock_request_instance)
+    api_client = APIClient(
+        base_url="http://testserver",
+        timeout_profiles={"POST /organizations/{id}/cloud_accounts": "slow"},
+    )
+
+    await api_client.post("/organizations/org_1/cloud_accounts")
+    assert mock_request.call_args.kwargs["timeout"] == get_profile_timeout("slow")
+
+    # other methods and endpoints use the default timeout
+    await api_client.put("/organizations/org_1/cloud_accounts")
+    assert mock_request.call_args.kwargs["timeout"] == api_client.timeout
+    await api_client.post("/organizations")
+    assert mock_request.call_args.kwargs["timeout"] == api_client.timeout
+
+
+def test_authorize_fails_fast():
+    api_client = OptScaleAuth().api_client
+
+    assert api_client.get_timeout("POST", "/authorize") == get_profile_timeout("fast")
+    assert api_client.get_timeout("POST", "/tokens") == get_profile_timeout("slow")
+
+
+async def test_close_http_clients():
+    client = get_http_client("http://to-be-closed")
+
+    await close_http_clients()
+
+    assert client.is_closed is True
+    assert get_http_client("http://to-be-closed") is not client
+
+
+def build_logged_app(sample_rate: float) -> FastAPI:
+    test_app = FastAPI()
+
+    @test_app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        with patch("httpx.AsyncClient.request") as mock_request:
+            mock_request.return_value = Response(status_code=204)
+            await APIClient(base_url="http://testserver").get("/endpoint")
+            await APIClient(base_url="http://testserver").get("/endpoint")
+        return {"id": item_id}
+
+    @test_app.get("/fail")
+    async def fail():
+        raise RuntimeError("Boom")
+
+    test_app.add_middleware(LogRequestMiddleware, sample_rate=sample_rate)
+    return test_app
+
+
+async def test_log_request_middleware(caplog):
+    transport = ASGITransport(app=build_logged_app(sample_rate=1.0))
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        with caplog.at_level(logging.INFO):
+            response = await client.get("/items/42")
+
+    assert response.status_code == 200
+    records = [r for r in caplog.records if r.message == "Request completed"]
+    assert len(records) == 1
+    record = records[0]
+    assert record.method == "GET"
+    assert record.route == "/items/{item_id}"
+    assert record.status_code == 200
+    assert record.upstream_calls == 2
+    assert record.duration_ms >= 0
+
+
+async def test_log_request_middleware_sampling(caplog):
+    transport = ASGITransport(
+        app=build_logged_app(sample_rate=0.0), raise_app_exceptions=False
+    )
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        with caplog.at_level(logging.INFO):
+            await client.get("/items/42")
+            response = await client.get("/fail")
+
+    assert response.status_code == 500
+    records = [r for r in caplog.records if r.message == "Request completed"]
+    # the successful request is not sampled, but server errors are always logged
+    assert len(records) == 1
+    assert records[0].route == "/fail"
+    assert records[0].status_code == 500
+
+
+def build_cancellable_app(upstream_started: asyncio.Event) -> FastAPI:
+    test_app = FastAPI()
+
+    async def hanging_request(*args, **kwargs):
+        upstream_started.set()
+        await asyncio.Event().wait()
+
+    @test_app.get("/items")
+    async def get_items():
+        with patch("app.core.api_client.APIClient._send_request", hanging_request):
+            await APIClient(base_url="http://cancelled").get("/items")
+        return {}
+
+    @test_app.post("/echo")
+    async def echo(payload: dict):
+        return payload
+
+    test_app.add_middleware(CancelOnDisconnectMiddleware)
+    test_app.add_middleware(LogRequestMiddleware, sample_rate=1.0)
+    return test_app
+
+
+def build_scope(method: str, path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+        "server": ("test", 80),
+        "client": ("test", 1234),
+    }
+
+
+async def test_cancel_on_disconnect(caplog):
+    upstream_started = asyncio.Event()
+    disconnected = asyncio.Event()
+    sent = []
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    before = (
+        REGISTRY.get_sample_value(
+            "modifier_upstream_cancelled_requests_total",
+            {"upstream": "http://cancelled", "endpoint": "/items"},
+        )
+        or 0
+    )
+    test_app = build_cancellable_app(upstream_started)
+    with caplog.at_level(logging.INFO):
+        serving = asyncio.ensure_future(
+            test_app(build_scope("GET", "/items"), receive, send)
+        )
+        await upstream_started.wait()
+        disconnected.set()
+        await asyncio.wait_for(serving, timeout=1)
+
+    assert sent == []
+    assert get_concurrency_limiter("http://cancelled").in_flight == 0
+    after = REGISTRY.get_sample_value(
+        "modifier_upstream_cancelled_requests_total",
+        {"upstream": "http://cancelled", "endpoint": "/items"},
+    )
+    assert after == before + 1
+    records = [r for r in caplog.records if r.message == "Request completed"]
+    assert records[0].status_code == CLIENT_CLOSED_REQUEST
+
+
+async def test_cancel_on_disconnect_passes_the_body_through():
+    messages = [
+        {"type": "http.request", "body": b'{"name":', "more_body": True},
+        {"type": "http.request", "body": b'"test"}', "more_body": False},
+    ]
+    response_sent = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await response_sent.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body":
+            response_sent.set()
+
+    test_app = build_cancellable_app(asyncio.Event())
+    await test_app(build_scope("POST", "/echo"), receive, send)
+
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b'{"name":"test"}'
+
+
+async def test_cancel_on_disconnect_reads_the_body_as_the_app_does():
+    chunks = [b'{"name":', b'"test"', b"}"]
+    received = []
+    read_ahead = []
+    response_sent = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if len(received) < len(chunks):
+            received.append(chunks[len(received)])
+            return {
+                "type": "http.request",
+                "body": received[-1],
+                "more_body": len(received) < len(chunks),
+            }
+        await response_sent.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body":
+            response_sent.set()
+
+    async def slow_reader(scope, receive, send):
+        taken = []
+        more_body = True
+        while more_body:
+            await asyncio.sleep(0.01)
+            message = await receive()
+            taken.append(message["body"])
+            more_body = message["more_body"]
+            # the messages read from the client, not taken by the app yet
+            read_ahead.append(len(received) - len(taken))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"".join(taken)})
+
+    await CancelOnDisconnectMiddleware(slow_reader)(
+        build_scope("POST", "/echo"), receive, send
+    )
+
+    assert sent[1]["body"] == b'{"name":"test"}'
+    assert max(read_ahead) <= 1
@@ -74,6 +74,19 @@ def test_azure_tenant_valid_conf():
     assert azure_config.process_recommendations is True
 
 
+def test_select_strategy_with_a_shared_api():
+    optscale_cloud_account_api = OptScaleCloudAccountAPI()
+    azure_config = CloudStrategyConfiguration(
+        name="Azure Service",
+        provider_type="azure_tenant",
+        config={"client_id": "ABC", "tenant": "XYZ", "secret": "SuperSecret"},
+    )
+    azure_strategy = azure_config.select_strategy(
+        optscale_cloud_account_api=optscale_cloud_account_api
+    )
+    assert azure_strategy.optscale_cloud_account_api is optscale_cloud_account_api
+
+
 def test_azure_cnr_valid_conf():
     azure_config = CloudStrategyConfiguration(
         name="Azure Service",
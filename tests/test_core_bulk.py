@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.core.bulk import build_item_error, build_item_result, run_bulk
+from app.core.exceptions import APIResponseError, UserAccessTokenError
+
+
+async def test_run_bulk_bounds_the_concurrency():
+    in_progress = 0
+    peak = 0
+
+    async def operation(item):
+        nonlocal in_progress, peak
+        in_progress += 1
+        peak = max(peak, in_progress)
+        await asyncio.sleep(0.01)
+        in_progress -= 1
+        return build_item_result(201, {"item": item})
+
+    results = [result async for result in run_bulk(range(10), operation, 3)]
+
+    assert peak == 3
+    assert sorted(result["index"] for result in results) == list(range(10))
+    assert all(result["data"] == {"item": result["index"]} for result in results)
+
+
+async def test_run_bulk_yields_the_results_as_they_complete():
+    async def operation(delay):
+        await asyncio.sleep(delay)
+        return build_item_result(201, delay)
+
+    results = [result async for result in run_bulk([0.05, 0], operation, 2)]
+
+    assert [result["index"] for result in results] == [1, 0]
+
+
+async def test_run_bulk_isolates_the_failed_items():
+    async def operation(item):
+        if item == 1:
+            raise APIResponseError(status_code=409, reason="exists", error_code="E1")
+        if item == 2:
+            raise RuntimeError("boom")
+        return build_item_result(201, item)
+
+    results = {
+        result["index"]: result async for result in run_bulk([0, 1, 2], operation, 2)
+    }
+
+    assert results[0] == {"index": 0, "status_code": 201, "data": 0}
+    assert results[1]["status_code"] == 500
+    assert results[1]["error"]["error_code"] == "bulk_item_failed"
+    assert results[2]["status_code"] == 500
+    assert results[2]["error"]["reason"] == "boom"
+
+
+async def test_run_bulk_cancels_the_items_in_progress_when_closed():
+    cancelled = []
+
+    async def operation(item):
+        try:
+            await asyncio.sleep(0 if item == 0 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+        return build_item_result(201, item)
+
+    results = run_bulk([0, 1, 2], operation, 3)
+    assert (await anext(results))["index"] == 0
+    await results.aclose()
+
+    assert sorted(cancelled) == [1, 2]
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (
+            APIResponseError(status_code=409, reason="exists", error_code="E1"),
+            {
+                "status_code": 409,
+                "error": {
+                    "status_code": 409,
+                    "reason": "exists",
+                    "error_code": "E1",
+                    "params": [],
+                },
+            },
+        ),
+        (
+            UserAccessTokenError("no token"),
+            {"status_code": 403, "error": "no token"},
+        ),
+    ],
+)
+def test_build_item_error(error, expected):
+    assert build_item_error(error) == expected
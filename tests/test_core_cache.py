@@ -0,0 +1,220 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.core.cache import StaleWhileRevalidateCache, TTLCache
+from app.core.request_context import get_request_context, start_request_context
+
+
+def test_cache_get_and_set():
+    cache = TTLCache(max_size=10)
+    cache.set("key", "value", ttl=60)
+
+    assert cache.get("key") == "value"
+    assert cache.get("missing") is None
+    assert cache.get("missing", "default") == "default"
+    assert cache.stats() == {
+        "size": 1,
+        "max_size": 10,
+        "hits": 1,
+        "misses": 2,
+        "evictions": 0,
+    }
+
+
+def test_cache_entry_expires():
+    cache = TTLCache(max_size=10)
+    with patch("app.core.cache.time.monotonic", return_value=100.0):
+        cache.set("key", "value", ttl=10)
+    with patch("app.core.cache.time.monotonic", return_value=109.0):
+        assert cache.get("key") == "value"
+    with patch("app.core.cache.time.monotonic", return_value=110.0):
+        assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_cache_does_not_store_entries_without_ttl():
+    cache = TTLCache(max_size=10)
+    cache.set("key", "value", ttl=60)
+    cache.set("key", "new value", ttl=0)
+
+    assert cache.get("key") is None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2)
+    cache.set("first", 1, ttl=60)
+    cache.set("second", 2, ttl=60)
+    # first is now the most recently used one
+    cache.get("first")
+    cache.set("third", 3, ttl=60)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+    assert cache.evictions == 1
+
+
+def test_cache_pop_and_clear():
+    cache = TTLCache(max_size=10)
+    cache.set("key", "value", ttl=60)
+    cache.get("key")
+
+    assert cache.pop("key") == "value"
+    assert cache.pop("key", "default") == "default"
+    cache.clear()
+    assert cache.stats()["hits"] == 0
+
+
+def build_loader(*values):
+    calls = []
+
+    async def loader():
+        calls.append(get_request_context())
+        await asyncio.sleep(0)
+        value = values[len(calls) - 1]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    return loader, calls
+
+
+async def test_stale_while_revalidate_cache_hit():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    loader, calls = build_loader("value")
+
+    assert await cache.get_or_load("key", loader) == "value"
+    assert await cache.get_or_load("key", loader) == "value"
+    assert len(calls) == 1
+    assert cache.stats() == {
+        "size": 1,
+        "max_size": 10,
+        "hits": 1,
+        "misses": 1,
+        "stale": 0,
+        "evictions": 0,
+    }
+
+
+async def test_stale_while_revalidate_cache_concurrent_misses_share_the_load():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    loader, calls = build_loader("value")
+
+    results = await asyncio.gather(
+        *(cache.get_or_load("key", loader) for _ in range(3))
+    )
+
+    assert results == ["value"] * 3
+    assert len(calls) == 1
+
+
+async def test_missing_entry_is_loaded_outside_the_request():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    loader, calls = build_loader("value")
+    start_request_context(requested_timeout=1)
+
+    assert await cache.get_or_load("key", loader) == "value"
+    assert calls == [None]
+
+
+async def test_every_caller_waits_for_a_missing_entry_within_its_timeout():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    results = await asyncio.gather(
+        cache.get_or_load("key", loader, timeout=0.01),
+        cache.get_or_load("key", loader),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] == "value"
+    assert len(calls) == 1
+
+
+async def test_stale_entry_is_served_while_refreshed():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=0.001, stale_ttl=60)
+    loader, calls = build_loader("old", "new")
+    start_request_context()
+    await cache.get_or_load("key", loader)
+    await asyncio.sleep(0.01)
+
+    assert await cache.get_or_load("key", loader) == "old"
+    assert await cache.get_or_load("key", loader) == "old"
+    await asyncio.sleep(0.01)
+
+    assert cache.stale == 2
+    # a single refresh, outside the context of the request
+    assert len(calls) == 2
+    assert calls[1] is None
+    assert cache._entries["key"][2] == "new"
+
+
+async def test_failed_refresh_keeps_the_stale_entry(caplog):
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=0.001, stale_ttl=60)
+    loader, calls = build_loader("old", ValueError("boom"))
+    await cache.get_or_load("key", loader)
+    await asyncio.sleep(0.01)
+
+    assert await cache.get_or_load("key", loader) == "old"
+    await asyncio.sleep(0.01)
+
+    assert len(calls) == 2
+    assert cache._entries["key"][2] == "old"
+    assert "Failed to load the cache entry key: boom" in caplog.text
+
+
+async def test_expired_entry_is_reloaded():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    loader, calls = build_loader("old", "new")
+    with patch("app.core.cache.time.monotonic", return_value=0.0):
+        cache.set("key", "old")
+
+    assert await cache.get_or_load("key", loader) == "old"
+    assert cache.misses == 1
+
+
+async def test_failed_load_is_not_cached():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    loader, calls = build_loader(ValueError("boom"), "value")
+
+    with pytest.raises(ValueError, match="boom"):
+        await cache.get_or_load("key", loader)
+    assert await cache.get_or_load("key", loader) == "value"
+
+
+async def test_invalidated_load_is_not_stored():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=60, stale_ttl=60)
+    loader, calls = build_loader("old", "new")
+
+    load = asyncio.ensure_future(cache.get_or_load("key", loader))
+    await asyncio.sleep(0)
+    cache.invalidate("key")
+
+    assert await load == "old"
+    assert len(cache) == 0
+    assert await cache.get_or_load("key", loader) == "new"
+
+
+def test_stale_while_revalidate_cache_eviction():
+    cache = StaleWhileRevalidateCache(max_size=2, ttl=60, stale_ttl=60)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+
+    assert list(cache._entries) == ["b", "c"]
+    assert cache.evictions == 1
+
+
+def test_disabled_stale_while_revalidate_cache():
+    cache = StaleWhileRevalidateCache(max_size=10, ttl=0, stale_ttl=60)
+    cache.set("key", "value")
+
+    assert cache.enabled is False
+    assert len(cache) == 0
@@ -0,0 +1,155 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import Request, Response
+
+from app import settings
+from app.core.api_client import APIClient
+from app.core.circuit_breaker import (
+    CIRCUIT_OPEN_ERROR_CODE,
+    CircuitBreaker,
+    build_circuit_open_response,
+    get_circuit_breaker,
+)
+from app.core.exceptions import APIResponseError, raise_api_response_exception
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(
+        upstream="rest",
+        endpoint="/organizations",
+        failure_threshold=3,
+        recovery_timeout=30,
+        half_open_max_calls=1,
+    )
+
+
+def open_breaker(breaker: CircuitBreaker, now: float = 100.0):
+    with patch("app.core.circuit_breaker.time.monotonic", return_value=now):
+        for _ in range(breaker.failure_threshold):
+            assert breaker.allow_request() is True
+            breaker.record_result(503)
+
+
+def test_breaker_opens_after_consecutive_failures(breaker):
+    breaker.record_result(500)
+    breaker.record_result(502)
+    # a success resets the failures count
+    breaker.record_result(404)
+    assert breaker.failures == 0
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    open_breaker(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    with patch("app.core.circuit_breaker.time.monotonic", return_value=110.0):
+        assert breaker.allow_request() is False
+
+
+def test_breaker_half_open_success_closes_the_circuit(breaker):
+    open_breaker(breaker)
+    with patch("app.core.circuit_breaker.time.monotonic", return_value=130.0):
+        assert breaker.allow_request() is True
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        # only one probe at a time
+        assert breaker.allow_request() is False
+        breaker.record_result(200)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() is True
+
+
+def test_breaker_half_open_failure_opens_the_circuit(breaker):
+    open_breaker(breaker)
+    with patch("app.core.circuit_breaker.time.monotonic", return_value=130.0):
+        assert breaker.allow_request() is True
+        breaker.record_result(503)
+    assert breaker.state == CircuitBreaker.OPEN
+    with patch("app.core.circuit_breaker.time.monotonic", return_value=150.0):
+        assert breaker.allow_request() is False
+
+
+def test_breaker_release_frees_the_half_open_probe(breaker):
+    open_breaker(breaker)
+    with patch("app.core.circuit_breaker.time.monotonic", return_value=130.0):
+        assert breaker.allow_request() is True
+        breaker.release()
+        assert breaker.allow_request() is True
+
+
+def test_get_circuit_breaker_by_endpoint_family():
+    first = get_circuit_breaker("rest", "/organizations/org_1/cloud_accounts")
+    second = get_circuit_breaker("rest", "/organizations/org_2/cloud_accounts")
+    assert first is second
+    assert first.endpoint == "/organizations/{id}/cloud_accounts"
+    assert get_circuit_breaker("auth", "/organizations") is not first
+    assert first.failure_threshold == settings.circuit_breaker_failure_threshold
+
+
+def test_circuit_open_response_maps_to_api_response_error(breaker):
+    with pytest.raises(APIResponseError) as exc_info:
+        raise_api_response_exception(build_circuit_open_response(breaker))
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.error["error_code"] == CIRCUIT_OPEN_ERROR_CODE
+    assert exc_info.value.error["params"] == ["rest", "/organizations"]
+
+
+@patch("httpx.AsyncClient.request")
+async def test_api_client_fails_fast_when_the_circuit_is_open(mock_request):
+    mock_request.return_value = Response(
+        status_code=500,
+        request=Request(method="POST", url="http://breaker/organizations"),
+        json={},
+    )
+    api_client = APIClient(base_url="http://breaker")
+    for _ in range(settings.circuit_breaker_failure_threshold):
+        response = await api_client.post("/organizations")
+        assert response["status_code"] == 500
+
+    mock_request.reset_mock()
+    response = await api_client.post("/organizations")
+
+    assert response["status_code"] == 503
+    assert response["data"]["error"]["error_code"] == CIRCUIT_OPEN_ERROR_CODE
+    mock_request.assert_not_called()
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_api_client_stops_retrying_when_the_circuit_opens(mock_request):
+    mock_request.return_value = Response(
+        status_code=503,
+        request=Request(method="GET", url="http://breaker/invites"),
+        json={},
+    )
+    breaker = get_circuit_breaker("http://breaker", "/invites")
+    breaker.failure_threshold = 1
+
+    response = await APIClient(base_url="http://breaker").get("/invites")
+
+    assert response["data"]["error"]["error_code"] == CIRCUIT_OPEN_ERROR_CODE
+    mock_request.assert_called_once()
+
+
+async def test_api_client_unexpected_error_does_not_wedge_the_probe():
+    breaker = get_circuit_breaker("http://breaker", "/invites")
+    open_breaker(breaker)
+    send_request = AsyncMock(side_effect=ValueError("not JSON"))
+
+    with (
+        patch("app.core.circuit_breaker.time.monotonic", return_value=130.0),
+        patch.object(APIClient, "_send_request", send_request),
+        pytest.raises(ValueError, match="not JSON"),
+    ):
+        await APIClient(base_url="http://breaker").get("/invites")
+
+    # the failed probe opens the circuit again, instead of keeping its slot
+    assert breaker.state == CircuitBreaker.OPEN
+    send_request.side_effect = None
+    send_request.return_value = {"status_code": 200, "data": {}}
+    with (
+        patch("app.core.circuit_breaker.time.monotonic", return_value=170.0),
+        patch.object(APIClient, "_send_request", send_request),
+    ):
+        response = await APIClient(base_url="http://breaker").get("/invites")
+
+    assert response["status_code"] == 200
+    assert breaker.state == CircuitBreaker.CLOSED
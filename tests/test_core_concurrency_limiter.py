@@ -0,0 +1,233 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import Request, Response
+
+from app import settings
+from app.core.api_client import APIClient
+from app.core.concurrency_limiter import (
+    CONCURRENCY_LIMIT_ERROR_CODE,
+    AdaptiveConcurrencyLimiter,
+    build_concurrency_limit_response,
+    get_concurrency_limiter,
+)
+from app.core.exceptions import APIResponseError, raise_api_response_exception
+
+
+@pytest.fixture
+def limiter():
+    return AdaptiveConcurrencyLimiter(
+        upstream="rest",
+        initial_limit=2,
+        min_limit=1,
+        max_limit=4,
+        latency_threshold=1.0,
+        backoff_ratio=0.5,
+        queue_timeout=0.05,
+        decrease_interval=1.0,
+    )
+
+
+async def test_limiter_rejects_when_the_queue_timeout_expires(limiter):
+    assert await limiter.acquire() is True
+    assert await limiter.acquire() is True
+
+    assert await limiter.acquire() is False
+    assert limiter.rejections == 1
+    assert limiter.in_flight == 2
+
+
+async def test_limiter_queued_request_gets_the_released_slot(limiter):
+    limiter.queue_timeout = 1
+    await limiter.acquire()
+    await limiter.acquire()
+
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiting.done()
+
+    limiter.release(latency=0.1, status_code=200)
+
+    assert await waiting is True
+    assert limiter.in_flight == 2
+
+
+async def test_limiter_cancelled_waiter_does_not_take_the_slot(limiter):
+    limiter.queue_timeout = 1
+    await limiter.acquire()
+    await limiter.acquire()
+
+    cancelled = asyncio.ensure_future(limiter.acquire())
+    waiting = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    limiter.release(latency=0.1, status_code=200)
+
+    assert await waiting is True
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    assert limiter.in_flight == 2
+
+
+async def test_limiter_additive_increase(limiter):
+    for _ in range(4):
+        await limiter.acquire()
+        await limiter.acquire()
+        limiter.release(latency=0.1, status_code=200)
+        limiter.release(latency=0.1, status_code=200)
+
+    assert 3 <= limiter.limit <= limiter.max_limit
+
+
+async def test_limiter_does_not_increase_when_underused(limiter):
+    limiter.limit = 4
+    await limiter.acquire()
+    limiter.release(latency=0.1, status_code=200)
+    assert limiter.limit == 4
+
+
+@pytest.mark.parametrize(
+    ("latency", "status_code"),
+    [
+        (2.0, 200),
+        (0.1, 503),
+    ],
+)
+async def test_limiter_multiplicative_decrease(limiter, latency, status_code):
+    limiter.limit = 4
+    await limiter.acquire()
+    with patch("app.core.concurrency_limiter.time.monotonic", return_value=100.0):
+        limiter.release(latency=latency, status_code=status_code)
+    assert limiter.limit == 2
+
+    for now in (101.0, 102.0, 103.0):
+        await limiter.acquire()
+        with patch("app.core.concurrency_limiter.time.monotonic", return_value=now):
+            limiter.release(latency=latency, status_code=status_code)
+    assert limiter.limit == limiter.min_limit
+
+
+async def test_limiter_decreases_once_per_interval(limiter):
+    limiter.limit = 4
+    for _ in range(4):
+        await limiter.acquire()
+    with patch("app.core.concurrency_limiter.time.monotonic", return_value=100.0):
+        for _ in range(3):
+            limiter.release(latency=0.1, status_code=503)
+    assert limiter.limit == 2
+
+    with patch("app.core.concurrency_limiter.time.monotonic", return_value=101.0):
+        limiter.release(latency=0.1, status_code=503)
+    assert limiter.limit == 1
+
+
+async def test_limiter_latency_threshold_of_the_request(limiter):
+    await limiter.acquire()
+    limiter.release(latency=2.0, status_code=200, latency_threshold=3.0)
+    assert limiter.limit == 2.5
+
+    await limiter.acquire()
+    limiter.release(latency=4.0, status_code=200, latency_threshold=3.0)
+    assert limiter.limit == 1.25
+
+
+async def test_limiter_release_without_latency_keeps_the_limit(limiter):
+    await limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+
+
+def test_get_concurrency_limiter_by_upstream():
+    rest = get_concurrency_limiter("rest")
+    assert get_concurrency_limiter("rest") is rest
+    assert get_concurrency_limiter("auth") is not rest
+    assert rest.limit == settings.concurrency_limit_initial
+
+
+def test_concurrency_limit_response_maps_to_api_response_error(limiter):
+    with pytest.raises(APIResponseError) as exc_info:
+        raise_api_response_exception(build_concurrency_limit_response(limiter))
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.error["error_code"] == CONCURRENCY_LIMIT_ERROR_CODE
+    assert exc_info.value.error["params"] == ["rest"]
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_api_client_is_rejected_when_the_limit_is_reached(mock_request):
+    limiter = get_concurrency_limiter("http://limited")
+    limiter.queue_timeout = 0.01
+    for _ in range(int(limiter.limit)):
+        await limiter.acquire()
+
+    response = await APIClient(base_url="http://limited").post("/organizations")
+
+    assert response["status_code"] == 503
+    assert response["data"]["error"]["error_code"] == CONCURRENCY_LIMIT_ERROR_CODE
+    mock_request.assert_not_called()
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_api_client_releases_the_slot(mock_request):
+    mock_request.return_value = Response(
+        status_code=200,
+        request=Request(method="POST", url="http://limited/organizations"),
+        json={},
+    )
+
+    response = await APIClient(base_url="http://limited").post("/organizations")
+
+    assert response["status_code"] == 200
+    assert get_concurrency_limiter("http://limited").in_flight == 0
+
+
+async def test_api_client_releases_the_slot_on_unexpected_errors():
+    send_request = AsyncMock(side_effect=ValueError("not JSON"))
+    limiter = get_concurrency_limiter("http://limited")
+
+    with patch.object(APIClient, "_send_request", send_request):
+        for _ in range(3):
+            with pytest.raises(ValueError, match="not JSON"):
+                await APIClient(base_url="http://limited").get("/invites")
+
+    assert limiter.in_flight == 0
+    assert limiter.limit == settings.concurrency_limit_initial
+
+
+@pytest.mark.parametrize(
+    ("profile", "expected"),
+    [
+        (None, settings.concurrency_limit_latency_threshold),
+        ("fast", settings.concurrency_limit_latency_threshold),
+        ("slow", settings.concurrency_limit_latency_threshold * 3),
+    ],
+)
+def test_api_client_latency_threshold_of_the_timeout_profile(profile, expected):
+    timeout_profiles = {"POST /organizations": profile} if profile else None
+    api_client = APIClient(base_url="http://limited", timeout_profiles=timeout_profiles)
+
+    timeout = api_client.get_timeout("POST", "/organizations")
+
+    assert api_client.get_latency_threshold(timeout) == expected
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_api_client_slow_profile_does_not_shrink_the_limit(mock_request):
+    mock_request.return_value = Response(
+        status_code=201,
+        request=Request(method="POST", url="http://slow/organizations"),
+        json={},
+    )
+    api_client = APIClient(
+        base_url="http://slow", timeout_profiles={"POST /organizations": "slow"}
+    )
+    limiter = get_concurrency_limiter("http://slow")
+    latency = settings.concurrency_limit_latency_threshold + 1
+
+    with patch("app.core.api_client.time") as mock_time:
+        mock_time.monotonic.side_effect = [100.0, 100.0 + latency]
+        response = await api_client.post("/organizations")
+
+    assert response["status_code"] == 201
+    assert limiter.limit == settings.concurrency_limit_initial
@@ -0,0 +1,132 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app import settings
+from app.core.api_client import APIClient
+from app.core.hedging import LatencyTracker, get_hedging_delay, latency_tracker
+from app.core.retry import RetryBudget
+
+
+@pytest.fixture
+def hedge_budget():
+    budget = RetryBudget(ratio=0.1, max_tokens=10)
+    with patch("app.core.api_client.hedge_budget", new=budget):
+        yield budget
+
+
+def record_latencies(endpoint: str, latency: float):
+    for _ in range(settings.api_client_hedging_min_samples):
+        latency_tracker.record("http://hedged", endpoint, latency)
+
+
+def build_send_request(latencies: list[float]):
+    calls = []
+
+    async def send_request(self, method, endpoint, **kwargs):
+        latency = latencies[len(calls)]
+        calls.append(latency)
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            calls.append("cancelled")
+            raise
+        return {"status_code": 200, "data": {"latency": latency}}
+
+    return send_request, calls
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window_size=100, min_samples=10)
+    for latency in range(1, 10):
+        tracker.record("rest", "/organizations/org_1", latency)
+    assert tracker.get_percentile("rest", "/organizations/org_1", 95) is None
+
+    for latency in range(10, 101):
+        tracker.record("rest", "/organizations/org_2", latency)
+    assert tracker.get_percentile("rest", "/organizations/org_3", 95) == 95
+    assert tracker.get_percentile("rest", "/organizations/org_3", 50) == 50
+    assert tracker.get_percentile("rest", "/organizations/org_3", 100) == 100
+    assert tracker.get_percentile("auth", "/organizations/org_3", 95) is None
+
+
+def test_latency_tracker_keeps_the_recent_latencies():
+    tracker = LatencyTracker(window_size=3, min_samples=1)
+    for latency in (10, 1, 1, 1):
+        tracker.record("rest", "/invites", latency)
+    assert tracker.get_percentile("rest", "/invites", 100) == 1
+
+
+def test_hedging_delay_is_not_below_the_minimum():
+    assert get_hedging_delay("http://hedged", "/invites") is None
+    record_latencies("/invites", 0.0001)
+    delay = get_hedging_delay("http://hedged", "/invites")
+    assert delay == settings.api_client_hedging_min_delay
+
+
+async def test_hedge_wins_over_a_slow_request(hedge_budget):
+    record_latencies("/invites", 0.05)
+    send_request, calls = build_send_request([10, 0])
+
+    with patch.object(APIClient, "_send_request", send_request):
+        response = await APIClient(base_url="http://hedged").get("/invites", hedge=True)
+
+    assert response["data"] == {"latency": 0}
+    await asyncio.sleep(0)
+    assert calls == [10, 0, "cancelled"]
+    assert hedge_budget.balance == 9
+
+
+async def test_fast_request_is_not_hedged(hedge_budget):
+    record_latencies("/invites", 0.05)
+    send_request, calls = build_send_request([0])
+
+    with patch.object(APIClient, "_send_request", send_request):
+        response = await APIClient(base_url="http://hedged").get("/invites", hedge=True)
+
+    assert response["data"] == {"latency": 0}
+    assert calls == [0]
+
+
+async def test_first_request_wins_over_a_slow_hedge(hedge_budget):
+    record_latencies("/invites", 0.05)
+    send_request, calls = build_send_request([0.1, 10])
+
+    with patch.object(APIClient, "_send_request", send_request):
+        response = await APIClient(base_url="http://hedged").get("/invites", hedge=True)
+
+    assert response["data"] == {"latency": 0.1}
+    await asyncio.sleep(0)
+    assert calls == [0.1, 10, "cancelled"]
+
+
+async def test_no_hedge_when_the_budget_is_exhausted(hedge_budget):
+    hedge_budget.balance = 0
+    record_latencies("/invites", 0.05)
+    send_request, calls = build_send_request([0.1])
+
+    with patch.object(APIClient, "_send_request", send_request):
+        response = await APIClient(base_url="http://hedged").get("/invites", hedge=True)
+
+    assert response["data"] == {"latency": 0.1}
+    assert calls == [0.1]
+
+
+async def test_no_hedge_without_recent_latencies(hedge_budget):
+    send_request, calls = build_send_request([0.1])
+
+    with patch.object(APIClient, "_send_request", send_request):
+        await APIClient(base_url="http://hedged").get("/invites", hedge=True)
+
+    assert calls == [0.1]
+
+
+async def test_no_hedge_by_default(hedge_budget):
+    record_latencies("/invites", 0.05)
+    send_request, calls = build_send_request([0.1])
+
+    with patch.object(APIClient, "_send_request", send_request):
+        await APIClient(base_url="http://hedged").get("/invites")
+
+    assert calls == [0.1]
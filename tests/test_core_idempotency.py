@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+from unittest.mock import patch
+
+import orjson
+import pytest
+from fastapi.responses import ORJSONResponse
+
+from app import settings
+from app.core.idempotency import (
+    IdempotencyKeyError,
+    IdempotencyStore,
+    get_fingerprint,
+    idempotency_store,
+    idempotent,
+    parse_idempotency_key,
+)
+from app.core.request_context import start_request_context
+
+
+def build_handler(status_code: int = 201, delay: float = 0):
+    calls = []
+
+    async def handler():
+        calls.append(len(calls))
+        await asyncio.sleep(delay)
+        return ORJSONResponse(status_code=status_code, content={"call": len(calls)})
+
+    return handler, calls
+
+
+@pytest.fixture
+def store():
+    return IdempotencyStore(max_size=10, ttl=60, lock_timeout=1)
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    return str(tmp_path / "idempotency.sqlite3")
+
+
+async def test_response_is_replayed(store):
+    handler, calls = build_handler()
+
+    first = await store.execute("key", "fingerprint", handler)
+    replayed = await store.execute("key", "fingerprint", handler)
+
+    assert calls == [0]
+    assert replayed.status_code == 201
+    assert replayed.body == first.body
+    assert replayed.media_type == "application/json"
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+
+
+async def test_concurrent_duplicates_wait_for_the_first_request(store):
+    handler, calls = build_handler(delay=0.05)
+
+    responses = await asyncio.gather(
+        *(store.execute("key", "fingerprint", handler) for _ in range(3))
+    )
+
+    assert calls == [0]
+    assert {response.body for response in responses} == {b'{"call":1}'}
+
+
+async def test_key_reused_with_other_parameters(store):
+    handler, _ = build_handler()
+    await store.execute("key", "fingerprint", handler)
+
+    with pytest.raises(IdempotencyKeyError) as error:
+        await store.execute("key", "other fingerprint", handler)
+
+    assert error.value.status_code == 422
+    assert error.value.error_code == "idempotency_key_reused"
+
+
+@pytest.mark.parametrize("status_code", [409, 429, 500, 503, 504])
+async def test_retryable_responses_are_not_stored(store, status_code):
+    handler, calls = build_handler(status_code=status_code)
+
+    await store.execute("key", "fingerprint", handler)
+    await store.execute("key", "fingerprint", handler)
+
+    assert calls == [0, 1]
+
+
+async def test_failed_request_is_run_again(store):
+    calls = []
+
+    async def handler():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return ORJSONResponse(status_code=201, content={})
+
+    with pytest.raises(RuntimeError):
+        await store.execute("key", "fingerprint", handler)
+    response = await store.execute("key", "fingerprint", handler)
+
+    assert response.status_code == 201
+    assert calls == [0, 1]
+
+
+async def test_response_expires(store):
+    store.ttl = 0.01
+    handler, calls = build_handler()
+
+    await store.execute("key", "fingerprint", handler)
+    await asyncio.sleep(0.02)
+    await store.execute("key", "fingerprint", handler)
+
+    assert calls == [0, 1]
+
+
+async def test_response_is_shared_through_sqlite(sqlite_path):
+    handler, calls = build_handler()
+    worker_1 = IdempotencyStore(max_size=10, ttl=60, lock_timeout=1, path=sqlite_path)
+    worker_2 = IdempotencyStore(max_size=10, ttl=60, lock_timeout=1, path=sqlite_path)
+
+    try:
+        first = await worker_1.execute("key", "fingerprint", handler)
+        replayed = await worker_2.execute("key", "fingerprint", handler)
+    finally:
+        worker_1.close()
+        worker_2.close()
+
+    assert calls == [0]
+    assert replayed.body == first.body
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_request_in_progress_in_another_worker(sqlite_path):
+    slow_handler, slow_calls = build_handler(delay=0.1)
+    handler, calls = build_handler()
+    worker_1 = IdempotencyStore(max_size=10, ttl=60, lock_timeout=1, path=sqlite_path)
+    worker_2 = IdempotencyStore(
+        max_size=10, ttl=60, lock_timeout=1, path=sqlite_path, poll_interval=0.01
+    )
+
+    try:
+        first = asyncio.create_task(
+            worker_1.execute("key", "fingerprint", slow_handler)
+        )
+        await asyncio.sleep(0.05)
+        replayed = await worker_2.execute("key", "fingerprint", handler)
+        await first
+    finally:
+        worker_1.close()
+        worker_2.close()
+
+    assert slow_calls == [0]
+    assert calls == []
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_wait_is_bounded_by_the_deadline(sqlite_path):
+    slow_handler, _ = build_handler(delay=0.2)
+    handler, calls = build_handler()
+    worker_1 = IdempotencyStore(max_size=10, ttl=60, lock_timeout=1, path=sqlite_path)
+    worker_2 = IdempotencyStore(
+        max_size=10, ttl=60, lock_timeout=1, path=sqlite_path, poll_interval=0.01
+    )
+
+    try:
+        first = asyncio.create_task(
+            worker_1.execute("key", "fingerprint", slow_handler)
+        )
+        await asyncio.sleep(0.05)
+        start_request_context(requested_timeout=0.05)
+        with pytest.raises(IdempotencyKeyError) as error:
+            await worker_2.execute("key", "fingerprint", handler)
+        await first
+    finally:
+        worker_1.close()
+        worker_2.close()
+
+    assert error.value.status_code == 409
+    assert error.value.error_code == "idempotency_key_in_progress"
+    assert calls == []
+
+
+def test_fingerprint_skips_the_dependencies():
+    fingerprint = get_fingerprint({"org_id": "org_1", "auth_client": object()})
+
+    assert fingerprint == get_fingerprint({"org_id": "org_1"})
+    assert fingerprint != get_fingerprint({"org_id": "org_2"})
+
+
+def test_fingerprint_is_keyed():
+    params = {"password": "secret"}
+    fingerprint = get_fingerprint(params)
+
+    assert fingerprint != hashlib.sha256(orjson.dumps(params)).hexdigest()
+    with patch.object(settings, "jwt_secret", "another secret"):
+        assert get_fingerprint(params) != fingerprint
+
+
+@pytest.mark.parametrize(
+    ("persist", "stored_rows"),
+    [(True, 1), (False, 0)],
+)
+async def test_idempotent_persists_the_responses(persist, stored_rows, sqlite_path):
+    calls = []
+
+    @idempotent(persist=persist)
+    async def create(name: str):
+        calls.append(name)
+        return ORJSONResponse(status_code=201, content={"token": "secret"})
+
+    start_request_context(
+        scope={
+            "type": "http",
+            "method": "POST",
+            "path": "/users",
+            "headers": [(b"idempotency-key", b"create-1")],
+        }
+    )
+    with patch.object(idempotency_store, "path", sqlite_path):
+        try:
+            first = await create(name="user")
+            replayed = await create(name="user")
+            rows, _ = idempotency_store._execute("SELECT body FROM responses")
+        finally:
+            idempotency_store.close()
+
+    assert calls == ["user"]
+    assert replayed.body == first.body
+    assert len(rows) == stored_rows
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        (
+            "7b1e5f7e-6c2a-4d3b-9a8f-1c2d3e4f5a6b",
+            "7b1e5f7e-6c2a-4d3b-9a8f-1c2d3e4f5a6b",
+        ),
+        (None, None),
+        ("", None),
+        ("a" * 256, None),
+        ("key\n", None),
+        ("clé", None),
+    ],
+)
+def test_parse_idempotency_key(value, expected):
+    assert parse_idempotency_key(value) == expected
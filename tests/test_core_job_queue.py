@@ -0,0 +1,203 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest_asyncio
+from prometheus_client import REGISTRY
+
+from app.core.job_queue import JobQueue
+
+
+# stopped in the loop of the test, where its workers run
+@pytest_asyncio.fixture(loop_scope="function")
+async def queue(tmp_path):
+    job_queue = JobQueue(
+        path=str(tmp_path / "jobs.sqlite3"),
+        workers=2,
+        max_attempts=3,
+        backoff_base=0.01,
+        backoff_max=0.02,
+        poll_interval=0.01,
+        lease_timeout=60,
+        retention=60,
+    )
+    yield job_queue
+    await job_queue.stop()
+
+
+def get_jobs(queue: JobQueue) -> list[tuple]:
+    with sqlite3.connect(queue.path) as connection:
+        return connection.execute(
+            "SELECT name, key, status, attempts, last_error FROM jobs"
+        ).fetchall()
+
+
+async def wait_for(condition, timeout: float = 2):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_jobs_are_run(queue):
+    payloads = []
+
+    async def handler(payload):
+        payloads.append(payload)
+
+    queue.register("test_job", handler)
+    assert await queue.enqueue("test_job", key="user_1", payload={"user_id": "1"})
+    await queue.start()
+
+    await wait_for(lambda: payloads)
+    assert payloads == [{"user_id": "1"}]
+    await wait_for(lambda: not get_jobs(queue))
+    assert (
+        REGISTRY.get_sample_value(
+            "modifier_job_duration_seconds_count",
+            {"job": "test_job", "outcome": "succeeded"},
+        )
+        >= 1
+    )
+    assert (
+        REGISTRY.get_sample_value("modifier_job_queue_depth", {"job": "test_job"}) == 0
+    )
+
+
+async def test_jobs_are_idempotent_per_key(queue):
+    queue.register("test_job", lambda payload: asyncio.sleep(0))
+
+    assert await queue.enqueue("test_job", key="user_1", payload={})
+    assert not await queue.enqueue("test_job", key="user_1", payload={})
+    assert await queue.enqueue("test_job", key="user_2", payload={})
+    assert await queue.enqueue("other_job", key="user_1", payload={})
+    assert len(get_jobs(queue)) == 3
+    assert (
+        REGISTRY.get_sample_value("modifier_job_queue_depth", {"job": "test_job"}) == 2
+    )
+
+
+async def test_failed_jobs_are_retried(queue):
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        if len(attempts) < 2:
+            raise ValueError("boom")
+
+    queue.register("test_job", handler)
+    await queue.enqueue("test_job", key="user_1", payload={})
+    await queue.start()
+
+    await wait_for(lambda: len(attempts) == 2 and not get_jobs(queue))
+
+
+async def test_jobs_fail_after_max_attempts(queue):
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        raise ValueError("boom")
+
+    queue.register("test_job", handler)
+    await queue.enqueue("test_job", key="user_1", payload={})
+    await queue.start()
+
+    await wait_for(lambda: get_jobs(queue)[0][2] == "failed")
+    assert get_jobs(queue) == [("test_job", "user_1", "failed", 3, "boom")]
+    assert len(attempts) == 3
+    # a failed job doesn't prevent to enqueue it again
+    assert await queue.enqueue("test_job", key="user_1", payload={})
+
+
+async def test_workers_bound_the_concurrency(queue):
+    running = 0
+    max_running = 0
+    done = []
+
+    async def handler(payload):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        done.append(payload)
+
+    queue.register("test_job", handler)
+    for index in range(6):
+        await queue.enqueue("test_job", key=f"user_{index}", payload={})
+    await queue.start()
+
+    await wait_for(lambda: len(done) == 6)
+    assert max_running == 2
+
+
+async def test_running_jobs_are_requeued_on_stop(queue):
+    started = asyncio.Event()
+
+    async def handler(payload):
+        started.set()
+        await asyncio.sleep(10)
+
+    queue.register("test_job", handler)
+    await queue.enqueue("test_job", key="user_1", payload={})
+    await queue.start()
+    await asyncio.wait_for(started.wait(), timeout=2)
+    await queue.stop()
+
+    assert get_jobs(queue) == [("test_job", "user_1", "pending", 1, None)]
+
+
+async def test_abandoned_jobs_are_taken_over(queue):
+    done = []
+
+    async def handler(payload):
+        done.append(payload)
+
+    queue.register("test_job", handler)
+    await queue.enqueue("test_job", key="user_1", payload={})
+    # claimed by a worker which has gone away
+    queue.lease_timeout = -1
+    assert await queue._claim() is not None
+    queue.lease_timeout = 60
+    await queue.start()
+
+    await wait_for(lambda: done)
+    assert not get_jobs(queue)
+
+
+async def test_leases_of_running_jobs_are_renewed(queue):
+    runs = []
+
+    async def handler(payload):
+        runs.append(payload)
+        await asyncio.sleep(0.3)
+
+    queue.register("test_job", handler)
+    queue.lease_timeout = 0.06
+    await queue.enqueue("test_job", key="user_1", payload={})
+    await queue.start()
+
+    await wait_for(lambda: not get_jobs(queue))
+    assert len(runs) == 1
+
+
+async def test_old_failed_jobs_are_purged(queue):
+    now = time.time()
+    for key, failed_at in (("user_1", now - 120), ("user_2", now - 30)):
+        await queue._run(
+            "INSERT INTO jobs (name, key, payload, status, created_at, run_at) "
+            "VALUES ('test_job', ?, '{}', 'failed', ?, ?)",
+            (key, failed_at, failed_at),
+        )
+    await queue.start()
+
+    await wait_for(lambda: len(get_jobs(queue)) == 1)
+    assert get_jobs(queue) == [("test_job", "user_2", "failed", 0, None)]
+
+
+def test_retry_delay_is_never_immediate(queue):
+    queue.backoff_base = 2
+    queue.backoff_max = 300
+    assert 1 <= queue.get_retry_delay(1) <= 2
+    assert 8 <= queue.get_retry_delay(4) <= 16
+    assert 150 <= queue.get_retry_delay(20) <= 300
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient, Request, Response
+from prometheus_client import REGISTRY
+
+from app.core.api_client import APIClient
+from app.core.cache import TTLCache
+from app.core.metrics import get_endpoint_template, register_cache
+
+
+@pytest.mark.parametrize(
+    "endpoint, expected",  # noqa: PT006
+    [
+        ("/tokens", "/tokens"),
+        ("/users/f0bd0c4a-7c55-45b7", "/users/{id}"),
+        (
+            "/organizations/my_org_id/cloud_accounts",
+            "/organizations/{id}/cloud_accounts",
+        ),
+        ("invites/1234", "/invites/{id}"),
+    ],
+)
+def test_get_endpoint_template(endpoint, expected):
+    assert get_endpoint_template(endpoint) == expected
+
+
+@patch("httpx.AsyncClient.request")
+async def test_upstream_request_duration_is_observed(mock_request):
+    labels = {
+        "upstream": "http://metrics-upstream",
+        "method": "GET",
+        "endpoint": "/invites/{id}",
+        "status_code": "200",
+    }
+    before = (
+        REGISTRY.get_sample_value(
+            "modifier_upstream_request_duration_seconds_count", labels
+        )
+        or 0
+    )
+    mock_request.return_value = Response(
+        status_code=200,
+        request=Request(method="GET", url="http://metrics-upstream/invites/1"),
+        json={"invites": []},
+    )
+
+    await APIClient(base_url="http://metrics-upstream").get("/invites/1")
+
+    after = REGISTRY.get_sample_value(
+        "modifier_upstream_request_duration_seconds_count", labels
+    )
+    assert after == before + 1
+
+
+async def test_metrics_endpoint(async_client: AsyncClient):
+    cache = TTLCache(max_size=10)
+    cache.set("key", "value", ttl=60)
+    cache.get("key")
+    register_cache("test_cache", cache)
+
+    await async_client.get("/organizations")
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'modifier_http_request_duration_seconds_count{method="GET",'
+        'route="/organizations",status_code="401"}' in response.text
+    )
+    assert 'modifier_cache_size{cache="test_cache"} 1.0' in response.text
+    assert 'modifier_cache_hits_total{cache="test_cache"} 1.0' in response.text
@@ -0,0 +1,184 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient, Request, Response
+
+from app import settings
+from app.core.api_client import APIClient, LogRequestMiddleware
+from app.core.exceptions import APIResponseError, raise_api_response_exception
+from app.core.request_context import (
+    DEADLINE_EXCEEDED_ERROR_CODE,
+    REQUEST_TIMEOUT_HEADER,
+    RequestContext,
+    get_remaining_time,
+    parse_request_id,
+    parse_request_timeout,
+    start_request_context,
+)
+
+
+class Route:
+    def __init__(self, path: str):
+        self.path = path
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("7.5", 7.5),
+        ("1", 1.0),
+        (None, None),
+        ("", None),
+        ("soon", None),
+        ("0", None),
+        ("-1", None),
+        ("inf", None),
+        ("nan", None),
+    ],
+)
+def test_parse_request_timeout(value, expected):
+    assert parse_request_timeout(value) == expected
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("7f3c2a", "7f3c2a"),
+        ("req-1:abc", "req-1:abc"),
+        (None, None),
+        ("", None),
+        ("a" * 129, None),
+        ("with\nnewline", None),
+        ("café", None),
+    ],
+)
+def test_parse_request_id(value, expected):
+    assert parse_request_id(value) == expected
+
+
+def test_request_id_is_generated():
+    first = start_request_context()
+    second = start_request_context(request_id="req-1")
+    assert len(first.request_id) == 32
+    assert second.request_id == "req-1"
+
+
+def test_deadline_defaults_to_the_route_budget():
+    context = RequestContext(scope={"method": "GET"})
+    # not routed yet
+    assert context.deadline is None
+
+    context.scope["route"] = Route("/organizations")
+    assert context.deadline == context.started_at + settings.request_deadline_default
+
+
+def test_deadline_of_a_specific_route():
+    context = RequestContext(
+        scope={"method": "POST", "route": Route("/organizations")},
+        requested_timeout=30,
+    )
+    with patch.object(settings, "request_deadline_routes", {"POST /organizations": 5}):
+        assert context.deadline == context.started_at + 5
+
+
+@pytest.mark.parametrize(
+    "path", ["/users", "/organizations", "/organizations/{org_id}/cloud_accounts"]
+)
+def test_deadline_of_the_routes_with_slow_upstream_calls(path):
+    slow = settings.api_client_timeout_profiles["slow"]
+    context = RequestContext(scope={"method": "POST", "route": Route(path)})
+
+    # the user token and the resource are created with the slow profile
+    assert context.deadline - context.started_at > 2 * (slow.connect + slow.read)
+
+
+def test_default_deadline_outlasts_the_timeout_profiles():
+    longest = max(
+        profile.connect + profile.read
+        for profile in settings.api_client_timeout_profiles.values()
+    )
+    assert settings.request_deadline_default > longest
+
+
+def test_requested_timeout_can_only_shorten_the_budget():
+    context = RequestContext(
+        scope={"method": "GET", "route": Route("/organizations")},
+        requested_timeout=1.5,
+    )
+    assert context.deadline == context.started_at + 1.5
+
+    context.requested_timeout = settings.request_deadline_default + 10
+    assert context.deadline == context.started_at + settings.request_deadline_default
+
+
+def test_no_remaining_time_outside_a_request():
+    assert get_remaining_time() is None
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_api_client_fails_fast_once_the_deadline_has_passed(mock_request):
+    context = start_request_context(requested_timeout=1)
+    context.started_at -= 2
+
+    response = await APIClient(base_url="http://deadline").get("/organizations")
+
+    assert response["status_code"] == 504
+    assert response["data"]["error"]["error_code"] == DEADLINE_EXCEEDED_ERROR_CODE
+    mock_request.assert_not_called()
+    with pytest.raises(APIResponseError) as exc_info:
+        raise_api_response_exception(response)
+    assert exc_info.value.status_code == 504
+
+
+@patch("httpx.AsyncClient.request")
+async def test_api_client_uses_the_remaining_budget(mock_request):
+    async def slow_request(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    mock_request.side_effect = slow_request
+    start_request_context(requested_timeout=0.05)
+
+    response = await APIClient(base_url="http://deadline").post("/organizations")
+
+    assert response["status_code"] == 504
+    assert response["data"]["error"]["error_code"] == DEADLINE_EXCEEDED_ERROR_CODE
+
+
+@patch("httpx.AsyncClient.request", new_callable=AsyncMock)
+async def test_api_client_does_not_retry_past_the_deadline(mock_request):
+    mock_request.return_value = Response(
+        status_code=503,
+        request=Request(method="GET", url="http://deadline/organizations"),
+        json={},
+    )
+    start_request_context(requested_timeout=0.05)
+
+    with patch("app.core.api_client.get_backoff_delay", return_value=1):
+        response = await APIClient(base_url="http://deadline").get("/organizations")
+
+    assert response["status_code"] == 504
+    mock_request.assert_called_once()
+
+
+@patch("app.core.api_client.APIClient._send_request")
+async def test_deadline_header_is_propagated(mock_send_request):
+    async def slow_request(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    # the test client itself relies on httpx.AsyncClient.request
+    mock_send_request.side_effect = slow_request
+    test_app = FastAPI()
+
+    @test_app.get("/items")
+    async def get_items():
+        response = await APIClient(base_url="http://deadline").get("/items")
+        return {"status_code": response["status_code"]}
+
+    test_app.add_middleware(LogRequestMiddleware)
+    transport = ASGITransport(app=test_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/items", headers={REQUEST_TIMEOUT_HEADER: "0.05"})
+
+    assert response.json() == {"status_code": 504}
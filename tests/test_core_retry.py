@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.core.retry import RetryBudget, get_backoff_delay, is_retryable_request
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.withdraw() is True
+    assert budget.withdraw() is True
+    assert budget.withdraw() is False
+
+    # two requests earn one retry
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw() is True
+    assert budget.withdraw() is False
+
+
+def test_retry_budget_is_capped():
+    budget = RetryBudget(ratio=1, max_tokens=2)
+    for _ in range(10):
+        budget.deposit()
+    assert budget.balance == 2
+
+
+@pytest.mark.parametrize(
+    "method, expected",  # noqa: PT006
+    [
+        ("GET", True),
+        ("delete", True),
+        ("PUT", True),
+        ("POST", False),
+        ("PATCH", False),
+    ],
+)
+def test_is_retryable_request(method, expected):
+    assert is_retryable_request(method) is expected
+
+
+@pytest.mark.parametrize("attempt", [1, 2, 3, 10])
+def test_get_backoff_delay(attempt):
+    with patch("app.core.retry.random.uniform", side_effect=lambda a, b: b):
+        delay = get_backoff_delay(attempt)
+    assert delay == min(2.0, 0.1 * 2 ** (attempt - 1))
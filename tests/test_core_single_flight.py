@@ -0,0 +1,179 @@
+import asyncio
+from unittest.mock import patch
+
+from httpx import Request, Response
+
+from app.core.api_client import APIClient
+from app.core.request_context import get_remaining_time, start_request_context
+from app.core.single_flight import SingleFlight, build_request_key
+
+
+def slow_call(result, started: list, delay: float = 0.05):
+    async def call():
+        started.append(result)
+        await asyncio.sleep(delay)
+        return result
+
+    return call
+
+
+async def test_single_flight_coalesces_identical_calls():
+    single_flight = SingleFlight(max_keys=10)
+    started = []
+    results = await asyncio.gather(
+        *(single_flight.do("key", slow_call("value", started)) for _ in range(5))
+    )
+    assert results == ["value"] * 5
+    assert started == ["value"]
+    assert single_flight.coalesced == 4
+    assert len(single_flight) == 0
+
+
+async def test_single_flight_does_not_coalesce_different_keys():
+    single_flight = SingleFlight(max_keys=10)
+    started = []
+    results = await asyncio.gather(
+        single_flight.do("first", slow_call(1, started)),
+        single_flight.do("second", slow_call(2, started)),
+    )
+    assert results == [1, 2]
+    assert started == [1, 2]
+    assert single_flight.coalesced == 0
+
+
+async def test_single_flight_is_bounded():
+    single_flight = SingleFlight(max_keys=1)
+    started = []
+    await asyncio.gather(
+        single_flight.do("first", slow_call(1, started)),
+        single_flight.do("second", slow_call(2, started)),
+        single_flight.do("second", slow_call(2, started)),
+    )
+    # only the first key is tracked
+    assert sorted(started) == [1, 2, 2]
+
+
+async def test_single_flight_shares_exceptions():
+    single_flight = SingleFlight(max_keys=10)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("Boom")
+
+    results = await asyncio.gather(
+        single_flight.do("key", fail),
+        single_flight.do("key", fail),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_single_flight_cancelled_caller_does_not_cancel_the_others():
+    single_flight = SingleFlight(max_keys=10)
+    started = []
+    leader = asyncio.ensure_future(single_flight.do("key", slow_call("value", started)))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(
+        single_flight.do("key", slow_call("value", started))
+    )
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    assert await follower == "value"
+    assert leader.cancelled()
+
+
+async def test_single_flight_call_is_cancelled_without_callers():
+    single_flight = SingleFlight(max_keys=10)
+    cancelled = asyncio.Event()
+
+    async def call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(single_flight.do("key", call))
+    await asyncio.sleep(0.01)
+    caller.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert len(single_flight) == 0
+
+
+async def test_single_flight_callers_wait_until_their_own_deadline():
+    single_flight = SingleFlight(max_keys=10)
+    remaining = []
+
+    async def call():
+        remaining.append(get_remaining_time())
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def caller(deadline):
+        start_request_context(requested_timeout=deadline)
+        return await single_flight.do("key", call, timeout=get_remaining_time())
+
+    results = await asyncio.gather(caller(0.01), caller(None), return_exceptions=True)
+
+    assert isinstance(results[0], TimeoutError)
+    assert results[1] == "value"
+    # the shared call doesn't inherit the deadline of the first caller
+    assert remaining == [None]
+
+
+def test_build_request_key():
+    key = build_request_key("http://rest", "/invites", {"Secret": "secret"}, None)
+    assert key == build_request_key("http://rest", "/invites", {"Secret": "secret"})
+    assert "secret" not in key[2]
+    assert key != build_request_key("http://rest", "/invites", {"Secret": "other"})
+    assert key != build_request_key(
+        "http://rest", "/invites", {"Secret": "secret"}, {"email": "a@b.com"}
+    )
+
+
+async def test_api_client_get_coalesces_identical_requests():
+    async def slow_request(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return Response(
+            status_code=200,
+            request=Request(method="GET", url="http://coalesced/organizations"),
+            json={"organizations": []},
+        )
+
+    api_client = APIClient(base_url="http://coalesced")
+    headers = {"Authorization": "Bearer token"}
+    with patch("httpx.AsyncClient.request", side_effect=slow_request) as mock_request:
+        responses = await asyncio.gather(
+            *(api_client.get("/organizations", headers=headers) for _ in range(3)),
+            api_client.get("/organizations", headers={"Authorization": "Bearer other"}),
+        )
+
+    assert all(response["data"] == {"organizations": []} for response in responses)
+    assert mock_request.call_count == 2
+
+
+async def test_api_client_get_coalesced_callers_have_their_own_deadline():
+    async def slow_request(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return Response(
+            status_code=200,
+            request=Request(method="GET", url="http://deadlines/organizations"),
+            json={"organizations": []},
+        )
+
+    api_client = APIClient(base_url="http://deadlines")
+
+    async def caller(deadline):
+        start_request_context(requested_timeout=deadline)
+        return await api_client.get("/organizations")
+
+    with patch("httpx.AsyncClient.request", side_effect=slow_request) as mock_request:
+        short, unbounded = await asyncio.gather(caller(0.01), caller(None))
+
+    assert short["status_code"] == 504
+    assert short["data"]["error"]["error_code"] == "deadline_exceeded"
+    assert unbounded["data"] == {"organizations": []}
+    assert mock_request.call_count == 1
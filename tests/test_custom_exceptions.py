@@ -1,4 +1,11 @@
-from app.core.exceptions import APIResponseError, AuthException
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from app.core.exceptions import (
+    APIResponseError,
+    AuthException,
+    format_error_response,
+)
 
 
 async def test_api_response_exception_empty_params():
@@ -59,3 +66,18 @@ async def test_auth_exception_empty_params():
         title=title,
     )
     assert exception_no_params.error["params"] == []
+
+
+def test_format_error_response():
+    exception = APIResponseError(
+        status_code=404,
+        reason="Organization not found",
+        error_code="OE0002",
+        title="Not Found",
+        params=["org_1"],
+    )
+    response = format_error_response(exception)
+
+    assert isinstance(response, ORJSONResponse)
+    assert response.status_code == 404
+    assert orjson.loads(response.body) == {"error": exception.error}
@@ -3,7 +3,11 @@ from unittest.mock import AsyncMock
 
 import pytest
 
-from app.api.invitations.services.invitations import remove_user, validate_user_delete
+from app import settings
+from app.api.invitations.services.invitations import (
+    is_user_removable,
+    run_remove_user_job,
+)
 from app.core.exceptions import APIResponseError
 from app.optscale_api.users_api import OptScaleUserAPI
 
@@ -62,25 +66,6 @@ def mock_org_api(mocker):
     return _mock_org_api
 
 
-@pytest.fixture
-def mock_user_api(mocker):
-    def _mock_user_api(should_raise=False):
-        mock = AsyncMock()
-        if should_raise:
-            mock.delete_user.side_effect = APIResponseError(
-                title="Error response from OptScale",
-                reason="Test",
-                status_code=403,
-                error_code="test error code",
-            )
-        else:
-            mock.delete_user.return_value = None
-        mocker.patch("app.optscale_api.users_api.OptScaleUserAPI", return_value=mock)
-        return mock
-
-    return _mock_user_api
-
-
 async def test_register_invited_user_on_optscale(
     caplog, optscale_api, test_data: dict, mock_post
 ):
@@ -123,14 +108,14 @@ async def test_create_duplicate_user(caplog, optscale_api, test_data: dict, mock
     assert "Failed to create the requested user" in caplog.text
 
 
-async def test_validate_user_delete(mock_invitation_api, mock_org_api):
+async def test_is_user_removable(mock_invitation_api, mock_org_api):
     invitation_return_value = {"data": {"invites": []}}
     org_return_value = {"data": {"organizations": []}}
 
     invitation_api = mock_invitation_api(invitation_return_value)
     org_api = mock_org_api(org_return_value)
     user_token = "test_token"
-    result = await validate_user_delete(
+    result = await is_user_removable(
         user_token=user_token, invitation_api=invitation_api, org_api=org_api
     )
     assert result is True
@@ -140,14 +125,14 @@ async def test_validate_user_delete(mock_invitation_api, mock_org_api):
     org_api.get_user_org_list.assert_called_once_with(user_access_token=user_token)
 
 
-async def test_validate_user_delete_false(mock_invitation_api, mock_org_api):
+async def test_is_user_removable_false(mock_invitation_api, mock_org_api):
     invitation_return_value = {"data": {"invites": [{"field": "value"}]}}
     org_return_value = {"data": {"organizations": []}}
 
     invitation_api = mock_invitation_api(invitation_return_value)
     org_api = mock_org_api(org_return_value)
     user_token = "test_token"
-    result = await validate_user_delete(
+    result = await is_user_removable(
         user_token=user_token, invitation_api=invitation_api, org_api=org_api
     )
     assert result is False
@@ -157,108 +142,74 @@ async def test_validate_user_delete_false(mock_invitation_api, mock_org_api):
     org_api.get_user_org_list.assert_called_once_with(user_access_token=user_token)
 
 
-async def test_validate_user_delete_exception_handling(
-    caplog, mock_invitation_api, mock_org_api
-):
-    invitation_api = mock_invitation_api([])
-    org_api = mock_org_api([])
-    user_token = "test_token"
-    result = await validate_user_delete(
-        user_token=user_token, invitation_api=invitation_api, org_api=org_api
-    )
-    assert result is False
-    assert (
-        "Exception during deletion user validation:'list' object has no attribute 'get'"
-        in caplog.messages[0]
-    )
-    invitation_api.get_list_of_invitations.assert_called_once_with(
-        user_access_token=user_token
+@pytest.fixture
+def mock_remove_user_job_apis(mocker):
+    services = "app.api.invitations.services.invitations"
+    mocker.patch(f"{services}.get_user_access_token", return_value="user_token")
+    invitation_api = mocker.patch(f"{services}.OptScaleInvitationAPI").return_value
+    org_api = mocker.patch(f"{services}.OptScaleOrgAPI").return_value
+    user_api = mocker.patch(f"{services}.OptScaleUserAPI").return_value
+    invitation_api.get_list_of_invitations = AsyncMock(
+        return_value={"data": {"invites": []}}
     )
-    org_api.get_user_org_list.assert_called_once_with(user_access_token=user_token)
+    org_api.get_user_org_list = AsyncMock(return_value={"data": {"organizations": []}})
+    user_api.delete_user = AsyncMock()
+    return invitation_api, org_api, user_api
 
 
-async def test_remove_user_success(
-    caplog, mock_invitation_api, mock_org_api, mock_user_api
-):
-    invitation_return_value = {"data": {"invites": []}}
-    org_return_value = {"data": {"organizations": []}}
-    invitation_api = mock_invitation_api(invitation_return_value)
-    user_api = mock_user_api(should_raise=False)
-    org_api = mock_org_api(org_return_value)
-    user_access_token = "test_token"
-    user_id = "user_id"
-    result = await remove_user(
-        user_id=user_id,
-        user_access_token=user_access_token,
-        invitation_api=invitation_api,
-        org_api=org_api,
-        user_api=user_api,
-        admin_api_key="your admin token here",
-    )
+async def test_remove_user_job(mock_remove_user_job_apis):
+    invitation_api, org_api, user_api = mock_remove_user_job_apis
 
-    assert result is True
-    invitation_api.get_list_of_invitations.assert_called_once_with(
-        user_access_token=user_access_token
-    )
-    org_api.get_user_org_list.assert_called_once_with(
-        user_access_token=user_access_token
-    )
+    await run_remove_user_job({"user_id": USER_ID})
+
+    org_api.get_user_org_list.assert_called_once_with(user_access_token="user_token")
     user_api.delete_user.assert_called_once_with(
-        user_id=user_id, admin_api_key="your admin token here"
+        user_id=USER_ID, admin_api_key=settings.optscale_cluster_secret
     )
 
 
-async def test_remove_user_fail(
-    caplog, mock_invitation_api, mock_org_api, mock_user_api
+async def test_remove_user_job_keeps_users_with_organizations(
+    mock_remove_user_job_apis,
 ):
-    invitation_return_value = {"data": {"invites": [{"field": "value"}]}}
-    org_return_value = {"data": {"organizations": []}}
-    invitation_api = mock_invitation_api(invitation_return_value)
-    user_api = mock_user_api(should_raise=False)
-    org_api = mock_org_api(org_return_value)
-    user_access_token = "test_token"
-    user_id = "user_id"
-    result = await remove_user(
-        user_id=user_id,
-        user_access_token=user_access_token,
-        invitation_api=invitation_api,
-        org_api=org_api,
-        user_api=user_api,
-        admin_api_key="your_admin_key_here",
-    )
-    assert "The user user_id cannot be deleted." == caplog.messages[0]
-    assert result is False
-    invitation_api.get_list_of_invitations.assert_called_once_with(
-        user_access_token=user_access_token
-    )
-    org_api.get_user_org_list.assert_called_once_with(
-        user_access_token=user_access_token
-    )
+    invitation_api, org_api, user_api = mock_remove_user_job_apis
+    org_api.get_user_org_list.return_value = {"data": {"organizations": [{}]}}
+
+    await run_remove_user_job({"user_id": USER_ID})
+
+    user_api.delete_user.assert_not_called()
 
 
-async def test_remove_user_exception_handling(
-    caplog, mock_invitation_api, mock_org_api, mock_user_api
+async def test_remove_user_job_keeps_users_with_invitations(
+    mock_remove_user_job_apis,
 ):
-    invitation_return_value = {"data": {"invites": []}}
-    org_return_value = {"data": {"organizations": []}}
-    invitation_api = mock_invitation_api(invitation_return_value)
-    user_api = mock_user_api(should_raise=True)
-    org_api = mock_org_api(org_return_value)
-    user_access_token = "test_token"
-    user_id = "user_id"
-    result = await remove_user(
-        user_id=user_id,
-        user_access_token=user_access_token,
-        invitation_api=invitation_api,
-        org_api=org_api,
-        user_api=user_api,
-        admin_api_key="your_admin_key_here",
-    )
-    assert "Error deleting user:user_id" == caplog.messages[0]
-    assert result is False
-    invitation_api.get_list_of_invitations.assert_called_once_with(
-        user_access_token=user_access_token
+    invitation_api, org_api, user_api = mock_remove_user_job_apis
+    invitation_api.get_list_of_invitations.return_value = {
+        "data": {"invites": [{"field": "value"}]}
+    }
+
+    await run_remove_user_job({"user_id": USER_ID})
+
+    user_api.delete_user.assert_not_called()
+
+
+async def test_remove_user_job_raises_deletion_errors_to_be_retried(
+    mock_remove_user_job_apis,
+):
+    invitation_api, org_api, user_api = mock_remove_user_job_apis
+    user_api.delete_user.side_effect = APIResponseError(
+        title="Error", error_code="OE0000", params=[], reason="boom", status_code=503
     )
-    org_api.get_user_org_list.assert_called_once_with(
-        user_access_token=user_access_token
+
+    with pytest.raises(APIResponseError):
+        await run_remove_user_job({"user_id": USER_ID})
+
+
+async def test_remove_user_job_raises_errors_to_be_retried(mock_remove_user_job_apis):
+    invitation_api, org_api, user_api = mock_remove_user_job_apis
+    org_api.get_user_org_list.side_effect = APIResponseError(
+        title="Error", error_code="OE0000", params=[], reason="boom", status_code=503
     )
+
+    with pytest.raises(APIResponseError):
+        await run_remove_user_job({"user_id": USER_ID})
+    user_api.delete_user.assert_not_called()
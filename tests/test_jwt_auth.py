@@ -1,5 +1,6 @@
 import logging
 import time
+from unittest.mock import patch
 
 import jwt
 import pytest
@@ -11,6 +12,7 @@ from app.core.auth_jwt_bearer import (
     JWT_ISSUER,
     JWTBearer,
     decode_jwt,
+    verified_jwt_cache,
     verify_jwt,
 )
 from app.core.exceptions import AuthException
@@ -195,6 +197,26 @@ class TestVerifyJWT:
         invalid_token = "this.is.not.a.jwt"
         assert verify_jwt(invalid_token) is False
 
+    def test_valid_jwt_is_cached(self):
+        token = create_jwt_token(subject=SUBJECT)
+        with patch("app.core.auth_jwt_bearer.jwt.decode", wraps=jwt.decode) as decode:
+            assert verify_jwt(token) is True
+            assert verify_jwt(token) is True
+            decode.assert_called_once()
+        assert verified_jwt_cache.hits == 1
+        assert verified_jwt_cache.misses == 1
+
+    def test_invalid_jwt_is_not_cached(self):
+        invalid_token = "this.is.not.a.jwt"
+        assert verify_jwt(invalid_token) is False
+        assert verify_jwt(invalid_token) is False
+        assert len(verified_jwt_cache) == 0
+
+    def test_jwt_expiring_within_leeway_is_not_cached(self):
+        token = create_jwt_token(subject=SUBJECT, expires_in=-10)
+        assert verify_jwt(token) is True
+        assert len(verified_jwt_cache) == 0
+
 
 @pytest.mark.asyncio
 class TestJWTBearer:
@@ -161,3 +161,75 @@ async def test_no_auth(
             headers={},
         )
         assert response.status_code == 403
+
+
+async def test_link_cloud_accounts_in_bulk(
+    async_client: AsyncClient, test_data: dict, mock_add_cloud_account, mock_auth_post
+):
+    cloud_account = test_data["cloud_accounts_conf"]["create"]["data"]["azure"]
+    mock_auth_post.return_value = test_data["auth_token"]["authorize"]["valid_response"]
+
+    async def add_cloud_account(config, org_id, user_access_token):
+        if config.name == "Rejected":
+            raise APIResponseError(
+                reason="Invalid credentials", status_code=400, error_code="OE0371"
+            )
+        return {"status_code": 201, "data": {**cloud_account["response"]}}
+
+    mock_add_cloud_account.side_effect = add_cloud_account
+    payload = {
+        "cloud_accounts": [
+            cloud_account["conf"],
+            {**cloud_account["conf"], "type": "blalbla"},
+            {**cloud_account["conf"], "name": "Rejected"},
+            {**cloud_account["conf"], "config": {"client_id": "my_client_id"}},
+        ]
+    }
+    response = await async_client.post(
+        "/organizations/my_org_id/cloud_accounts/bulk",
+        json=payload,
+        headers={"Authorization": "Bearer good token"},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert results[0] == {
+        "index": 0,
+        "status_code": 201,
+        "data": cloud_account["response"],
+    }
+    assert results[1]["status_code"] == 400
+    assert results[1]["error"]["error_code"] == "OE0436"
+    assert results[2]["status_code"] == 400
+    assert results[2]["error"]["reason"] == "Invalid credentials"
+    assert results[3] == {
+        "index": 3,
+        "status_code": 403,
+        "error": "The tenant is required ",
+    }
+    # authorized once, and only the valid configs are linked
+    mock_auth_post.assert_awaited_once()
+    assert mock_add_cloud_account.await_count == 2
+    assert all(
+        call.kwargs["org_id"] == "my_org_id"
+        for call in mock_add_cloud_account.await_args_list
+    )
+
+
+async def test_link_cloud_accounts_in_bulk_not_allowed(
+    async_client: AsyncClient, test_data: dict, mock_add_cloud_account, mock_auth_post
+):
+    mock_auth_post.side_effect = APIResponseError(
+        reason="Forbidden", status_code=403, error_code="OE0234"
+    )
+    payload = test_data["cloud_accounts_conf"]["create"]["data"]["azure"]["conf"]
+    response = await async_client.post(
+        "/organizations/my_org_id/cloud_accounts/bulk",
+        json={"cloud_accounts": [payload, payload]},
+        headers={"Authorization": "Bearer good token"},
+    )
+
+    assert response.status_code == 403
+    assert response.json()["error"]["error_code"] == "OE0234"
+    mock_add_cloud_account.assert_not_awaited()
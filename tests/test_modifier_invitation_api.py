@@ -5,6 +5,7 @@ import pytest
 from httpx import AsyncClient
 
 from app.core.exceptions import APIResponseError, InvitationDoesNotExist
+from app.core.job_queue import job_queue
 from app.optscale_api.auth_api import OptScaleAuth
 from app.optscale_api.invitation_api import OptScaleInvitationAPI
 from app.optscale_api.users_api import OptScaleUserAPI
@@ -27,6 +28,12 @@ def mock_decline_invitation():
     patcher.stop()
 
 
+@pytest.fixture
+def mock_enqueue():
+    with patch.object(job_queue, "enqueue", new=AsyncMock()) as mock:
+        yield mock
+
+
 @pytest.fixture
 def mock_get_list_of_invitations():
     patcher = patch.object(
@@ -159,6 +166,7 @@ async def test_decline_invitation(
     async_client: AsyncClient,
     mock_decline_invitation,
     mock_optscale_auth_post,
+    mock_enqueue,
     test_data: dict,
 ):
     mock_decline_invitation.return_value = {"status_code": 204}
@@ -172,6 +180,11 @@ async def test_decline_invitation(
         invitation_id="bf9f6c28-53c5-40ab-b530-4850ca5fc27f",
         user_access_token="valid_user_token",
     )
+    mock_enqueue.assert_called_once_with(
+        "remove_user",
+        key="b57b9964-7046-4e20-812c-01ab52cf4661",
+        payload={"user_id": "b57b9964-7046-4e20-812c-01ab52cf4661"},
+    )
 
 
 async def test_decline_invitation_handle_exception(
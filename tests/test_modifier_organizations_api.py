@@ -1,6 +1,7 @@
 import logging
 from unittest.mock import AsyncMock, patch
 
+import orjson
 import pytest
 from httpx import AsyncClient
 
@@ -126,14 +127,26 @@ async def test_get_orgs_valid_response(
     async_client: AsyncClient, mock_get_org, test_data: dict
 ):
     jwt_token = create_jwt_token()
-    mocked_response = test_data["org"]["case_get"]["response"]
-    mock_get_org.return_value = mocked_response
+    body = orjson.dumps(test_data["org"]["case_get"]["response"])
+
+    async def stream():
+        yield body[:10]
+        yield body[10:]
+
+    mock_get_org.return_value = {
+        "status_code": 200,
+        "headers": {"content-type": "application/json"},
+        "stream": stream(),
+    }
     response = await async_client.get(
         "/organizations?user_id=101010011",
         headers={"Authorization": f"Bearer {jwt_token}"},
     )
 
     assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.content == body
+    assert mock_get_org.call_args.kwargs["passthrough"] is True
 
 
 @pytest.mark.asyncio
@@ -188,3 +201,125 @@ async def test_get_orgs_exception_handling(
         assert response_json.get("error") == expected_reason
     else:
         assert response_json.get("error").get("reason") == expected_reason
+
+
+async def test_lookup_orgs(async_client: AsyncClient, test_data: dict, mock_get_org):
+    organizations = test_data["org"]["case_get"]["response"]
+
+    async def get_org_list(user_id, **kwargs):
+        if user_id == "missing":
+            raise APIResponseError(
+                status_code=404, reason="User not found", error_code="OA0043"
+            )
+        if user_id == "no_token":
+            raise UserAccessTokenError("Failed to get the access token")
+        return {"status_code": 200, "data": organizations}
+
+    mock_get_org.side_effect = get_org_list
+    response = await async_client.post(
+        "/organizations/lookup",
+        json={"user_ids": ["user_1", "missing", "no_token", "user_1"]},
+        headers={"Authorization": "Bearer " + create_jwt_token()},
+    )
+
+    assert response.status_code == 200
+    got = response.json()["users"]
+    assert list(got) == ["user_1", "missing", "no_token"]
+    assert got["user_1"] == {"status_code": 200, "data": organizations}
+    assert got["missing"] == {
+        "status_code": 404,
+        "error": {
+            "status_code": 404,
+            "reason": "User not found",
+            "error_code": "OA0043",
+            "params": [],
+        },
+    }
+    assert got["no_token"] == {
+        "status_code": 403,
+        "error": "Failed to get the access token",
+    }
+    # the duplicated user IDs are looked up once
+    assert mock_get_org.await_count == 3
+
+
+async def test_lookup_orgs_no_authentication(async_client: AsyncClient, mock_get_org):
+    response = await async_client.post(
+        "/organizations/lookup", json={"user_ids": ["user_1"]}
+    )
+
+    assert response.status_code == 401
+    mock_get_org.assert_not_awaited()
+
+
+async def test_lookup_orgs_without_user_ids(async_client: AsyncClient, mock_get_org):
+    response = await async_client.post(
+        "/organizations/lookup",
+        json={"user_ids": []},
+        headers={"Authorization": "Bearer " + create_jwt_token()},
+    )
+
+    assert response.status_code == 422
+    mock_get_org.assert_not_awaited()
+
+
+async def test_create_org_with_idempotency_key(
+    async_client: AsyncClient, test_data: dict, mock_create_org
+):
+    payload = test_data["org"]["case_create"]["payload"]
+    mock_create_org.return_value = test_data["org"]["case_create"]["response"]
+    headers = {
+        "Authorization": "Bearer " + create_jwt_token(),
+        "Idempotency-Key": "create-org-1",
+    }
+
+    first = await async_client.post("/organizations", json=payload, headers=headers)
+    replayed = await async_client.post("/organizations", json=payload, headers=headers)
+
+    assert first.status_code == replayed.status_code == 201
+    assert replayed.json() == first.json()
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    mock_create_org.assert_awaited_once()
+
+    # another key creates another organization
+    headers["Idempotency-Key"] = "create-org-2"
+    await async_client.post("/organizations", json=payload, headers=headers)
+    assert mock_create_org.await_count == 2
+
+
+async def test_create_org_with_reused_idempotency_key(
+    async_client: AsyncClient, test_data: dict, mock_create_org
+):
+    payload = test_data["org"]["case_create"]["payload"]
+    mock_create_org.return_value = test_data["org"]["case_create"]["response"]
+    headers = {
+        "Authorization": "Bearer " + create_jwt_token(),
+        "Idempotency-Key": "create-org-1",
+    }
+
+    await async_client.post("/organizations", json=payload, headers=headers)
+    response = await async_client.post(
+        "/organizations", json={**payload, "org_name": "Other"}, headers=headers
+    )
+
+    assert response.status_code == 422
+    assert response.json()["error"]["error_code"] == "idempotency_key_reused"
+    mock_create_org.assert_awaited_once()
+
+
+async def test_create_org_with_invalid_idempotency_key(
+    async_client: AsyncClient, test_data: dict, mock_create_org
+):
+    payload = test_data["org"]["case_create"]["payload"]
+    response = await async_client.post(
+        "/organizations",
+        json=payload,
+        headers={
+            "Authorization": "Bearer " + create_jwt_token(),
+            "Idempotency-Key": "a" * 256,
+        },
+    )
+
+    assert response.status_code == 400
+    assert response.json()["error"]["error_code"] == "invalid_idempotency_key"
+    mock_create_org.assert_not_awaited()
@@ -0,0 +1,224 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+
+from app.api.proxy.api import (
+    PROXY_BLOCKED_ERROR_CODE,
+    PROXY_ENDPOINT_LABEL,
+    PROXY_INVALID_PATH_ERROR_CODE,
+    PROXY_UNAVAILABLE_ERROR_CODE,
+    build_proxy_router,
+    filter_headers,
+    has_unsafe_segments,
+)
+from app.core import api_client
+from app.core.api_client import LogRequestMiddleware
+from app.core.request_context import REQUEST_ID_HEADER
+
+BASE_URL = "http://proxied/restapi/v2"
+
+
+class UpstreamStream(httpx.AsyncByteStream):
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def __aiter__(self):
+        yield self.body
+
+
+@pytest.fixture
+def upstream_requests():
+    return []
+
+
+@pytest.fixture
+def upstream(upstream_requests):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/restapi/v2/down":
+            raise httpx.ConnectError("Connection refused", request=request)
+        body = await request.aread()
+        upstream_requests.append(request)
+        return httpx.Response(
+            status_code=201 if request.method == "POST" else 200,
+            headers=[
+                ("Content-Type", "application/json"),
+                ("Connection", "close, X-Upstream-Hop"),
+                ("X-Upstream-Hop", "1"),
+                ("Set-Cookie", "a=1"),
+                ("Set-Cookie", "b=2"),
+            ],
+            stream=UpstreamStream(body or b'{"pools": []}'),
+        )
+
+    client = httpx.AsyncClient(
+        base_url=BASE_URL, transport=httpx.MockTransport(handler)
+    )
+    api_client._http_clients[BASE_URL] = client
+    yield client
+    api_client._http_clients.pop(BASE_URL, None)
+
+
+@pytest.fixture
+async def proxy_client(upstream):
+    test_app = FastAPI()
+    test_app.include_router(build_proxy_router([BASE_URL]))
+    test_app.add_middleware(LogRequestMiddleware)
+    transport = ASGITransport(app=test_app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def get_upstream_request_count(method: str, endpoint: str, status_code: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "modifier_upstream_request_duration_seconds_count",
+            {
+                "upstream": BASE_URL,
+                "method": method,
+                "endpoint": endpoint,
+                "status_code": status_code,
+            },
+        )
+        or 0
+    )
+
+
+def test_filter_headers():
+    headers = [
+        ("host", "modifier"),
+        ("connection", "keep-alive, X-Hop"),
+        ("x-hop", "1"),
+        ("keep-alive", "timeout=5"),
+        ("x-request-id", "abc"),
+        ("authorization", "Bearer token"),
+        ("accept", "application/json"),
+        ("accept", "text/plain"),
+    ]
+    assert filter_headers(headers) == [
+        ("authorization", "Bearer token"),
+        ("accept", "application/json"),
+        ("accept", "text/plain"),
+    ]
+
+
+async def test_get_is_forwarded(proxy_client, upstream_requests):
+    before = get_upstream_request_count("GET", PROXY_ENDPOINT_LABEL, "200")
+
+    response = await proxy_client.get(
+        "/restapi/v2/pools/pool_1?details=true&details=false",
+        headers={"Authorization": "Bearer token", REQUEST_ID_HEADER: "request-1"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"pools": []}
+    assert response.headers.get_list("set-cookie") == ["a=1", "b=2"]
+    assert "x-upstream-hop" not in response.headers
+    assert response.headers[REQUEST_ID_HEADER] == "request-1"
+
+    (request,) = upstream_requests
+    assert str(request.url) == (
+        "http://proxied/restapi/v2/pools/pool_1?details=true&details=false"
+    )
+    assert request.headers["Authorization"] == "Bearer token"
+    assert request.headers[REQUEST_ID_HEADER] == "request-1"
+    assert request.headers["Host"] == "proxied"
+    assert "transfer-encoding" not in request.headers
+    # the path is not a label, as its values are unbounded
+    assert get_upstream_request_count("GET", PROXY_ENDPOINT_LABEL, "200") == before + 1
+    assert get_upstream_request_count("GET", "/pools/{id}", "200") == 0
+
+
+async def test_request_body_is_forwarded(proxy_client, upstream_requests):
+    response = await proxy_client.post(
+        "/restapi/v2/pools/pool_1/rules", json={"name": "rule"}
+    )
+
+    assert response.status_code == 201
+    assert response.json() == {"name": "rule"}
+    (request,) = upstream_requests
+    assert request.content == b'{"name":"rule"}'
+    assert request.headers["Content-Length"] == "15"
+    # a request ID is generated when the caller doesn't send one
+    assert request.headers[REQUEST_ID_HEADER] == response.headers[REQUEST_ID_HEADER]
+
+
+@pytest.mark.parametrize(
+    ("method", "path"),
+    [
+        ("POST", "/restapi/v2/organizations"),
+        ("DELETE", "/restapi/v2/organizations/org_1"),
+        ("POST", "/restapi/v2/organizations/org_1/cloud_accounts"),
+    ],
+)
+async def test_overridden_routes_are_not_forwarded(
+    proxy_client, upstream_requests, method, path
+):
+    response = await proxy_client.request(method, path)
+
+    assert response.status_code == 403
+    assert response.json()["error"]["error_code"] == PROXY_BLOCKED_ERROR_CODE
+    assert upstream_requests == []
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/restapi/v2/%2e/organizations",
+        "/restapi/v2/organizations/org_1/%2e%2e",
+        "/restapi/v2/pools/%2e%2e/organizations",
+        "/restapi/v2//organizations",
+        "/restapi/v2/organizations/",
+    ],
+)
+async def test_paths_with_unsafe_segments_are_not_forwarded(
+    proxy_client, upstream_requests, path
+):
+    response = await proxy_client.post(path)
+
+    assert response.status_code == 400
+    assert response.json()["error"]["error_code"] == PROXY_INVALID_PATH_ERROR_CODE
+    assert upstream_requests == []
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/restapi/v2/%2e/organizations",
+        "/restapi/v2/organizations/org_1/%2e%2e",
+    ],
+)
+async def test_blocked_routes_are_checked_after_the_normalization(
+    proxy_client, upstream_requests, mocker, path
+):
+    mocker.patch("app.api.proxy.api.has_unsafe_segments", return_value=False)
+
+    response = await proxy_client.post(path)
+
+    assert response.status_code == 403
+    assert response.json()["error"]["error_code"] == PROXY_BLOCKED_ERROR_CODE
+    assert upstream_requests == []
+
+
+@pytest.mark.parametrize(
+    ("endpoint", "expected"),
+    [
+        ("/pools/pool_1", False),
+        ("/pools/pool_1/rules", False),
+        ("/./organizations", True),
+        ("/organizations/x/..", True),
+        ("/pools//rules", True),
+        ("/pools/", True),
+        ("/", True),
+    ],
+)
+def test_has_unsafe_segments(endpoint, expected):
+    assert has_unsafe_segments(endpoint) is expected
+
+
+async def test_connection_error(proxy_client):
+    response = await proxy_client.get("/restapi/v2/down")
+
+    assert response.status_code == 503
+    assert response.json()["error"]["error_code"] == PROXY_UNAVAILABLE_ERROR_CODE
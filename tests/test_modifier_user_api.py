@@ -1,3 +1,4 @@
+import json
 import logging
 from unittest.mock import AsyncMock, patch
 
@@ -92,3 +93,125 @@ async def test_create_user_exception_handling(
     ), "Expected 403 Forbidden when an exception occurs in user creation"
     got = response.json()
     assert got.get("error").get("reason") == "Test Exception"
+
+
+def build_bulk_payload(count: int) -> dict:
+    return {
+        "users": [
+            {
+                "email": f"user_{index}@example.com",
+                "display_name": f"User {index}",
+                "password": "Password123!",
+            }
+            for index in range(count)
+        ]
+    }
+
+
+async def test_create_users_in_bulk(
+    async_client: AsyncClient, test_data: dict, mock_create_user
+):
+    created = test_data["user"]["case_create"]["response"]
+
+    async def create_user(email, **kwargs):
+        if email == "user_1@example.com":
+            raise APIResponseError(
+                status_code=409, reason="User already exists", error_code="OA0042"
+            )
+        return {"status_code": 201, "data": {**created["data"], "email": email}}
+
+    mock_create_user.side_effect = create_user
+    response = await async_client.post(
+        "/users/bulk",
+        json=build_bulk_payload(3),
+        headers={"Authorization": "Bearer " + create_jwt_token()},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["status_code"] == 201
+    assert results[0]["data"]["email"] == "user_0@example.com"
+    assert results[1] == {
+        "index": 1,
+        "status_code": 409,
+        "error": {
+            "status_code": 409,
+            "reason": "User already exists",
+            "error_code": "OA0042",
+            "params": [],
+        },
+    }
+    assert results[2]["data"]["email"] == "user_2@example.com"
+    assert mock_create_user.await_count == 3
+    assert all(call.kwargs["verified"] for call in mock_create_user.await_args_list)
+
+
+async def test_create_users_in_bulk_streams_ndjson(
+    async_client: AsyncClient, test_data: dict, mock_create_user
+):
+    mock_create_user.return_value = test_data["user"]["case_create"]["response"]
+    response = await async_client.post(
+        "/users/bulk",
+        json=build_bulk_payload(2),
+        headers={
+            "Authorization": "Bearer " + create_jwt_token(),
+            "Accept": "application/x-ndjson",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(result["index"] for result in results) == [0, 1]
+    assert all(result["status_code"] == 201 for result in results)
+
+
+async def test_create_users_in_bulk_requires_authentication(
+    async_client: AsyncClient, mock_create_user
+):
+    response = await async_client.post("/users/bulk", json=build_bulk_payload(1))
+
+    assert response.status_code == 401
+    mock_create_user.assert_not_awaited()
+
+
+@pytest.mark.parametrize("count", [0, 501])
+async def test_create_users_in_bulk_limits_the_items(
+    count, async_client: AsyncClient, mock_create_user
+):
+    response = await async_client.post(
+        "/users/bulk",
+        json=build_bulk_payload(count),
+        headers={"Authorization": "Bearer " + create_jwt_token()},
+    )
+
+    assert response.status_code == 422
+    mock_create_user.assert_not_awaited()
+
+
+async def test_create_user_with_idempotency_key(
+    async_client: AsyncClient, test_data: dict, mock_create_user
+):
+    payload = test_data["user"]["case_create"]["payload"]
+    mock_create_user.return_value = test_data["user"]["case_create"]["response"]
+    jwt_token = create_jwt_token()
+
+    responses = [
+        await async_client.post(
+            "/users",
+            json=payload,
+            headers={
+                "Authorization": "Bearer " + token,
+                "Idempotency-Key": "create-user-1",
+            },
+        )
+        for token in (jwt_token, jwt_token, create_jwt_token(subject="other"))
+    ]
+
+    assert [response.status_code for response in responses] == [201, 201, 201]
+    assert responses[1].json() == responses[0].json()
+    assert responses[1].headers["Idempotent-Replayed"] == "true"
+    # the same key with other credentials is another request
+    assert "Idempotent-Replayed" not in responses[2].headers
+    assert mock_create_user.await_count == 2
@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
@@ -8,8 +9,9 @@ from app.core.exceptions import (
     UserAccessTokenError,
     UserOrgCreationError,
 )
-from app.optscale_api.auth_api import OptScaleAuth
-from app.optscale_api.orgs_api import OptScaleOrgAPI
+from app.core.request_context import start_request_context
+from app.optscale_api.auth_api import OptScaleAuth, user_access_token_cache
+from app.optscale_api.orgs_api import OptScaleOrgAPI, org_list_cache
 
 
 @pytest.fixture
@@ -148,9 +150,99 @@ async def test_get_user_org_empty_response(
     mock_api_client_get.assert_called_once_with(
         endpoint="/organizations",
         headers={"Authorization": "Bearer good token"},
+        hedge=True,
     )
 
 
+async def test_get_user_org_list_is_cached(
+    optscale_org_api_instance,
+    mock_api_client_get,
+    mock_api_client_post,
+    mock_auth_token,
+    optscale_auth_api,
+    test_data: dict,
+):
+    org_list = {"status_code": 200, "data": {"organizations": []}}
+    mock_api_client_get.return_value = org_list
+    for _ in range(2):
+        result = await optscale_org_api_instance.access_user_org_list_with_admin_key(
+            user_id="test_user", admin_api_key="test_key", auth_client=optscale_auth_api
+        )
+        assert result == org_list
+    mock_api_client_get.assert_called_once()
+    assert org_list_cache.stats()["hits"] == 1
+
+    streamed = await optscale_org_api_instance.access_user_org_list_with_admin_key(
+        user_id="test_user",
+        admin_api_key="test_key",
+        auth_client=optscale_auth_api,
+        passthrough=True,
+    )
+    assert streamed["status_code"] == 200
+    assert [chunk async for chunk in streamed["stream"]] == [b'{"organizations":[]}']
+
+    # creating an organization invalidates the list of the user
+    mock_api_client_post.return_value = test_data["org"]["case_create"]["response"]
+    await optscale_org_api_instance.create_user_org(
+        org_name="MyOrg",
+        currency="USD",
+        user_id="test_user",
+        admin_api_key="test_key",
+        auth_client=optscale_auth_api,
+    )
+    await optscale_org_api_instance.access_user_org_list_with_admin_key(
+        user_id="test_user", admin_api_key="test_key", auth_client=optscale_auth_api
+    )
+    assert mock_api_client_get.call_count == 2
+
+
+async def test_get_user_org_list_without_cache(
+    optscale_org_api_instance,
+    mock_api_client_get,
+    mock_auth_token,
+    optscale_auth_api,
+):
+    mock_api_client_get.return_value = {"organizations": []}
+    with patch.object(org_list_cache, "ttl", 0):
+        for _ in range(2):
+            await optscale_org_api_instance.access_user_org_list_with_admin_key(
+                user_id="test_user",
+                admin_api_key="test_key",
+                auth_client=optscale_auth_api,
+            )
+    assert mock_api_client_get.call_count == 2
+    assert len(org_list_cache) == 0
+
+
+async def test_get_user_org_list_within_the_deadline(
+    optscale_org_api_instance,
+    mock_api_client_get,
+    mock_auth_token,
+    optscale_auth_api,
+):
+    async def slow_get(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return {"organizations": []}
+
+    mock_api_client_get.side_effect = slow_get
+
+    async def access(deadline):
+        start_request_context(requested_timeout=deadline)
+        return await optscale_org_api_instance.access_user_org_list_with_admin_key(
+            user_id="test_user", admin_api_key="test_key", auth_client=optscale_auth_api
+        )
+
+    short, unbounded = await asyncio.gather(
+        access(0.01), access(None), return_exceptions=True
+    )
+
+    assert isinstance(short, APIResponseError)
+    assert short.status_code == 504
+    assert short.error["error_code"] == "deadline_exceeded"
+    assert unbounded == {"organizations": []}
+    mock_api_client_get.assert_called_once()
+
+
 async def test_get_user_org_response_error(
     optscale_org_api_instance,
     mock_api_client_get,
@@ -172,6 +264,27 @@ async def test_get_user_org_response_error(
             )
 
 
+async def test_get_user_org_unauthorized_discards_cached_token(
+    optscale_org_api_instance,
+    mock_api_client_get,
+    mock_auth_token,
+    optscale_auth_api,
+):
+    user_access_token_cache.set("test_user", "good token", ttl=60)
+    mock_api_client_get.return_value = {
+        "error": "This is an error! ",
+        "status_code": 401,
+        "data": {"error": {"reason": "Unauthorized"}},
+    }
+    with pytest.raises(APIResponseError):
+        await optscale_org_api_instance.access_user_org_list_with_admin_key(
+            user_id="test_user",
+            admin_api_key="test_key",
+            auth_client=optscale_auth_api,
+        )
+    assert user_access_token_cache.get("test_user") is None
+
+
 async def test_get_user_orgs_exceptions_handling(
     optscale_org_api_instance,
     mock_api_client_get,
@@ -1,11 +1,21 @@
 import logging
+import time
+from datetime import UTC, datetime, timedelta
 from unittest.mock import AsyncMock
 
+import jwt
 import pytest
 from httpx import AsyncClient
 
 from app.core.exceptions import APIResponseError, UserAccessTokenError
-from app.optscale_api.auth_api import OptScaleAuth
+from app.optscale_api.auth_api import (
+    OptScaleAuth,
+    authorization_cache,
+    discard_user_access_token,
+    get_authorization_cache_ttl,
+    get_token_cache_ttl,
+    user_access_token_cache,
+)
 
 
 @pytest.fixture
@@ -76,6 +86,50 @@ async def test_authorize_bearer_token_with_error(
         )
 
 
+async def test_granted_authorization_is_cached(
+    test_data: dict, mock_post, opt_scale_auth
+):
+    mock_post.return_value = test_data["auth_token"]["authorize"]["valid_response"]
+    for _ in range(2):
+        await opt_scale_auth.check_user_allowed_to_create_cloud_account(
+            bearer_token="good token", org_id="my_org_id"
+        )
+    mock_post.assert_called_once()
+
+    # another org, or another token, is checked again
+    await opt_scale_auth.check_user_allowed_to_create_cloud_account(
+        bearer_token="good token", org_id="other_org_id"
+    )
+    await opt_scale_auth.check_user_allowed_to_create_cloud_account(
+        bearer_token="other token", org_id="my_org_id"
+    )
+    assert mock_post.call_count == 3
+    assert "good token" not in str(list(authorization_cache._entries))
+
+
+async def test_denied_authorization_is_not_cached(
+    test_data: dict, mock_post, opt_scale_auth
+):
+    mock_post.return_value = test_data["auth_token"]["authorize"]["error_response"]
+    for _ in range(2):
+        with pytest.raises(APIResponseError):
+            await opt_scale_auth.check_user_allowed_to_create_cloud_account(
+                bearer_token="no good token", org_id="my_org_id"
+            )
+    assert mock_post.call_count == 2
+    assert len(authorization_cache) == 0
+
+
+def test_authorization_cache_ttl_is_bounded_by_the_token():
+    assert get_authorization_cache_ttl("not a jwt") == 30.0
+
+    token = jwt.encode({"exp": int(time.time()) + 10}, "secret")
+    assert 8 < get_authorization_cache_ttl(token) <= 10
+
+    expired = jwt.encode({"exp": int(time.time()) - 10}, "secret")
+    assert get_authorization_cache_ttl(expired) < 0
+
+
 async def test_user_auth_token_with_admin_api_key(
     async_client: AsyncClient, test_data: dict, mock_post, opt_scale_auth
 ):
@@ -150,3 +204,61 @@ async def test_user_auth_token_with_null_token(
             )
             # check the logging message printed by the obtain_user_auth_token_with_admin_api_key
         assert "Token not found in the response." == caplog.messages[0]  # noqa: E501
+
+
+def valid_until(seconds: int) -> str:
+    expires_at = datetime.now(UTC) + timedelta(seconds=seconds)
+    return expires_at.replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+async def test_user_auth_token_is_cached(test_data: dict, mock_post, opt_scale_auth):
+    mock_response = test_data["auth_token"]["create"]
+    mock_response["data"]["valid_until"] = valid_until(3600)
+    mock_post.return_value = mock_response
+    user_id = mock_response["data"]["user_id"]
+
+    for _ in range(3):
+        user_token = await opt_scale_auth.obtain_user_auth_token_with_admin_api_key(
+            user_id=user_id, admin_api_key="admin key"
+        )
+        assert user_token == mock_response["data"]["token"]
+
+    mock_post.assert_called_once()
+    assert user_access_token_cache.hits == 2
+    assert user_access_token_cache.misses == 1
+
+    discard_user_access_token(user_id)
+    await opt_scale_auth.obtain_user_auth_token_with_admin_api_key(
+        user_id=user_id, admin_api_key="admin key"
+    )
+    assert mock_post.call_count == 2
+
+
+async def test_user_auth_token_close_to_expiration_is_not_cached(
+    test_data: dict, mock_post, opt_scale_auth
+):
+    mock_response = test_data["auth_token"]["create"]
+    mock_response["data"]["valid_until"] = valid_until(60)
+    mock_post.return_value = mock_response
+    user_id = mock_response["data"]["user_id"]
+
+    for _ in range(2):
+        await opt_scale_auth.obtain_user_auth_token_with_admin_api_key(
+            user_id=user_id, admin_api_key="admin key"
+        )
+    assert mock_post.call_count == 2
+    assert len(user_access_token_cache) == 0
+
+
+@pytest.mark.parametrize(
+    "value, cached",  # noqa: PT006
+    [
+        (valid_until(3600), True),
+        (valid_until(3600) + "+00:00", True),
+        ("2024-11-04T18:38:21", False),
+        ("not a date", False),
+        (None, False),
+    ],
+)
+def test_get_token_cache_ttl(value, cached):
+    assert (get_token_cache_ttl(value) > 0) is cached
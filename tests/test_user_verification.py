@@ -3,8 +3,13 @@ from unittest.mock import AsyncMock, patch
 import pytest
 from httpx import AsyncClient
 
+from app import settings
 from app.api.users.services.optscale_users_registration import validate_user_invitation
-from app.optscale_api.invitation_api import OptScaleInvitationAPI
+from app.core.exceptions import APIResponseError
+from app.optscale_api.invitation_api import (
+    OptScaleInvitationAPI,
+    invitation_lookup_cache,
+)
 
 
 @pytest.fixture
@@ -35,3 +40,52 @@ async def test_validate_user_invitation_no_invitation(
     mock_get_list_of_invitations.return_value = {"data": {"invites": []}}
     response = await validate_user_invitation(email="homer.simpson@springfield.wow")
     assert response is False
+
+
+async def test_invitation_lookups_are_cached_by_normalized_email(
+    mock_get_list_of_invitations,
+):
+    mock_get_list_of_invitations.return_value = {
+        "data": {"invites": [{"id": "invite_1", "email": "homer@springfield.wow"}]}
+    }
+    assert await validate_user_invitation(email="Homer@Springfield.wow") is True
+    assert await validate_user_invitation(email=" homer@springfield.wow") is True
+    mock_get_list_of_invitations.assert_called_once()
+
+    # declining the invitation discards the lookup
+    opt_scale_invitation = OptScaleInvitationAPI()
+    with patch.object(
+        opt_scale_invitation.api_client,
+        "patch",
+        new=AsyncMock(return_value={"status_code": 204}),
+    ):
+        await opt_scale_invitation.decline_invitation(
+            user_access_token="valid user token", invitation_id="invite_1"
+        )
+    mock_get_list_of_invitations.return_value = {"data": {"invites": []}}
+    assert await validate_user_invitation(email="homer@springfield.wow") is False
+    assert mock_get_list_of_invitations.call_count == 2
+
+
+async def test_missing_invitations_are_cached_for_a_shorter_time(
+    mock_get_list_of_invitations,
+):
+    mock_get_list_of_invitations.return_value = {"data": {"invites": []}}
+    with patch.object(invitation_lookup_cache, "set") as mock_set:
+        await validate_user_invitation(email="homer@springfield.wow")
+    mock_set.assert_called_once_with(
+        "homer@springfield.wow", False, ttl=settings.invitation_cache_negative_ttl
+    )
+
+
+async def test_failed_invitation_lookups_are_not_cached(
+    mock_get_list_of_invitations,
+):
+    mock_get_list_of_invitations.side_effect = APIResponseError(
+        title="Error", error_code="OE0000", params=[], reason="boom", status_code=503
+    )
+    for _ in range(2):
+        with pytest.raises(APIResponseError):
+            await validate_user_invitation(email="homer@springfield.wow")
+    assert mock_get_list_of_invitations.call_count == 2
+    assert len(invitation_lookup_cache) == 0